@@ -1,7 +1,21 @@
-from dash import Dash
+import os
+import diskcache
+from dash import Dash, DiskcacheManager
 import dash_bootstrap_components as dbc
 from dotenv import load_dotenv
 load_dotenv()
+from utils.data_loader import version_datos
+from utils.cache_figuras import CACHE_FIGURAS_TTL
+
+# Los callbacks con background=True (solo los gráficos de CCONNA cuando se calculan
+# en pandas) se ejecutan en procesos aparte y sus resultados se guardan en disco por
+# entradas y versión de los datos
+CALLBACKS_CACHE_DIR = os.getenv('CALLBACKS_CACHE_DIR', './cache_callbacks')
+background_callback_manager = DiskcacheManager(
+    diskcache.Cache(CALLBACKS_CACHE_DIR),
+    cache_by=[version_datos],
+    expire=CACHE_FIGURAS_TTL,
+)
 
 # Definir los estilos externos
 external_stylesheets = [
@@ -9,7 +23,8 @@ external_stylesheets = [
     "https://use.fontawesome.com/releases/v5.15.1/css/all.css",
 ]
 
-app = Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+app = Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True,
+           background_callback_manager=background_callback_manager)
 app.title = "ESTADISTICAS-DSLD"
 # Configurar el favicon
 app.index_string = '''
@@ -0,0 +1,119 @@
+// Callbacks del lado del cliente: solo cambian el estado de la interfaz y no necesitan al servidor
+
+const TEXT_COLOR = "#F0F0F0";
+const ACCENT_COLOR = "#421e1b";
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        toggle_navbar: function(n_clicks, navbar_style, content_style, toggle_style) {
+            const no_update = window.dash_clientside.no_update;
+            if (n_clicks === null || n_clicks === undefined) {
+                return [no_update, no_update, no_update];
+            }
+            navbar_style = Object.assign({}, navbar_style);
+            content_style = Object.assign({}, content_style);
+            toggle_style = Object.assign({}, toggle_style);
+
+            if (navbar_style.transform === 'translateX(0)') {
+                // Ocultar navbar
+                navbar_style.transform = 'translateX(-250px)';
+                content_style.marginLeft = '50px';
+                toggle_style.left = '10px';
+                toggle_style.color = ACCENT_COLOR;  // Cambiar color cuando está oculto
+            } else {
+                // Mostrar navbar
+                navbar_style.transform = 'translateX(0)';
+                content_style.marginLeft = '250px';
+                toggle_style.left = '210px';
+                toggle_style.color = TEXT_COLOR;  // Restaurar color original
+            }
+
+            // Añadir transición al estilo del botón
+            toggle_style.transition = 'left 0.3s ease-in-out, color 0.3s ease-in-out';
+
+            return [navbar_style, content_style, toggle_style];
+        },
+
+        // Habilitación/deshabilitación y valores de los dropdowns de estado del CCONNA
+        update_dropdown_states: function(registro_value, creacion_value) {
+            const ctx = window.dash_clientside.callback_context;
+            const triggered_id = ctx.triggered && ctx.triggered.length ? ctx.triggered[0].prop_id.split('.')[0] : null;
+            let creacion_disabled, operativa_value, operativa_disabled;
+
+            if (triggered_id === null && (registro_value === null || registro_value === undefined)) {
+                // Carga inicial: el layout ya trae los dropdowns vacíos y deshabilitados
+                const no_update = window.dash_clientside.no_update;
+                return [no_update, no_update, no_update, no_update, no_update];
+            }
+
+            if (triggered_id === 'registro-cconna-dropdown' || registro_value === null || registro_value === undefined) {
+                if (registro_value === 'registrada') {
+                    creacion_value = 'no_creada';
+                    creacion_disabled = false;
+                } else {
+                    creacion_value = null;
+                    creacion_disabled = true;
+                }
+                operativa_value = null;
+                operativa_disabled = true;
+            } else if (triggered_id === 'creacion-cconna-dropdown') {
+                creacion_disabled = false;
+                if (creacion_value === 'creada') {
+                    operativa_value = 'no_operativa';
+                    operativa_disabled = false;
+                } else {
+                    operativa_value = null;
+                    operativa_disabled = true;
+                }
+            } else {
+                // Estado inicial o inesperado
+                registro_value = 'no_registrada';
+                creacion_value = null;
+                creacion_disabled = true;
+                operativa_value = null;
+                operativa_disabled = true;
+            }
+
+            return [registro_value === undefined ? null : registro_value, creacion_value, creacion_disabled,
+                    operativa_value, operativa_disabled];
+        }
+    }
+});
+
+// Cada carga de la página envía su propio identificador con las peticiones de los
+// callbacks, así el servidor solo cancela consultas reemplazadas dentro de la misma
+// pestaña. También avisa si la pestaña sigue esperando una respuesta anterior del
+// mismo callback: solo entonces hay una consulta que cancelar (ver run_query)
+(function() {
+    const ID_PAGINA = (window.crypto && window.crypto.randomUUID)
+        ? window.crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    const pendientes = {};
+    const fetchOriginal = window.fetch.bind(window);
+
+    window.fetch = function(recurso, opciones) {
+        const url = typeof recurso === 'string' ? recurso : (recurso && recurso.url) || '';
+        if (url.indexOf('_dash-update-component') === -1 || !opciones || typeof opciones.body !== 'string') {
+            return fetchOriginal(recurso, opciones);
+        }
+        let salida = null;
+        try {
+            salida = JSON.parse(opciones.body).output;
+        } catch (e) {
+            return fetchOriginal(recurso, opciones);
+        }
+        const headers = new Headers(opciones.headers || {});
+        headers.set('X-Id-Pagina', ID_PAGINA);
+        headers.set('X-Callback-Pendiente', pendientes[salida] ? '1' : '0');
+        pendientes[salida] = (pendientes[salida] || 0) + 1;
+        const terminar = function() {
+            pendientes[salida] -= 1;
+            if (!pendientes[salida]) {
+                delete pendientes[salida];
+            }
+        };
+        const respuesta = fetchOriginal(recurso, Object.assign({}, opciones, {headers: headers}));
+        respuesta.then(terminar, terminar);
+        return respuesta;
+    };
+})();
@@ -0,0 +1,99 @@
+import threading
+import time
+from utils.ubigeo_cache import ubicaciones_dna, ubicaciones_capacitaciones, ubigeo
+from utils.catalogos import cargar_catalogos
+from utils.busqueda import indice_defensores
+from utils.personas import capacitaciones_por_dni
+from callbacks import defensorias_callbacks, defensores_callbacks, capacitaciones_callbacks, cconna_callbacks
+from layouts import defensorias as layout_defensorias, defensores as layout_defensores
+
+# Progreso de la precarga (se consulta en /listo)
+_progreso = {'listo': False, 'pasos': 0, 'completados': 0, 'paso_actual': None, 'errores': [], 'duracion_s': None}
+_progreso_lock = threading.Lock()
+
+
+def progreso_calentamiento():
+    with _progreso_lock:
+        return dict(_progreso, errores=list(_progreso['errores']))
+
+
+def _ubicaciones():
+    for jerarquia in (ubicaciones_dna, ubicaciones_capacitaciones, ubigeo):
+        jerarquia.datos()
+
+
+def _catalogos():
+    for catalogos in (defensorias_callbacks.CATALOGOS_DEFENSORIAS, defensores_callbacks.CATALOGOS_DEFENSORES,
+                      capacitaciones_callbacks.CATALOGOS_CAPACITACIONES, cconna_callbacks.CATALOGOS_CCONNA):
+        cargar_catalogos(catalogos)
+
+
+'''
+Cada página se abre a nivel nacional con los valores que aplica su carga_inicial.
+Los callbacks se llaman con los mismos argumentos que enviará el navegador, así
+que los gráficos quedan en el cache de figuras y las consultas en el de run_query.
+'''
+def _defensorias_por_defecto():
+    _, _, estados, _, tipos = defensorias_callbacks.carga_inicial(None)
+    defensorias_callbacks.update_graphs(None, None, None, estados, tipos)
+    defensorias_callbacks.update_timeline(layout_defensorias.FECHA_INICIO_POR_DEFECTO,
+                                          layout_defensorias.FECHA_FIN_POR_DEFECTO,
+                                          None, None, None, estados, tipos)
+
+
+def _defensores_por_defecto():
+    _, _, cargos, _ = defensores_callbacks.carga_inicial(None)
+    defensores_callbacks.update_graphs(None, None, None, cargos, None)
+    defensores_callbacks.update_tabla_defensores(None, None, None, cargos, None, 0, 10)
+    defensores_callbacks.update_nombramientos_acumulados_graph(layout_defensores.FECHA_INICIO_POR_DEFECTO,
+                                                               layout_defensores.FECHA_FIN_POR_DEFECTO,
+                                                               None, None, None)
+
+
+def _capacitaciones_por_defecto():
+    capacitaciones_callbacks.update_graphs(None, None, None, None)
+
+
+def _cconna_por_defecto():
+    cconna_callbacks.update_graphs(None, None, None, None, None, None)
+
+
+PASOS = [
+    ('ubicaciones', _ubicaciones),
+    ('catalogos', _catalogos),
+    ('indice_defensores', indice_defensores.actualizar),
+    ('capacitaciones_por_dni', capacitaciones_por_dni.datos),
+    ('detalle_dna', defensorias_callbacks.precargar_detalles_dna),
+    ('defensorias', _defensorias_por_defecto),
+    ('defensores', _defensores_por_defecto),
+    ('capacitaciones', _capacitaciones_por_defecto),
+    ('cconna', _cconna_por_defecto),
+]
+
+
+def calentar_caches():
+    """
+    Carga en memoria las jerarquías de ubicaciones, los catálogos de filtros, los
+    índices de búsqueda de personas, el detalle de las DNAs supervisadas
+    recientemente y lo que cada página muestra al abrirse con sus filtros por
+    defecto, para que la primera petición no vaya a la base de datos. Un paso que
+    falla se informa y no impide los siguientes ni arrancar el servidor.
+    """
+    inicio = time.perf_counter()
+    with _progreso_lock:
+        _progreso.update(listo=False, pasos=len(PASOS), completados=0, errores=[], duracion_s=None)
+    for nombre, paso in PASOS:
+        with _progreso_lock:
+            _progreso['paso_actual'] = nombre
+        try:
+            paso()
+        except Exception as e:
+            print(f"Error al precargar {nombre}: {e}")
+            with _progreso_lock:
+                _progreso['errores'].append(f"{nombre}: {e}")
+        with _progreso_lock:
+            _progreso['completados'] += 1
+    duracion = time.perf_counter() - inicio
+    with _progreso_lock:
+        _progreso.update(listo=True, paso_actual=None, duracion_s=round(duracion, 1))
+    print(f"Caches precargados en {duracion:.1f} s")
@@ -1,32 +1,34 @@
-from dash import Input, Output, State, dash_table
+from dash import Input, Output, State, dash_table, html
 import plotly.express as px
 from app import app
 from utils.data_loader import run_query
+from utils.ubigeo_cache import ubicaciones_capacitaciones
+from utils.catalogos import cargar_catalogos, opciones
+from utils.resumenes import resumen_disponible
+from utils.personas import perfil, COLUMNAS_CAPACITACIONES
+from utils.cache_figuras import cachear_figuras
 
-# Callbacks para cargar opciones iniciales
-@app.callback(Output('dpto-capacitaciones-dropdown', 'options'),
-              Input('dpto-capacitaciones-dropdown', 'search_value'))
+# Catálogos de la página (cada consulta devuelve una columna `valor`)
+CATALOGOS_CAPACITACIONES = {
+    'cursos': 'SELECT DISTINCT "CURSO" AS valor FROM capacitaciones',
+}
 
-def load_dptos(search_value):
-    query = "SELECT DISTINCT \"DEPARTAMENTO\" FROM capacitaciones ORDER BY \"DEPARTAMENTO\""
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['DEPARTAMENTO']]
-
-@app.callback(Output('curso-capacitaciones-dropdown', 'options'),
-              Input('curso-capacitaciones-dropdown', 'search_value'))
-def load_cursos(search_value):
-    query = "SELECT DISTINCT \"CURSO\" FROM capacitaciones ORDER BY \"CURSO\""
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['CURSO']]
+# Opciones iniciales de todos los filtros en una sola petición
+@app.callback(
+    [Output('dpto-capacitaciones-dropdown', 'options'),
+     Output('curso-capacitaciones-dropdown', 'options')],
+    Input('capacitaciones-carga-inicial', 'data')
+)
+def carga_inicial(_):
+    catalogos = cargar_catalogos(CATALOGOS_CAPACITACIONES)
+    return ubicaciones_capacitaciones.departamentos(), opciones(catalogos['cursos'])
 
 # Callbacks para actualizar los dropdowns
 @app.callback(Output('prov-capacitaciones-dropdown', 'options'),
               Input('dpto-capacitaciones-dropdown', 'value'))
 def set_provincias_options(selected_dpto):
     if selected_dpto:
-        query = "SELECT DISTINCT \"PROVINCIA\" FROM capacitaciones WHERE \"DEPARTAMENTO\" = :dpto ORDER BY \"PROVINCIA\""
-        df = run_query(query, {'dpto': selected_dpto})
-        return [{'label': i, 'value': i} for i in df['PROVINCIA']]
+        return ubicaciones_capacitaciones.provincias(selected_dpto)
     return []
 
 @app.callback(Output('dist-capacitaciones-dropdown', 'options'),
@@ -34,9 +36,7 @@ def set_provincias_options(selected_dpto):
               State('dpto-capacitaciones-dropdown', 'value'))
 def set_distritos_options(selected_prov, selected_dpto):
     if selected_prov and selected_dpto:
-        query = "SELECT DISTINCT \"DISTRITO\" FROM capacitaciones WHERE \"DEPARTAMENTO\" = :dpto AND \"PROVINCIA\" = :prov ORDER BY \"DISTRITO\""
-        df = run_query(query, {'dpto': selected_dpto, 'prov': selected_prov})
-        return [{'label': i, 'value': i} for i in df['DISTRITO']]
+        return ubicaciones_capacitaciones.distritos(selected_dpto, selected_prov)
     return []
 
 # Callback para actualizar los gráficos
@@ -48,6 +48,7 @@ def set_distritos_options(selected_prov, selected_dpto):
      Input('dist-capacitaciones-dropdown', 'value'),
      Input('curso-capacitaciones-dropdown', 'value')]
 )
+@cachear_figuras('capacitaciones.update_graphs')
 def update_graphs(dpto, prov, dist, cursos):
     # Construir la consulta SQL base
     query = "SELECT"
@@ -73,7 +74,11 @@ def update_graphs(dpto, prov, dist, cursos):
         where_clause = ""
         title = 'Número de Capacitaciones por Departamento'
 
-    query += " \"CURSO\", COUNT(*) as count FROM capacitaciones" + where_clause
+    # El resumen precalculado tiene las mismas columnas más la cantidad de cada grupo
+    if resumen_disponible('resumen_capacitaciones'):
+        query += " \"CURSO\", SUM(cantidad) as count FROM resumen_capacitaciones" + where_clause
+    else:
+        query += " \"CURSO\", COUNT(*) as count FROM capacitaciones" + where_clause
 
     if cursos:
         if where_clause:
@@ -86,7 +91,7 @@ def update_graphs(dpto, prov, dist, cursos):
     query += " GROUP BY ubicacion, \"CURSO\""
 
     # Ejecutar la consulta
-    df = run_query(query, params)
+    df = run_query(query, params, cache=True, cancelable='capacitaciones.update_graphs')
 
     # Gráfico de capacitaciones por ubicación
     fig_ubicacion = px.bar(df.groupby('ubicacion').sum().reset_index(), 
@@ -112,22 +117,15 @@ def buscar_por_dni(n_clicks, dni):
     if not dni or not dni.isdigit() or len(dni) != 8:
         return None, "El DNI debe contener exactamente 8 dígitos."
     
-    query = """
-    SELECT "AÑO", "CURSO", "DEPARTAMENTO", "PROVINCIA", "DISTRITO", "SEDE DE CAPACITACIÓN", 
-           "FECHA INICIO CURSO", "FECHA CULMINA CURSO", "NOTA OBTENIDA", "CONDICIÓN"
-    FROM capacitaciones
-    WHERE "DNI" = :dni
-    ORDER BY "AÑO" DESC, "FECHA INICIO CURSO" DESC
-    """
-    
-    df = run_query(query, {'dni': dni})
+    # Perfil de la persona desde el índice en memoria por DNI
+    persona = perfil(dni)
     
-    if df.empty:
+    if not persona['capacitaciones']:
         return "No se encontraron resultados para este DNI.", None
     
     table = dash_table.DataTable(
-        data=df.to_dict('records'),
-        columns=[{"name": i, "id": i} for i in df.columns],
+        data=persona['capacitaciones'],
+        columns=[{"name": i, "id": i} for i in COLUMNAS_CAPACITACIONES],
         style_table={'overflowX': 'auto'},
         style_cell={
             'minWidth': '100px', 'width': '150px', 'maxWidth': '300px',
@@ -135,5 +133,12 @@ def buscar_por_dni(n_clicks, dni):
             'textOverflow': 'ellipsis',
         }
     )
+
+    # Si la persona también es defensor, indicarlo sobre la tabla
+    cargos = [html.P(f"Defensor: {d['cargo']} en la DNA {d['codigo_dna']} ({d['dist']}, {d['prov']}, {d['dpto']})",
+                     className="mb-1")
+              for d in persona['defensores']]
+    if cargos:
+        return html.Div(cargos + [table]), None
     
     return table, None
\ No newline at end of file
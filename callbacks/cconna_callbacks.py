@@ -1,15 +1,33 @@
-from dash import Input, Output, State, callback_context, dash_table, html
+from dash import Input, Output, State, ClientsideFunction, dash_table, html
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import dash_bootstrap_components as dbc
-from app import app  # Importar la instancia de la aplicación desde app.py
-from utils.data_loader import run_query
+from app import app, CALLBACKS_CACHE_DIR  # Importar la instancia de la aplicación desde app.py
+from utils.data_loader import run_query, DB_FETCH_CHUNK
+from utils.ubigeo_cache import ubigeo
+from utils.catalogos import cargar_catalogos, opciones
+from utils.fechas_cconna import parse_fechas, clasificar_vigencia, sql_fecha, sql_vigencia
+from utils.cache_figuras import cachear_figuras
+from utils.cupos import cupo
 from datetime import datetime
 import unicodedata
 import math
+import os
 
 colores_seaborn = px.colors.qualitative.Set2
 
+# Calcular los conteos de los gráficos en la base de datos en lugar de traer las filas a pandas
+# (solo si la base tiene la función fecha_cconna; ver agregacion_sql_disponible)
+CCONNA_AGREGACION_SQL = os.getenv('CCONNA_AGREGACION_SQL', '1') == '1'
+
+# Conteos en pandas simultáneos en todo el servidor: cada uno trae todas las filas filtradas
+CCONNA_PANDAS_SIMULTANEOS = int(os.getenv('CCONNA_PANDAS_SIMULTANEOS', 2))
+
+# Sin la agregación en SQL cada llamada procesa las filas en pandas, así que los gráficos
+# se calculan en segundo plano, fuera del proceso web (ver app.background_callback_manager)
+CCONNA_SEGUNDO_PLANO = not CCONNA_AGREGACION_SQL
+
 '''
 dpto-cconna-dropdown: Departamentos
 prov-cconna-dropdown: Provincias
@@ -19,31 +37,44 @@ creacion-cconna-dropdown: Estado de creación de CCONNA
 operativa-cconna-dropdown: Estado de vigencia de CCONNA
 '''
 
-# Código para cargar los departamentos
+# Opciones fijas de los dropdowns de estado
+REGISTRO_OPCIONES = [
+    {'label': 'No Registrada', 'value': 'no_registrada'},
+    {'label': 'Registrada', 'value': 'registrada'}
+]
+CREACION_OPCIONES = [
+    {'label': 'No Creada', 'value': 'no_creada'},
+    {'label': 'Creada', 'value': 'creada'}
+]
+OPERATIVA_OPCIONES = [
+    {'label': 'No Operativa', 'value': 'no_operativa'},
+    {'label': 'Operativa', 'value': 'operativa'}
+]
+
+# Catálogos de la página (cada consulta devuelve una columna `valor`)
+CATALOGOS_CCONNA = {
+    # Tipos disponibles sin ubicación seleccionada: Regional, Provincial y Distrital
+    'tipos': """
+    SELECT DISTINCT "Tipo de CCONNA " AS valor
+    FROM cconna
+    WHERE "Tipo de CCONNA " IN ('CCONNA Regional', 'CCONNA Provincial', 'CCONNA Distrital')
+    """,
+}
+
+# Opciones iniciales de todos los dropdowns en una sola petición
 @app.callback(
-    Output('dpto-cconna-dropdown', 'options'),
-    Input('dpto-cconna-dropdown', 'search_value')
+    [Output('dpto-cconna-dropdown', 'options'),
+     Output('tipo-cconna-dropdown', 'options'),
+     Output('registro-cconna-dropdown', 'options'),
+     Output('creacion-cconna-dropdown', 'options'),
+     Output('operativa-cconna-dropdown', 'options')],
+    Input('cconna-carga-inicial', 'data')
 )
-def load_dptos(search_value):
-    query = '''
-    SELECT "ubigeo", "nombre"
-    FROM ubigeo
-    WHERE "ubigeo" LIKE '__0000' AND "ubigeo" != '000000'
-    ORDER BY "nombre"
-    '''
-    df = run_query(query)
-    
-    # Modificar 'Lima' a 'Lima Metropolitana' y agregar 'Lima Provincia'
-    options = []
-    for index, row in df.iterrows():
-        if row['nombre'] == 'Lima':
-            # Agregar 'Lima Metropolitana'
-            options.append({'label': 'Lima Metropolitana', 'value': '150000'})  # Usar '150000' como código
-            # Agregar 'Lima Provincia' con un código personalizado
-            options.append({'label': 'Lima Provincia', 'value': '260000'})  # Usar '260000' como código
-        else:
-            options.append({'label': row['nombre'], 'value': row['ubigeo']})
-    return options
+def carga_inicial(_):
+    # 'Lima' se reemplaza por 'Lima Metropolitana' (150000) y 'Lima Provincia' (260000)
+    catalogos = cargar_catalogos(CATALOGOS_CCONNA)
+    tipos = opciones(tipo.strip() for tipo in catalogos['tipos'])
+    return ubigeo.departamentos(), tipos, REGISTRO_OPCIONES, CREACION_OPCIONES, OPERATIVA_OPCIONES
 
 
 # Código para cargar las provincias según el departamento seleccionado
@@ -53,36 +84,7 @@ def load_dptos(search_value):
 )
 def set_provincias_options(selected_dpto_code):
     if selected_dpto_code:
-        if selected_dpto_code == '150000':  # Lima Metropolitana
-            # Cargar solo la provincia de Lima
-            query = '''
-            SELECT "ubigeo", "nombre"
-            FROM ubigeo
-            WHERE "ubigeo" = '150100'
-            ORDER BY "nombre"
-            '''
-            df = run_query(query)
-        elif selected_dpto_code == '260000':  # Lima Provincia
-            # Cargar todas las provincias de Lima excepto la provincia de Lima (código '150100')
-            query = '''
-            SELECT "ubigeo", "nombre"
-            FROM ubigeo
-            WHERE "ubigeo" LIKE '15__00' AND "ubigeo" NOT IN ('150000', '150100')
-            ORDER BY "nombre"
-            '''
-            df = run_query(query)
-        else:
-            dpto_code = selected_dpto_code[:2]
-            query = '''
-            SELECT "ubigeo", "nombre"
-            FROM ubigeo
-            WHERE "ubigeo" LIKE :dpto_code || '__00' AND "ubigeo" NOT LIKE :dpto_code || '0000'
-            ORDER BY "nombre"
-            '''
-            params = {'dpto_code': dpto_code}
-            df = run_query(query, params)
-        options = [{'label': row['nombre'], 'value': row['ubigeo']} for index, row in df.iterrows()]
-        return options
+        return ubigeo.provincias(selected_dpto_code)
     return []
 
 
@@ -93,41 +95,21 @@ def set_provincias_options(selected_dpto_code):
 )
 def set_distritos_options(selected_prov_code):
     if selected_prov_code:
-        dpto_prov_code = selected_prov_code[:4]
-        query = '''
-        SELECT "ubigeo", "nombre"
-        FROM ubigeo
-        WHERE "ubigeo" LIKE :dpto_prov_code || '__' AND "ubigeo" NOT LIKE :dpto_prov_code || '00'
-        ORDER BY "nombre"
-        '''
-        params = {'dpto_prov_code': dpto_prov_code}
-        df = run_query(query, params)
-        options = [{'label': row['nombre'], 'value': row['ubigeo']} for index, row in df.iterrows()]
-        return options
+        return ubigeo.distritos(selected_prov_code)
     return []
 
-# Función para obtener el nombre a partir del código UBIGEO
+# Función para obtener el nombre a partir del código UBIGEO (incluye 150000 y 260000)
 def get_nombre_from_ubigeo(ubigeo_code):
-    if not ubigeo_code:
-        return None
-    if ubigeo_code == '150000':
-        return 'Lima Metropolitana'
-    elif ubigeo_code == '260000':
-        return 'Lima Provincia'
-    else:
-        query = 'SELECT "nombre" FROM ubigeo WHERE "ubigeo" = :ubigeo_code'
-        df = run_query(query, {'ubigeo_code': ubigeo_code})
-        if not df.empty:
-            return df.iloc[0]['nombre']
-        else:
-            return None
+    return ubigeo.nombre(ubigeo_code)
             
 # Callback para cargar los tipos de CCONNA
 @app.callback(
-    Output('tipo-cconna-dropdown', 'options'),
+    # carga_inicial también escribe estas opciones; Dash exige allow_duplicate para compartir la salida
+    Output('tipo-cconna-dropdown', 'options', allow_duplicate=True),
     [Input('dpto-cconna-dropdown', 'value'),
      Input('prov-cconna-dropdown', 'value'),
-     Input('dist-cconna-dropdown', 'value')]
+     Input('dist-cconna-dropdown', 'value')],
+    prevent_initial_call=True  # Las opciones iniciales llegan con carga_inicial
 )
 def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code):
     # Obtener los nombres correspondientes a los códigos UBIGEO seleccionados
@@ -137,14 +119,10 @@ def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code)
 
     # Caso 1: No se ha seleccionado ni departamento, provincia ni distrito
     if not selected_dpto_code and not selected_prov_code and not selected_dist_code:
-        # Se pueden seleccionar tipos Regional, Provincial y Distrital
-        query = '''
-            SELECT DISTINCT "Tipo de CCONNA " AS tipo_cconna
-            FROM cconna
-            WHERE "Tipo de CCONNA " IN ('CCONNA Regional', 'CCONNA Provincial', 'CCONNA Distrital')
-            ORDER BY "Tipo de CCONNA "
-        '''
-        df = run_query(query)
+        # Se pueden seleccionar tipos Regional, Provincial y Distrital: las mismas
+        # opciones de carga_inicial, leídas del catálogo en memoria
+        catalogos = cargar_catalogos(CATALOGOS_CCONNA)
+        return opciones(tipo.strip() for tipo in catalogos['tipos'])
 
     # Caso 2: Se ha seleccionado departamento pero no provincia ni distrito
     elif selected_dpto_code and not selected_prov_code and not selected_dist_code:
@@ -156,7 +134,7 @@ def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code)
             AND "Región" = :dpto
             ORDER BY "Tipo de CCONNA "
         '''
-        df = run_query(query, {'dpto': dpto_nombre})
+        df = run_query(query, {'dpto': dpto_nombre}, cache=True)
 
     # Caso 3: Se ha seleccionado provincia pero no distrito
     elif selected_prov_code and not selected_dist_code:
@@ -169,7 +147,7 @@ def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code)
             AND "Provincia" = :prov
             ORDER BY "Tipo de CCONNA "
         '''
-        df = run_query(query, {'dpto': dpto_nombre, 'prov': prov_nombre})
+        df = run_query(query, {'dpto': dpto_nombre, 'prov': prov_nombre}, cache=True)
 
     # Caso 4: Se ha seleccionado distrito
     elif selected_dist_code:
@@ -183,7 +161,7 @@ def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code)
             AND "Distrito" = :dist
             ORDER BY "Tipo de CCONNA "
         '''
-        df = run_query(query, {'dpto': dpto_nombre, 'prov': prov_nombre, 'dist': dist_nombre})
+        df = run_query(query, {'dpto': dpto_nombre, 'prov': prov_nombre, 'dist': dist_nombre}, cache=True)
     else:
         # No se muestran opciones
         return []
@@ -196,32 +174,9 @@ def load_tipo_cconna(selected_dpto_code, selected_prov_code, selected_dist_code)
 
     return options
 
-# Callback para el dropdown de creación del CCONNA
-
-# Callback para cargar las opciones iniciales de todos los dropdowns
-@app.callback(
-    [Output('registro-cconna-dropdown', 'options'),
-     Output('creacion-cconna-dropdown', 'options'),
-     Output('operativa-cconna-dropdown', 'options')],
-    Input('url', 'pathname')  # Este input se usa solo para activar el callback al cargar la página
-)
-def load_initial_options(_):
-    registro_options = [
-        {'label': 'No Registrada', 'value': 'no_registrada'},
-        {'label': 'Registrada', 'value': 'registrada'}
-    ]
-    creacion_options = [
-        {'label': 'No Creada', 'value': 'no_creada'},
-        {'label': 'Creada', 'value': 'creada'}
-    ]
-    operativa_options = [
-        {'label': 'No Operativa', 'value': 'no_operativa'},
-        {'label': 'Operativa', 'value': 'operativa'}
-    ]
-    return registro_options, creacion_options, operativa_options
-
-# Callback para manejar la habilitación/deshabilitación y valores de los dropdowns
-@app.callback(
+# Habilitación/deshabilitación y valores de los dropdowns (en el navegador, assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='update_dropdown_states'),
     [Output('registro-cconna-dropdown', 'value'),
      Output('creacion-cconna-dropdown', 'value'),
      Output('creacion-cconna-dropdown', 'disabled'),
@@ -230,38 +185,6 @@ def load_initial_options(_):
     [Input('registro-cconna-dropdown', 'value'),
      Input('creacion-cconna-dropdown', 'value')]
 )
-def update_dropdown_states(registro_value, creacion_value):
-    ctx = callback_context
-    triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
-
-    if triggered_id == 'registro-cconna-dropdown' or registro_value is None:
-        if registro_value == 'registrada':
-            creacion_value = 'no_creada'
-            creacion_disabled = False
-        else:
-            creacion_value = None
-            creacion_disabled = True
-        operativa_value = None
-        operativa_disabled = True
-    
-    elif triggered_id == 'creacion-cconna-dropdown':
-        creacion_disabled = False
-        if creacion_value == 'creada':
-            operativa_value = 'no_operativa'
-            operativa_disabled = False
-        else:
-            operativa_value = None
-            operativa_disabled = True
-    
-    else:
-        # Estado inicial o inesperado
-        registro_value = 'no_registrada'
-        creacion_value = None
-        creacion_disabled = True
-        operativa_value = None
-        operativa_disabled = True
-
-    return registro_value, creacion_value, creacion_disabled, operativa_value, operativa_disabled
 '''
 # Callback para el dropdown de Estado Operativo del CCONNA
 @app.callback(
@@ -317,66 +240,35 @@ def set_operativa_cconna(creacion_selected):
 
 '''
 
-@app.callback(
-    [Output('cconna-por-ubicacion', 'figure'),        
-     Output('cconna-por-tipo', 'figure'),
-     Output('cconna-por-creacion', 'figure'),
-     Output('cconna-por-operativa', 'figure')],
-    [Input('dpto-cconna-dropdown', 'value'),
-     Input('prov-cconna-dropdown', 'value'),
-     Input('dist-cconna-dropdown', 'value'),
-     Input('tipo-cconna-dropdown', 'value'),
-     Input('creacion-cconna-dropdown', 'value'),
-     Input('operativa-cconna-dropdown', 'value')]
-)
-def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
-    # Función para obtener el nombre a partir del código UBIGEO
-    def get_nombre_from_ubigeo(ubigeo_code):
-        if not ubigeo_code:
-            return None
-        if ubigeo_code == '150000':
-            return 'Lima Metropolitana'
-        elif ubigeo_code == '260000':
-            return 'Lima Provincia'
-        else:
-            query = 'SELECT "nombre" FROM ubigeo WHERE "ubigeo" = :ubigeo_code'
-            df = run_query(query, {'ubigeo_code': ubigeo_code})
-            if not df.empty:
-                return df.iloc[0]['nombre']
-            else:
-                return None
-
-    # Obtener los nombres correspondientes a los códigos UBIGEO seleccionados
-    dpto_nombre = get_nombre_from_ubigeo(dpto_code)
-    prov_nombre = get_nombre_from_ubigeo(prov_code)
-    dist_nombre = get_nombre_from_ubigeo(dist_code)
-    
-    # Construir la consulta SQL base
-    query = "SELECT * FROM cconna WHERE 1=1"
+def filtros_cconna(dpto_nombre, prov_nombre, dist_nombre, tipo, creacion):
+    """
+    Condiciones comunes a las consultas sobre cconna (se agregan tras 'WHERE 1=1').
+    """
+    where_clause = ""
     params = {}
 
     # Filtrar por departamento
     if dpto_nombre:
-        query += ' AND "Región" = :dpto'
+        where_clause += ' AND "Región" = :dpto'
         params['dpto'] = dpto_nombre
 
     # Filtrar por provincia
     if prov_nombre:
-        query += ' AND "Provincia" = :prov'
+        where_clause += ' AND "Provincia" = :prov'
         params['prov'] = prov_nombre
 
     # Filtrar por distrito
     if dist_nombre:
-        query += ' AND "Distrito" = :dist'
+        where_clause += ' AND "Distrito" = :dist'
         params['dist'] = dist_nombre
 
     # Filtrar por tipo de CCONNA
     if tipo:
         if isinstance(tipo, list):
-            query += ' AND "Tipo de CCONNA " IN :tipo'
+            where_clause += ' AND "Tipo de CCONNA " IN :tipo'
             params['tipo'] = tuple(tipo)
         else:
-            query += ' AND "Tipo de CCONNA " = :tipo'
+            where_clause += ' AND "Tipo de CCONNA " = :tipo'
             params['tipo'] = tipo
 
     # Filtrar por estado de creación
@@ -388,65 +280,151 @@ def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
                     creacion_conditions.append('"Fecha de la Ordenanza" IS NOT NULL')
                 elif estado == 'No creada':
                     creacion_conditions.append('"Fecha de la Ordenanza" IS NULL')
-            query += ' AND (' + ' OR '.join(creacion_conditions) + ')'
+            where_clause += ' AND (' + ' OR '.join(creacion_conditions) + ')'
         else:
             if creacion == 'Creada':
-                query += ' AND "Fecha de la Ordenanza" IS NOT NULL'
+                where_clause += ' AND "Fecha de la Ordenanza" IS NOT NULL'
             elif creacion == 'No creada':
-                query += ' AND "Fecha de la Ordenanza" IS NULL'
+                where_clause += ' AND "Fecha de la Ordenanza" IS NULL'
 
-    # Ejecutar la consulta
-    df = run_query(query, params)
-    
+    return where_clause, params
 
-    # Procesar el estado de vigencia
-    def parse_date(date_str):
-        if pd.isnull(date_str) or str(date_str).strip() == '':
-            return pd.NaT
-        for fmt in ('%d/%m/%Y', '%Y', '%Y-%m-%d', '%d-%m-%Y'):
-            try:
-                return pd.to_datetime(date_str, format=fmt, dayfirst=True)
-            except (ValueError, TypeError):
-                continue
-        return pd.to_datetime(date_str, errors='coerce')
-
-    df['fecha_inicio'] = df['Fecha de inicio del CCONNA'].apply(parse_date)
-    df['fecha_termino'] = df['Fecha de termino del CCONNA'].apply(parse_date)
-    today = pd.to_datetime(datetime.today().date())
-
-    def determine_vigencia(row):
-        if pd.isnull(row['fecha_inicio']):
-            return 'No Vigente'
-        elif pd.isnull(row['fecha_termino']):
-            if row['fecha_inicio'] <= today:
-                return 'Vigente'
-            else:
-                return 'No Vigente'
-        else:
-            if row['fecha_inicio'] <= today <= row['fecha_termino']:
-                return 'Vigente'
-            else:
-                return 'No Vigente'
 
-    df['estado_vigencia'] = df.apply(determine_vigencia, axis=1)
+def _conteo(df, columna):
+    conteo = df[[columna, 'cantidad']].dropna(subset=[columna])
+    return conteo.sort_values('cantidad', ascending=False, kind='stable').reset_index(drop=True)
+
 
-    # Filtrar por estado de vigencia
+def agregacion_sql_disponible():
+    """
+    Indica si los conteos se pueden calcular en la base: requiere la función
+    fecha_cconna de la migración 005. La comprobación queda en el cache de
+    consultas, así que no se repite en cada callback.
+    """
+    if not CCONNA_AGREGACION_SQL:
+        return False
+    df = run_query("SELECT to_regprocedure('fecha_cconna(text)') IS NOT NULL AS existe", cache=True)
+    return df is not None and bool(df['existe'][0])
+
+
+def conteos_cconna_sql(where_clause, params, ubicacion_field, vigencia):
+    """
+    Calcula en la base de datos los conteos por ubicación, tipo, creación y
+    vigencia con un único GROUPING SETS. Devuelve None si la consulta falla.
+    """
+    params = dict(params)
+    vigencia_clause = ""
     if vigencia:
         if isinstance(vigencia, list):
-            df = df[df['estado_vigencia'].isin(vigencia)]
+            vigencia_clause = " WHERE estado_vigencia IN :vigencia"
+            params['vigencia'] = tuple(vigencia)
         else:
-            df = df[df['estado_vigencia'] == vigencia]
+            vigencia_clause = " WHERE estado_vigencia = :vigencia"
+            params['vigencia'] = vigencia
+
+    query = f"""
+    WITH fechas AS (
+        SELECT "{ubicacion_field}" AS ubicacion,
+               "Tipo de CCONNA " AS tipo,
+               CASE WHEN "Fecha de la Ordenanza" IS NOT NULL THEN 'Creada' ELSE 'No creada' END AS estado_creacion,
+               {sql_fecha('"Fecha de inicio del CCONNA"')} AS fecha_inicio,
+               {sql_fecha('"Fecha de termino del CCONNA"')} AS fecha_termino
+        FROM cconna
+        WHERE 1=1{where_clause}
+    ), base AS (
+        SELECT ubicacion, tipo, estado_creacion,
+               {sql_vigencia('fecha_inicio', 'fecha_termino')} AS estado_vigencia
+        FROM fechas
+    )
+    SELECT ubicacion, tipo, estado_creacion, estado_vigencia,
+           GROUPING(ubicacion) AS g_ubicacion,
+           GROUPING(tipo) AS g_tipo,
+           GROUPING(estado_creacion) AS g_creacion,
+           GROUPING(estado_vigencia) AS g_vigencia,
+           COUNT(*) AS cantidad
+    FROM base{vigencia_clause}
+    GROUP BY GROUPING SETS ((ubicacion), (tipo), (estado_creacion), (estado_vigencia), ())
+    """
+    df = run_query(query, params, cache=True)
+    if df is None:
+        return None
 
-    # Verificar si el DataFrame está vacío
-    if df.empty:
-        # Crear figuras vacías con un mensaje
-        fig_ubicacion = px.bar(title='No hay datos disponibles para la ubicación seleccionada.')
-        fig_tipo = px.pie(title='No hay datos disponibles para el tipo seleccionado.')
-        fig_creacion = px.pie(title='No hay datos disponibles para el estado de creación seleccionado.')
-        fig_vigencia = px.pie(title='No hay datos disponibles para el estado de vigencia seleccionado.')
-        return fig_ubicacion, fig_tipo, fig_creacion, fig_vigencia
+    total = df[(df['g_ubicacion'] == 1) & (df['g_tipo'] == 1) & (df['g_creacion'] == 1) & (df['g_vigencia'] == 1)]
+    return {
+        'filas': int(total['cantidad'].sum()),
+        'ubicacion': _conteo(df[df['g_ubicacion'] == 0], 'ubicacion'),
+        'tipo': _conteo(df[df['g_tipo'] == 0], 'tipo'),
+        'creacion': _conteo(df[df['g_creacion'] == 0], 'estado_creacion'),
+        'vigencia': _conteo(df[df['g_vigencia'] == 0], 'estado_vigencia'),
+    }
+
+
+def _contar(serie):
+    # En una columna categórica value_counts también lista las categorías sin filas
+    conteo = serie.value_counts()
+    return conteo[conteo > 0].reset_index()
+
+
+def conteos_cconna_pandas(where_clause, params, ubicacion_field, vigencia):
+    """
+    Calcula los mismos conteos que conteos_cconna_sql trayendo las filas a pandas.
+    Como mucho CCONNA_PANDAS_SIMULTANEOS cálculos a la vez en todo el servidor.
+    """
+    query = f"""
+    SELECT "{ubicacion_field}", "Tipo de CCONNA ", "Fecha de la Ordenanza",
+           "Fecha de inicio del CCONNA", "Fecha de termino del CCONNA"
+    FROM cconna
+    WHERE 1=1{where_clause}
+    """
+    with cupo('cconna_pandas', CCONNA_PANDAS_SIMULTANEOS, CALLBACKS_CACHE_DIR):
+        # Las columnas que se cuentan repiten pocos valores: se leen como categorías
+        df = run_query(query, params, chunksize=DB_FETCH_CHUNK,
+                       dtypes={ubicacion_field: 'category', 'Tipo de CCONNA ': 'category'})
+
+        # Procesar el estado de vigencia
+        df['fecha_inicio'] = parse_fechas(df['Fecha de inicio del CCONNA'])
+        df['fecha_termino'] = parse_fechas(df['Fecha de termino del CCONNA'])
+        df['estado_vigencia'] = clasificar_vigencia(df['fecha_inicio'], df['fecha_termino'])
+
+        # Filtrar por estado de vigencia
+        if vigencia:
+            if isinstance(vigencia, list):
+                df = df[df['estado_vigencia'].isin(vigencia)]
+            else:
+                df = df[df['estado_vigencia'] == vigencia]
 
-    # Figura 1: Histograma según la ubicación
+        df = df.assign(estado_creacion=np.where(df['Fecha de la Ordenanza'].notna(), 'Creada', 'No creada'))
+        return {
+            'filas': len(df),
+            'ubicacion': _contar(df[ubicacion_field]),
+            'tipo': _contar(df['Tipo de CCONNA ']),
+            'creacion': _contar(df['estado_creacion']),
+            'vigencia': _contar(df['estado_vigencia']),
+        }
+
+@app.callback(
+    [Output('cconna-por-ubicacion', 'figure'),        
+     Output('cconna-por-tipo', 'figure'),
+     Output('cconna-por-creacion', 'figure'),
+     Output('cconna-por-operativa', 'figure')],
+    [Input('dpto-cconna-dropdown', 'value'),
+     Input('prov-cconna-dropdown', 'value'),
+     Input('dist-cconna-dropdown', 'value'),
+     Input('tipo-cconna-dropdown', 'value'),
+     Input('creacion-cconna-dropdown', 'value'),
+     Input('operativa-cconna-dropdown', 'value')],
+    background=CCONNA_SEGUNDO_PLANO
+)
+@cachear_figuras('cconna.update_graphs')
+def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
+    # Obtener los nombres correspondientes a los códigos UBIGEO seleccionados
+    dpto_nombre = get_nombre_from_ubigeo(dpto_code)
+    prov_nombre = get_nombre_from_ubigeo(prov_code)
+    dist_nombre = get_nombre_from_ubigeo(dist_code)
+
+    where_clause, params = filtros_cconna(dpto_nombre, prov_nombre, dist_nombre, tipo, creacion)
+
+    # Campo de ubicación y rótulo según el nivel seleccionado
     if dist_nombre:
         rotulo = f'del Distrito {dist_nombre}, en la Provincia {prov_nombre}, Región {dpto_nombre}'
         ubicacion_field = 'Distrito'
@@ -460,7 +438,24 @@ def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
          rotulo = 'a nivel Nacional'
          ubicacion_field='Región'
 
-    count_df = df[ubicacion_field].value_counts().reset_index()
+    # Calcular los conteos en la base de datos; si no es posible o falla, calcularlos en pandas
+    conteos = None
+    if agregacion_sql_disponible():
+        conteos = conteos_cconna_sql(where_clause, params, ubicacion_field, vigencia)
+    if conteos is None:
+        conteos = conteos_cconna_pandas(where_clause, params, ubicacion_field, vigencia)
+
+    # Verificar si no hay registros
+    if conteos['filas'] == 0:
+        # Crear figuras vacías con un mensaje
+        fig_ubicacion = px.bar(title='No hay datos disponibles para la ubicación seleccionada.')
+        fig_tipo = px.pie(title='No hay datos disponibles para el tipo seleccionado.')
+        fig_creacion = px.pie(title='No hay datos disponibles para el estado de creación seleccionado.')
+        fig_vigencia = px.pie(title='No hay datos disponibles para el estado de vigencia seleccionado.')
+        return fig_ubicacion, fig_tipo, fig_creacion, fig_vigencia
+
+    # Figura 1: Histograma según la ubicación
+    count_df = conteos['ubicacion']
     count_df.columns = [ubicacion_field, 'Cantidad']
     total = count_df['Cantidad'].sum()
     fig_ubicacion = px.bar(count_df, 
@@ -470,7 +465,7 @@ def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
                            color_discrete_sequence=colores_seaborn)
 
     # Figura 2: Pie chart según el tipo de CCONNA
-    tipo_counts = df['Tipo de CCONNA '].value_counts().reset_index()
+    tipo_counts = conteos['tipo']
     tipo_counts.columns = ['Tipo de CCONNA', 'Cantidad']
     fig_tipo = px.pie(tipo_counts, 
                       names='Tipo de CCONNA', 
@@ -479,8 +474,7 @@ def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
                       color_discrete_sequence=colores_seaborn)
 
     # Figura 3: Pie chart según el estado de creación
-    df['estado_creacion'] = df['Fecha de la Ordenanza'].apply(lambda x: 'Creada' if pd.notnull(x) else 'No creada')
-    creacion_counts = df['estado_creacion'].value_counts().reset_index()
+    creacion_counts = conteos['creacion']
     creacion_counts.columns = ['Estado de Creación', 'Cantidad']
     fig_creacion = px.pie(creacion_counts, 
                           names='Estado de Creación', 
@@ -489,7 +483,7 @@ def update_graphs(dpto_code, prov_code, dist_code, tipo, creacion, vigencia):
                           color_discrete_sequence=colores_seaborn)
 
     # Figura 4: Pie chart según el estado de vigencia
-    vigencia_counts = df['estado_vigencia'].value_counts().reset_index()
+    vigencia_counts = conteos['vigencia']
     vigencia_counts.columns = ['Estado de Vigencia', 'Cantidad']
     fig_vigencia = px.pie(vigencia_counts, 
                           names='Estado de Vigencia', 
@@ -3,29 +3,73 @@ import plotly.express as px
 import pandas as pd
 import dash_bootstrap_components as dbc
 from app import app  # Importar la instancia de la aplicación desde app.py
-from utils.data_loader import run_query
+from utils.data_loader import run_query, version_datos
+from utils.ubigeo_cache import ubicaciones_dna
+from utils.catalogos import cargar_catalogos, opciones, valores_por_defecto
+from utils.resumenes import resumen_disponible
+from utils.busqueda import indice_defensores
+from utils.personas import perfil
+from utils.series_temporales import consulta_acumulada, params_serie
+from utils.cache_figuras import cachear_figuras
 from sqlalchemy import text
+from collections import OrderedDict
 import math
+import threading
+import time
 
 colores_seaborn = px.colors.qualitative.Set2
 
-# Callbacks para cargar opciones iniciales
-@app.callback(Output('dpto-defensores-dropdown', 'options'),
-              Input('dpto-defensores-dropdown', 'search_value'))
+# Valores por defecto de los filtros
+CARGOS_POR_DEFECTO = ['Responsable', 'Defensor']
 
-def load_dptos(search_value):
-    query = "SELECT DISTINCT \"dpto\" FROM dna ORDER BY \"dpto\""
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['dpto']]
+# Catálogos de la página (cada consulta devuelve una columna `valor`)
+CATALOGOS_DEFENSORES = {
+    'cargos': """
+    SELECT DISTINCT e.descripcion AS valor
+    FROM cargo e
+    JOIN defensores d ON e.codigo = d.cargo
+    """,
+    'ocupaciones': """
+    SELECT DISTINCT m.ocupacion AS valor
+    FROM ocupacion m
+    JOIN defensores d ON m.codigo = d.ocupacion
+    """,
+}
+
+def fuente_graficos():
+    # Columnas de los gráficos: desde el resumen precalculado si existe, o desde las tablas originales
+    if resumen_disponible('resumen_defensores'):
+        return {'from': 'FROM resumen_defensores dna', 'cargo': 'dna.cargo', 'ocupacion': 'dna.ocupacion',
+                'cantidad': 'SUM(dna.cantidad)'}
+    return {
+        'from': """FROM defensores d
+    JOIN dna ON d.codigo_dna = dna.codigo
+    JOIN cargo c ON d.cargo = c.codigo
+    JOIN ocupacion o ON d.ocupacion = o.codigo""",
+        'cargo': 'c.descripcion', 'ocupacion': 'o.ocupacion', 'cantidad': 'COUNT(*)',
+    }
+
+# Opciones iniciales y valores por defecto de todos los filtros en una sola petición
+@app.callback(
+    [Output('dpto-defensores-dropdown', 'options'),
+     Output('cargo-defensores-dropdown', 'options'),
+     Output('cargo-defensores-dropdown', 'value'),
+     Output('ocupacion-defensores-dropdown', 'options')],
+    Input('defensores-carga-inicial', 'data')
+)
+def carga_inicial(_):
+    catalogos = cargar_catalogos(CATALOGOS_DEFENSORES)
+    cargos = catalogos['cargos']
+    return (ubicaciones_dna.departamentos(),
+            opciones(cargos), valores_por_defecto(cargos, CARGOS_POR_DEFECTO),
+            opciones(catalogos['ocupaciones']))
 
 # Callbacks para actualizar los dropdowns
 @app.callback(Output('prov-defensores-dropdown', 'options'),
               Input('dpto-defensores-dropdown', 'value'))
 def set_provincias_options(selected_dpto):
     if selected_dpto:
-        query = "SELECT DISTINCT \"prov\" FROM dna WHERE \"dpto\" = :dpto ORDER BY \"prov\""
-        df = run_query(query, {'dpto': selected_dpto})
-        return [{'label': i, 'value': i} for i in df['prov']]
+        return ubicaciones_dna.provincias(selected_dpto)
     return []
 
 @app.callback(Output('dist-defensores-dropdown', 'options'),
@@ -33,50 +77,9 @@ def set_provincias_options(selected_dpto):
               State('dpto-defensores-dropdown', 'value'))
 def set_distritos_options(selected_prov, selected_dpto):
     if selected_prov and selected_dpto:
-        query = "SELECT DISTINCT \"dist\" FROM dna WHERE \"dpto\" = :dpto AND \"prov\" = :prov ORDER BY \"dist\""
-        df = run_query(query, {'dpto': selected_dpto, 'prov': selected_prov})
-        return [{'label': i, 'value': i} for i in df['dist']]
+        return ubicaciones_dna.distritos(selected_dpto, selected_prov)
     return []
 
-# Callbacks para estados de DNA
-@app.callback(
-    Output('cargo-defensores-dropdown', 'options'),
-    Input('cargo-defensores-dropdown', 'search_value')
-)
-def load_cargos(search_value):
-    query = """
-    SELECT DISTINCT e.descripcion 
-    FROM cargo e
-    JOIN defensores d ON e.codigo = d.cargo
-    ORDER BY e.descripcion
-    """
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['descripcion']]
-
-# Valores por defecto de los estados de DNA
-@app.callback(
-    Output('cargo-defensores-dropdown', 'value'),
-    Input('cargo-defensores-dropdown', 'options')
-)
-def set_cargos_default(available_options):
-    default_values = ['Responsable', 'Defensor']
-    return [option['value'] for option in available_options if option['label'] in default_values]
-
-# Callbacks para estados de DNA
-@app.callback(
-    Output('ocupacion-defensores-dropdown', 'options'),
-    Input('ocupacion-defensores-dropdown', 'search_value')
-)
-def load_ocupaciones(search_value):
-    query = """
-    SELECT DISTINCT m.ocupacion 
-    FROM ocupacion m
-    JOIN defensores d ON m.codigo = d.ocupacion
-    ORDER BY m.ocupacion
-    """
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['ocupacion']]
-
 @app.callback(
     [Output('defensores-por-ubicacion', 'figure'),        
     Output('defensores-por-cargo', 'figure'),
@@ -85,11 +88,14 @@ def load_ocupaciones(search_value):
      Input('prov-defensores-dropdown', 'value'),
      Input('dist-defensores-dropdown', 'value'),
      Input('cargo-defensores-dropdown', 'value'),
-     Input('ocupacion-defensores-dropdown', 'value')]
+     Input('ocupacion-defensores-dropdown', 'value')],
+    prevent_initial_call=True  # Se calcula cuando carga_inicial aplica los valores por defecto
 )
+@cachear_figuras('defensores.update_graphs')
 def update_graphs(dpto, prov, dist, cargos, ocupaciones):
+    fuente = fuente_graficos()
     # Construir la consulta SQL base
-    query = """
+    query = f"""
     SELECT 
         CASE
             WHEN :dist IS NOT NULL THEN dna.dist
@@ -97,13 +103,10 @@ def update_graphs(dpto, prov, dist, cargos, ocupaciones):
             WHEN :dpto IS NOT NULL THEN dna.prov
             ELSE dna.dpto
         END as ubicacion,
-        c.descripcion as cargo,
-        o.ocupacion as ocupacion,
-        COUNT(*) as count
-    FROM defensores d
-    JOIN dna ON d.codigo_dna = dna.codigo
-    JOIN cargo c ON d.cargo = c.codigo
-    JOIN ocupacion o ON d.ocupacion = o.codigo
+        {fuente['cargo']} as cargo,
+        {fuente['ocupacion']} as ocupacion,
+        {fuente['cantidad']} as count
+    {fuente['from']}
     """
     
     where_clauses = []
@@ -117,17 +120,17 @@ def update_graphs(dpto, prov, dist, cargos, ocupaciones):
         where_clauses.append("dna.dpto = :dpto")
     
     if cargos:
-        where_clauses.append("c.descripcion IN :cargos")
+        where_clauses.append(f"{fuente['cargo']} IN :cargos")
         params['cargos'] = tuple(cargos)
     
     if ocupaciones:
-        where_clauses.append("o.ocupacion IN :ocupaciones")
+        where_clauses.append(f"{fuente['ocupacion']} IN :ocupaciones")
         params['ocupaciones'] = tuple(ocupaciones)
     
     if where_clauses:
         query += " WHERE " + " AND ".join(where_clauses)
     
-    query += """
+    query += f"""
     GROUP BY 
         CASE
             WHEN :dist IS NOT NULL THEN dna.dist
@@ -135,12 +138,12 @@ def update_graphs(dpto, prov, dist, cargos, ocupaciones):
             WHEN :dpto IS NOT NULL THEN dna.prov
             ELSE dna.dpto
         END,
-        c.descripcion,
-        o.ocupacion
+        {fuente['cargo']},
+        {fuente['ocupacion']}
     """
 
     # Ejecutar la consulta
-    df = run_query(query, params)
+    df = run_query(query, params, cache=True, cancelable='defensores.update_graphs')
     
     # Calcular el total
     total = df['count'].sum()
@@ -199,6 +202,70 @@ def update_graphs(dpto, prov, dist, cargos, ocupaciones):
 
     return fig_ubicacion, fig_cargo, fig_ocupacion
 
+# Paginación por clave (keyset) de la tabla de defensores
+FROM_DEFENSORES = """FROM defensores d
+    JOIN dna ON d.codigo_dna = dna.codigo
+    JOIN cargo c ON d.cargo = c.codigo
+    JOIN ocupacion o ON d.ocupacion = o.codigo"""
+CLAVE_DEFENSORES = "COALESCE(d.apellido, ''), COALESCE(d.nombres, ''), COALESCE(d.dni::text, ''), d.codigo_dna"
+# La clave puede repetirse: dentro de un empate se ordena por el resto de columnas
+# mostradas y la página salta las filas del empate que quedaron en la anterior
+ORDEN_DEFENSORES = f"{CLAVE_DEFENSORES}, c.descripcion, o.ocupacion"
+
+TTL_PAGINACION = 300
+MAX_FILTROS_PAGINACION = 256
+_paginacion_cache = OrderedDict()
+_paginacion_lock = threading.Lock()
+
+def paginacion_defensores(where_clauses, params, page_size, cancelable=None):
+    """
+    Devuelve el total de registros filtrados y, para la primera fila de cada
+    página, su clave (apellido, nombres, dni, codigo_dna) y cuántas filas con la
+    misma clave la preceden. Se calcula con una sola consulta por combinación de
+    filtros y se guarda en memoria.
+    """
+    firma = (tuple(where_clauses), tuple(sorted((k, v) for k, v in params.items())), page_size, version_datos())
+    ahora = time.monotonic()
+    with _paginacion_lock:
+        entrada = _paginacion_cache.get(firma)
+        if entrada is not None and ahora - entrada['creado'] < TTL_PAGINACION:
+            _paginacion_cache.move_to_end(firma)
+            return entrada
+
+    where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    query = f"""
+    SELECT clave_apellido, clave_nombres, clave_dni, codigo_dna, fila - primera AS salto, total
+    FROM (
+        SELECT COALESCE(d.apellido, '') AS clave_apellido,
+               COALESCE(d.nombres, '') AS clave_nombres,
+               COALESCE(d.dni::text, '') AS clave_dni,
+               d.codigo_dna,
+               ROW_NUMBER() OVER (ORDER BY {ORDEN_DEFENSORES}) AS fila,
+               RANK() OVER (ORDER BY {CLAVE_DEFENSORES}) AS primera,
+               COUNT(*) OVER () AS total
+        {FROM_DEFENSORES}
+        {where}
+    ) AS claves
+    WHERE (fila - 1) % :page_size = 0
+    ORDER BY fila
+    """
+    df = run_query(query, dict(params, page_size=page_size), cancelable=cancelable)
+    if df is None:
+        return None
+
+    entrada = {
+        'total': int(df['total'].iloc[0]) if not df.empty else 0,
+        'anclas': [(apellido, nombres, dni, codigo, int(salto)) for apellido, nombres, dni, codigo, salto
+                   in df[['clave_apellido', 'clave_nombres', 'clave_dni', 'codigo_dna', 'salto']].itertuples(index=False, name=None)],
+        'creado': ahora,
+    }
+    with _paginacion_lock:
+        _paginacion_cache[firma] = entrada
+        _paginacion_cache.move_to_end(firma)
+        while len(_paginacion_cache) > MAX_FILTROS_PAGINACION:
+            _paginacion_cache.popitem(last=False)
+    return entrada
+
 @app.callback(
     [Output('tabla-defensores', 'data'),
      Output('tabla-defensores', 'page_count'),
@@ -209,18 +276,13 @@ def update_graphs(dpto, prov, dist, cargos, ocupaciones):
      Input('cargo-defensores-dropdown', 'value'),
      Input('ocupacion-defensores-dropdown', 'value'),
      Input('tabla-defensores', 'page_current'),
-     Input('tabla-defensores', 'page_size')]
+     Input('tabla-defensores', 'page_size')],
+    prevent_initial_call=True  # Se calcula cuando carga_inicial aplica los valores por defecto
 )
 def update_tabla_defensores(dpto, prov, dist, cargos, ocupaciones, page_current, page_size):
-    # Construir la consulta SQL base
-    query = """
-    SELECT d.codigo_dna, d.nombres, d.apellido, c.descripcion as cargo, d.dni, o.ocupacion
-    FROM defensores d
-    JOIN dna ON d.codigo_dna = dna.codigo
-    JOIN cargo c ON d.cargo = c.codigo
-    JOIN ocupacion o ON d.ocupacion = o.codigo
-    """
-    
+    page_current = page_current or 0
+
+    # Construir las condiciones de filtrado
     where_clauses = []
     params = {'dpto': dpto, 'prov': prov, 'dist': dist}
     
@@ -238,23 +300,38 @@ def update_tabla_defensores(dpto, prov, dist, cargos, ocupaciones, page_current,
     if ocupaciones:
         where_clauses.append("o.ocupacion IN :ocupaciones")
         params['ocupaciones'] = tuple(ocupaciones)
-    
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-    
-    # Agregar ordenamiento y paginación
-    query += " ORDER BY d.apellido, d.nombres"
-    query += f" LIMIT {page_size} OFFSET {page_current * page_size}"
+
+    # Total de registros y claves de inicio de cada página (cacheados por filtros)
+    paginacion = paginacion_defensores(where_clauses, params, page_size, cancelable='defensores.update_tabla_defensores')
+    if paginacion is None or page_current >= len(paginacion['anclas']):
+        total_pages = math.ceil(paginacion['total'] / page_size) if paginacion else 0
+        return [], total_pages, total_pages
+
+    # Buscar la página a partir de su clave de inicio (keyset); el OFFSET solo
+    # salta las filas con la misma clave que ya se mostraron en la página anterior
+    ancla = paginacion['anclas'][page_current]
+    params.update({
+        'ancla_apellido': ancla[0],
+        'ancla_nombres': ancla[1],
+        'ancla_dni': ancla[2],
+        'ancla_codigo': ancla[3],
+        'ancla_salto': ancla[4],
+        'page_size': page_size,
+    })
+    where_clauses.append(f"({CLAVE_DEFENSORES}) >= (:ancla_apellido, :ancla_nombres, :ancla_dni, :ancla_codigo)")
+    query = f"""
+    SELECT d.codigo_dna, d.nombres, d.apellido, c.descripcion as cargo, d.dni, o.ocupacion
+    {FROM_DEFENSORES}
+    WHERE {' AND '.join(where_clauses)}
+    ORDER BY {ORDEN_DEFENSORES}
+    LIMIT :page_size OFFSET :ancla_salto
+    """
     
     # Ejecutar la consulta
-    df = run_query(query, params)
-    
-    # Obtener el conteo total de registros para la paginación
-    count_query = f"SELECT COUNT(*) as total FROM ({query.split('ORDER BY')[0]}) as subquery"
-    total_records = run_query(count_query, params).iloc[0]['total']
+    df = run_query(query, params, cancelable='defensores.update_tabla_defensores')
     
     # Calcular el número total de páginas
-    total_pages = math.ceil(total_records / page_size)
+    total_pages = math.ceil(paginacion['total'] / page_size)
     
     return df.to_dict('records'), total_pages, total_pages
 
@@ -266,49 +343,36 @@ def update_tabla_defensores(dpto, prov, dist, cargos, ocupaciones, page_current,
      Input('prov-defensores-dropdown', 'value'),
      Input('dist-defensores-dropdown', 'value')]
 )
+@cachear_figuras('defensores.update_nombramientos_acumulados_graph')
 def update_nombramientos_acumulados_graph(fecha_inicio, fecha_fin, dpto, prov, dist):
     # Convertir las fechas a objetos datetime
     fecha_inicio = pd.to_datetime(fecha_inicio)
     fecha_fin = pd.to_datetime(fecha_fin)
 
-    # Construir la consulta SQL
-    query = """
-    SELECT d.f_nombramiento AS fecha
-    FROM defensores d
-    JOIN dna ON d.codigo_dna = dna.codigo
-    WHERE d.f_nombramiento BETWEEN :fecha_inicio AND :fecha_fin
-    """
-    
-    params = {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin}
+    # Intervalo (día, semana, mes o año) según la amplitud del rango de fechas
+    params = params_serie(fecha_inicio, fecha_fin)
+    condiciones = []
     
     # Agregar filtros de ubicación si están presentes
     if dist:
-        query += " AND dna.dpto = :dpto AND dna.prov = :prov AND dna.dist = :dist"
+        condiciones.append("dna.dpto = :dpto AND dna.prov = :prov AND dna.dist = :dist")
         params.update({'dpto': dpto, 'prov': prov, 'dist': dist})
     elif prov:
-        query += " AND dna.dpto = :dpto AND dna.prov = :prov"
+        condiciones.append("dna.dpto = :dpto AND dna.prov = :prov")
         params.update({'dpto': dpto, 'prov': prov})
     elif dpto:
-        query += " AND dna.dpto = :dpto"
+        condiciones.append("dna.dpto = :dpto")
         params.update({'dpto': dpto})
-    
-    query += " ORDER BY d.f_nombramiento"
-
-    # Ejecutar la consulta
-    df = run_query(query, params)
-
-    # Convertir la columna de fecha a datetime
-    df['fecha'] = pd.to_datetime(df['fecha'])
-
-    # Crear una serie de fechas desde el inicio hasta el fin
-    fecha_rango = pd.date_range(start=fecha_inicio, end=fecha_fin, freq='D')
-
-    # Contar nombramientos acumulados por día
-    nombramientos_acumulados = df['fecha'].value_counts().sort_index().cumsum()
 
-    # Crear un DataFrame con todas las fechas y los nombramientos acumulados
-    df_acumulado = pd.DataFrame({'fecha': fecha_rango})
-    df_acumulado['nombramientos_acumulados'] = df_acumulado['fecha'].map(nombramientos_acumulados).fillna(method='ffill').fillna(0)
+    # Nombramientos acumulados calculados en la base de datos, ya agrupados por intervalo
+    query = consulta_acumulada(
+        'd.f_nombramiento',
+        """FROM defensores d
+        JOIN dna ON d.codigo_dna = dna.codigo""",
+        condiciones,
+    )
+    df = run_query(query, params, cache=True, dtypes={'fecha': 'datetime64[ns]'})
+    df_acumulado = df.rename(columns={'acumulado': 'nombramientos_acumulados'})
 
     # Crear la gráfica
     fig = px.line(df_acumulado, x='fecha', y='nombramientos_acumulados', 
@@ -339,34 +403,19 @@ def buscar_defensor(n_clicks, search_value):
     if n_clicks is None or not search_value:
         return None, None
     
-    # Construir la consulta SQL
-    query = """
-    SELECT d.codigo_dna, d.nombres, d.apellido, c.descripcion as cargo, d.dni, o.ocupacion,
-           dna.dpto, dna.prov, dna.dist
-    FROM defensores d
-    JOIN dna ON d.codigo_dna = dna.codigo
-    JOIN cargo c ON d.cargo = c.codigo
-    JOIN ocupacion o ON d.ocupacion = o.codigo
-    WHERE d.nombres ILIKE :search
-       OR d.apellido ILIKE :search
-       OR d.dni = :dni
-    LIMIT 10
-    """
-    
-    params = {
-        'search': f'%{search_value}%',
-        'dni': search_value if search_value.isdigit() else None
-    }
-    
-    # Ejecutar la consulta
-    df = run_query(query, params)
+    if search_value.strip().isdigit():
+        # Un DNI se resuelve directamente con el perfil de la persona
+        resultados = perfil(search_value)['defensores'][:10]
+    else:
+        # Buscar en el índice en memoria por nombres y apellidos (sin tildes ni mayúsculas)
+        resultados = indice_defensores.buscar(search_value, limite=10)
     
-    if df.empty:
+    if not resultados:
         return None, "No se encontraron defensores con los criterios de búsqueda proporcionados."
     
     # Crear una lista de tarjetas con la información de los defensores
     defensor_cards = []
-    for _, row in df.iterrows():
+    for row in resultados:
         card = dbc.Card(
             dbc.CardBody([
                 html.H5(f"{row['nombres']} {row['apellido']}", className="card-title"),
@@ -375,6 +424,8 @@ def buscar_defensor(n_clicks, search_value):
                 html.P(f"Ocupación: {row['ocupacion']}", className="card-text"),
                 html.P(f"Ubicación: {row['dist']}, {row['prov']}, {row['dpto']}", className="card-text"),
                 html.P(f"Código DNA: {row['codigo_dna']}", className="card-text"),
+                html.P(f"Capacitaciones registradas: {len(perfil(row['dni'])['capacitaciones']) if row['dni'] else 0}",
+                       className="card-text"),
             ]),
             className="mb-3"
         )
@@ -1,28 +1,71 @@
 from dash import Input, Output, State, dash_table, html
 import plotly.express as px
 import pandas as pd
+import os
 from app import app  # Importar la instancia de la aplicación desde app.py
-from utils.data_loader import run_query
+from utils.data_loader import run_query, version_datos
+from utils.cache import CacheLRU
+from utils.series_temporales import consulta_acumulada, params_serie
+from utils.ubigeo_cache import ubicaciones_dna
+from utils.catalogos import cargar_catalogos, opciones, valores_por_defecto
+from utils.resumenes import resumen_disponible
+from utils.cache_figuras import cachear_figuras
 from sqlalchemy import text
 
 colores_seaborn = px.colors.qualitative.Set2
 
-# Callbacks para cargar opciones iniciales
-@app.callback(Output('dpto-dna-dropdown', 'options'),
-              Input('dpto-dna-dropdown', 'search_value'))
+# Valores por defecto de los filtros
+ESTADOS_POR_DEFECTO = ['Acreditada', 'No acreditada', 'No operativa']
+TIPOS_POR_DEFECTO = ['Distrital', 'Provincial']
+
+# Catálogos de la página (cada consulta devuelve una columna `valor`)
+CATALOGOS_DEFENSORIAS = {
+    'estados': """
+    SELECT DISTINCT e.estado AS valor
+    FROM estadodna e
+    JOIN dna d ON e.codigo = d.estado_acreditacion
+    """,
+    'tipos': """
+    SELECT DISTINCT m.siglas AS valor
+    FROM modelodna m
+    JOIN dna d ON m.codigo = d.modelo
+    """,
+}
+
+def fuente_graficos():
+    # Columnas de los gráficos: desde el resumen precalculado si existe, o desde las tablas originales
+    if resumen_disponible('resumen_dna'):
+        return {'from': 'FROM resumen_dna d', 'estado': 'd."estado"', 'siglas': 'd."siglas"',
+                'cantidad': 'SUM(d.cantidad)'}
+    return {
+        'from': """FROM dna d
+    JOIN estadodna e ON d.estado_acreditacion = e.codigo
+    JOIN modelodna m ON d.modelo = m.codigo""",
+        'estado': 'e."estado"', 'siglas': 'm."siglas"', 'cantidad': 'COUNT(*)',
+    }
+
+# Opciones iniciales y valores por defecto de todos los filtros en una sola petición
+@app.callback(
+    [Output('dpto-dna-dropdown', 'options'),
+     Output('estado-dna-dropdown', 'options'),
+     Output('estado-dna-dropdown', 'value'),
+     Output('tipo-dna-dropdown', 'options'),
+     Output('tipo-dna-dropdown', 'value')],
+    Input('defensorias-carga-inicial', 'data')
+)
+def carga_inicial(_):
+    catalogos = cargar_catalogos(CATALOGOS_DEFENSORIAS)
+    estados, tipos = catalogos['estados'], catalogos['tipos']
+    return (ubicaciones_dna.departamentos(),
+            opciones(estados), valores_por_defecto(estados, ESTADOS_POR_DEFECTO),
+            opciones(tipos), valores_por_defecto(tipos, TIPOS_POR_DEFECTO))
 
-def load_dptos(search_value):
-    query = "SELECT DISTINCT \"dpto\" FROM dna ORDER BY \"dpto\""
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['dpto']]
 # Callbacks para actualizar los dropdowns
 @app.callback(Output('prov-dna-dropdown', 'options'),
               Input('dpto-dna-dropdown', 'value'))
 def set_provincias_options(selected_dpto):
     if selected_dpto:
-        query = "SELECT DISTINCT \"prov\" FROM dna WHERE \"dpto\" = :dpto ORDER BY \"prov\""
-        df = run_query(query, {'dpto': selected_dpto})
-        return [{'label': i, 'value': i} for i in df['prov']]
+        return ubicaciones_dna.provincias(selected_dpto)
     return []
 
 @app.callback(Output('dist-dna-dropdown', 'options'),
@@ -30,63 +73,9 @@ def set_provincias_options(selected_dpto):
               State('dpto-dna-dropdown', 'value'))
 def set_distritos_options(selected_prov, selected_dpto):
     if selected_prov and selected_dpto:
-        query = "SELECT DISTINCT \"dist\" FROM dna WHERE \"dpto\" = :dpto AND \"prov\" = :prov ORDER BY \"dist\""
-        df = run_query(query, {'dpto': selected_dpto, 'prov': selected_prov})
-        return [{'label': i, 'value': i} for i in df['dist']]
+        return ubicaciones_dna.distritos(selected_dpto, selected_prov)
     return []
 
-# Callbacks para estados de DNA
-@app.callback(
-    Output('estado-dna-dropdown', 'options'),
-    Input('estado-dna-dropdown', 'search_value')
-)
-def load_estados(search_value):
-    query = """
-    SELECT DISTINCT e.estado 
-    FROM estadodna e
-    JOIN dna d ON e.codigo = d.estado_acreditacion
-    ORDER BY e.estado
-    """
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['estado']]
-
-# Valores por defecto de los estados de DNA
-@app.callback(
-    Output('estado-dna-dropdown', 'value'),
-    Input('estado-dna-dropdown', 'options')
-)
-def set_estado_default(available_options):
-    default_values = ['Acreditada', 'No acreditada', 'No operativa']
-    return [option['value'] for option in available_options if option['label'] in default_values]
-    
-# Callbacks para tipos de DNA
-@app.callback(
-    Output('tipo-dna-dropdown', 'options'),
-    Input('tipo-dna-dropdown', 'search_value')
-)
-def load_tipos(search_value):
-    # Cambia "estadodna" por el nombre correcto de la tabla que contiene "siglas", por ejemplo "modelodna"
-    query = """
-    SELECT DISTINCT m.siglas 
-    FROM modelodna m  -- Cambia "estadodna" por "modelodna"
-    JOIN dna d ON m.codigo = d.modelo
-    ORDER BY m.siglas
-    """
-    df = run_query(query)
-    return [{'label': i, 'value': i} for i in df['siglas']]
-
-# Valores por defecto de los tipos de DNA
-@app.callback(
-    Output('tipo-dna-dropdown', 'value'),
-    Input('tipo-dna-dropdown', 'options')
-)
-def set_tipo_default(available_options):
-    default_values = ['Distrital', 'Provincial']
-    return [option['value'] for option in available_options if option['label'] in default_values]
-
-
-
-
 @app.callback(
     [Output('dna-por-ubicacion', 'figure'),        
     Output('dna-por-estado', 'figure'),
@@ -95,39 +84,28 @@ def set_tipo_default(available_options):
      Input('prov-dna-dropdown', 'value'),
      Input('dist-dna-dropdown', 'value'),
      Input('estado-dna-dropdown', 'value'),
-     Input('tipo-dna-dropdown', 'value')]
+     Input('tipo-dna-dropdown', 'value')],
+    prevent_initial_call=True  # Se calcula cuando carga_inicial aplica los valores por defecto
 )
+@cachear_figuras('defensorias.update_graphs')
 def update_graphs(dpto, prov, dist, estados, tipos):
-    # Construir la consulta SQL base
-    query = "SELECT"
+    fuente = fuente_graficos()
     params = {}
-    
-    # Función para obtener el total
-    def get_total(where_clause, params):
-        total_query = f"""
-            SELECT COUNT(*) as total 
-            FROM dna d
-            JOIN estadodna e ON d.estado_acreditacion = e.codigo 
-            JOIN modelodna m ON d.modelo = m.codigo
-            {where_clause}
-        """
-        total_df = run_query(total_query, params)
-        return total_df['total'].iloc[0]
-    
+
     if dist:
-        query += " d.\"dist\" as ubicacion,"
+        ubicacion = "d.\"dist\""
         where_clause = " WHERE d.\"dpto\" = :dpto AND d.\"prov\" = :prov AND d.\"dist\" = :dist"
         params = {'dpto': dpto, 'prov': prov, 'dist': dist}
     elif prov:
-        query += " d.\"dist\" as ubicacion,"
+        ubicacion = "d.\"dist\""
         where_clause = " WHERE d.\"dpto\" = :dpto AND d.\"prov\" = :prov"
         params = {'dpto': dpto, 'prov': prov}
     elif dpto:
-        query += " d.\"prov\" as ubicacion,"
+        ubicacion = "d.\"prov\""
         where_clause = " WHERE d.\"dpto\" = :dpto"
         params = {'dpto': dpto}
     else:
-        query += " d.\"dpto\" as ubicacion,"
+        ubicacion = "d.\"dpto\""
         where_clause = ""
 
     # Agregar filtros de estados si existen
@@ -136,7 +114,7 @@ def update_graphs(dpto, prov, dist, estados, tipos):
             where_clause += " AND"
         else:
             where_clause += " WHERE"
-        where_clause += " e.\"estado\" IN :estados"
+        where_clause += f" {fuente['estado']} IN :estados"
         params['estados'] = tuple(estados)
     
     # Agregar filtros de tipos si existen
@@ -145,11 +123,28 @@ def update_graphs(dpto, prov, dist, estados, tipos):
             where_clause += " WHERE"
         else:
             where_clause += " AND"
-        where_clause += " m.\"siglas\" IN :tipos"
+        where_clause += f" {fuente['siglas']} IN :tipos"
         params['tipos'] = tuple(tipos)
 
-    # Obtener el total con todos los filtros aplicados
-    total = get_total(where_clause, params)
+    # Una sola consulta devuelve las series por ubicación, estado y tipo, y el total general
+    query = f"""
+    SELECT {ubicacion} AS ubicacion, {fuente['estado']} AS estado, {fuente['siglas']} AS siglas,
+           GROUPING({ubicacion}) AS g_ubicacion,
+           GROUPING({fuente['estado']}) AS g_estado,
+           GROUPING({fuente['siglas']}) AS g_siglas,
+           {fuente['cantidad']} AS count
+    {fuente['from']}
+    {where_clause}
+    GROUP BY GROUPING SETS (({ubicacion}), ({fuente['estado']}), ({fuente['siglas']}), ())
+    """
+
+    # Ejecutar la consulta
+    df = run_query(query, params, cache=True, cancelable='defensorias.update_graphs')
+
+    df_ubicacion = df[df['g_ubicacion'] == 0]
+    df_estado = df[df['g_estado'] == 0]
+    df_tipo = df[df['g_siglas'] == 0]
+    total = df.loc[(df['g_ubicacion'] == 1) & (df['g_estado'] == 1) & (df['g_siglas'] == 1), 'count'].sum()
 
     # Construir el título basado en los filtros aplicados
     if dist:
@@ -161,27 +156,20 @@ def update_graphs(dpto, prov, dist, estados, tipos):
     else:
         title = f'Número de Defensorías por Departamento: {total}'
 
-    # Completar la consulta principal
-    query += " e.\"estado\", m.\"siglas\", COUNT(*) as count FROM dna d JOIN estadodna e ON d.estado_acreditacion = e.codigo JOIN modelodna m ON d.modelo = m.codigo" + where_clause
-    query += " GROUP BY ubicacion, e.\"estado\", m.\"siglas\""
-
-    # Ejecutar la consulta
-    df = run_query(query, params)
-
     # Gráfico de defensorías por ubicación
-    fig_ubicacion = px.bar(df.groupby('ubicacion').sum().reset_index(), 
+    fig_ubicacion = px.bar(df_ubicacion.sort_values('ubicacion'), 
                         x='ubicacion', y='count',
                         title=title,
                         labels={'ubicacion': 'Ubicación', 'count': 'Número de Defensorías'},
                         color_discrete_sequence=colores_seaborn)
 
     # Gráfico de defensorías por estado de acreditación
-    fig_estado = px.pie(df, values='count', names='estado', 
+    fig_estado = px.pie(df_estado, values='count', names='estado', 
                         title=f'Distribución de Defensorías por Estado de Acreditación',
                         color_discrete_sequence=colores_seaborn)
 
     # Gráfico de defensorías por tipo de defensoría
-    fig_tipo = px.pie(df, values='count', names='siglas', 
+    fig_tipo = px.pie(df_tipo, values='count', names='siglas', 
                     title=f'Distribución de Defensorías por Tipo de Defensoría',
                     color_discrete_sequence=colores_seaborn)
 
@@ -207,60 +195,46 @@ def update_graphs(dpto, prov, dist, estados, tipos):
      Input('prov-dna-dropdown', 'value'),
      Input('dist-dna-dropdown', 'value'),
      Input('estado-dna-dropdown', 'value'),
-     Input('tipo-dna-dropdown', 'value')]
+     Input('tipo-dna-dropdown', 'value')],
+    prevent_initial_call=True  # Se calcula cuando carga_inicial aplica los valores por defecto
 )
+@cachear_figuras('defensorias.update_timeline')
 def update_timeline(fecha_inicio, fecha_fin, dpto, prov, dist, estados, tipos):
-    # Construir la consulta SQL base
-    query = """
-    SELECT d.f_acreditacion, COUNT(*) as count
-    FROM dna d
-    JOIN estadodna e ON d.estado_acreditacion = e.codigo
-    JOIN modelodna m ON d.modelo = m.codigo
-    WHERE d.f_acreditacion BETWEEN :fecha_inicio AND :fecha_fin
-    """
-    params = {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin}
+    # Intervalo (día, semana, mes o año) según la amplitud del rango de fechas
+    params = params_serie(fecha_inicio, fecha_fin)
+    condiciones = []
     
     # Agregar filtros de ubicación
     if dist:
-        query += " AND d.dpto = :dpto AND d.prov = :prov AND d.dist = :dist"
+        condiciones.append("d.dpto = :dpto AND d.prov = :prov AND d.dist = :dist")
         params.update({'dpto': dpto, 'prov': prov, 'dist': dist})
     elif prov:
-        query += " AND d.dpto = :dpto AND d.prov = :prov"
+        condiciones.append("d.dpto = :dpto AND d.prov = :prov")
         params.update({'dpto': dpto, 'prov': prov})
     elif dpto:
-        query += " AND d.dpto = :dpto"
+        condiciones.append("d.dpto = :dpto")
         params.update({'dpto': dpto})
     
     # Agregar filtros de estados si existen
     if estados:
-        query += " AND e.estado IN :estados"
+        condiciones.append("e.estado IN :estados")
         params['estados'] = tuple(estados)
     
     # Agregar filtros de tipos si existen
     if tipos:
-        query += " AND m.siglas IN :tipos"
+        condiciones.append("m.siglas IN :tipos")
         params['tipos'] = tuple(tipos)
     
-    # Agrupar por fecha de acreditación
-    query += " GROUP BY d.f_acreditacion ORDER BY d.f_acreditacion"
-    
-    # Ejecutar la consulta
-    df = run_query(query, params)
-    
-    # Convertir la columna de fecha a datetime
-    df['f_acreditacion'] = pd.to_datetime(df['f_acreditacion'])
-    
-    # Ordenar el DataFrame por fecha
-    df = df.sort_values('f_acreditacion')
-    
-    # Calcular la frecuencia acumulada
-    df['cumulative_count'] = df['count'].cumsum()
-    
-    # Asegurar que tenemos una fila para cada día en el rango de fechas
-    date_range = pd.date_range(start=fecha_inicio, end=fecha_fin)
-    df_full = pd.DataFrame({'f_acreditacion': date_range})
-    df = pd.merge(df_full, df, on='f_acreditacion', how='left')
-    df['cumulative_count'] = df['cumulative_count'].ffill().fillna(0)
+    # La serie acumulada se calcula en la base de datos, ya agrupada por intervalo
+    query = consulta_acumulada(
+        'd.f_acreditacion',
+        """FROM dna d
+        JOIN estadodna e ON d.estado_acreditacion = e.codigo
+        JOIN modelodna m ON d.modelo = m.codigo""",
+        condiciones,
+    )
+    df = run_query(query, params, cache=True, dtypes={'fecha': 'datetime64[ns]'})
+    df = df.rename(columns={'fecha': 'f_acreditacion', 'acumulado': 'cumulative_count'})
     
     # Crear el gráfico de línea con frecuencia acumulada
     fig = px.line(df, x='f_acreditacion', y='cumulative_count', 
@@ -300,24 +274,19 @@ def update_timeline(fecha_inicio, fecha_fin, dpto, prov, dist, estados, tipos):
 
 
 
-def format_date(date_string):
-    if pd.notnull(date_string):
-        return pd.to_datetime(date_string).strftime('%d/%m/%Y')
-    return ''
+# Cache del detalle de DNA por código: guarda el componente ya construido
+DETALLE_DNA_MAX = int(os.getenv('DETALLE_DNA_MAX', 2000))  # cantidad de DNAs
+DETALLE_DNA_TTL = int(os.getenv('DETALLE_DNA_TTL', 3600))  # segundos
+# Un código sin resultados se recuerda poco tiempo: la DNA puede registrarse por fuera de la aplicación
+DETALLE_DNA_NO_ENCONTRADA_TTL = int(os.getenv('DETALLE_DNA_NO_ENCONTRADA_TTL', 60))  # segundos
+DETALLE_DNA_DIAS_SUPERVISION = int(os.getenv('DETALLE_DNA_DIAS_SUPERVISION', 90))
 
-@app.callback(
-    [Output('dna-results', 'children'),
-     Output('dna-error-message', 'children')],
-    Input('buscar-dna-btn', 'n_clicks'),
-    State('dna-input', 'value'),
-    prevent_initial_call=True
-)
-def buscar_por_dna(n_clicks, codigo):
-    if not codigo or not codigo.isdigit() or len(codigo) != 5:
-        return None, "El código de la DNA debe contener exactamente 5 dígitos."
-    
-    query = """
+# Cada entrada cuenta como 1, así que max_bytes es la cantidad máxima de DNAs
+cache_detalle_dna = CacheLRU(max_bytes=DETALLE_DNA_MAX, ttl=DETALLE_DNA_TTL, medir=lambda _: 1)
+
+CONSULTA_DETALLE_DNA = """
     SELECT 
+        CAST(d.codigo AS text) AS codigo,
         m.siglas AS "Tipo de DNA",
         d.dpto AS "Departamento",
         d.prov AS "Provincia",
@@ -351,114 +320,141 @@ def buscar_por_dna(n_clicks, codigo):
     FROM dna d
     JOIN modelodna m ON d.modelo = m.codigo
     JOIN estadodna e ON d.estado_acreditacion = e.codigo
-    WHERE d.codigo = :codigo
     """
-    
-    df = run_query(query, {'codigo': codigo})
-    
-    if df.empty:
-        return html.Div("No se encontraron resultados para esta DNA."), None
-    
-    # Formatear fechas
-    date_columns = ['Fecha de Acreditación', 'Fecha Resolución de Creación', 'Fecha Resolución de ROF', 
-                    'Fecha de Registro', 'Última fecha de supervisión', 'Fecha del último curso', 'Fecha CCONNA']
-    for col in date_columns:
-        df[col] = df[col].apply(format_date)
-    
+
+COLUMNAS_FECHA_DNA = ['Fecha de Acreditación', 'Fecha Resolución de Creación', 'Fecha Resolución de ROF', 
+                      'Fecha de Registro', 'Última fecha de supervisión', 'Fecha del último curso', 'Fecha CCONNA']
+COLUMNAS_PERSONAL_DNA = ['Defensoras', 'Defensores', 'Promotoras', 'Promotores', 'Otras', 'Otros']
+
+# Estilos para la tabla
+TABLE_STYLE = {
+    'border-collapse': 'separate',
+    'border-spacing': '0',
+    'width': '100%',
+    'font-family': 'Arial, sans-serif',
+    'border': '1px solid #ddd',
+    'border-radius': '8px',
+    'overflow': 'hidden',
+    'box-shadow': '0 0 20px rgba(0, 0, 0, 0.1)'
+}
+
+TH_STYLE = {
+    'background-color': '#f8f8f8',
+    'color': '#333',
+    'font-weight': 'bold',
+    'padding': '12px',
+    'text-align': 'left',
+    'border-bottom': '2px solid #ddd'
+}
+
+TD_STYLE = {
+    'padding': '12px',  
+    'text-align': 'left',
+    'border-bottom': '1px solid #ddd'
+}
+
+def clave_dna(codigo):
+    # Los códigos de DNA se comparan como texto de 5 dígitos
+    codigo = str(codigo).strip()
+    return codigo.zfill(5) if codigo.isdigit() else codigo
+
+def leer_detalles_dna(condicion, params, sufijo=''):
+    """
+    Detalle de las DNAs que cumplen `condicion`, como lista de diccionarios con las
+    fechas ya formateadas (dd/mm/aaaa). Devuelve None si la consulta falla.
+    """
+    df = run_query(f"{CONSULTA_DETALLE_DNA} WHERE {condicion} {sufijo}", params)
+    if df is None:
+        return None
+    # Formatear fechas por columna en lugar de celda por celda
+    for col in COLUMNAS_FECHA_DNA:
+        df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%d/%m/%Y').fillna('')
+    for col in COLUMNAS_PERSONAL_DNA:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def _celdas(fila, *columnas):
+    celdas = []
+    for columna in columnas:
+        celdas += [html.Td(f'{columna}:', style=TD_STYLE), html.Td(fila[columna], style=TD_STYLE)]
+    return celdas
+
+def detalle_dna(fila):
     # Calcular totales de personal
-    total_mujeres = df['Defensoras'].fillna(0).iloc[0] + df['Promotoras'].fillna(0).iloc[0] + df['Otras'].fillna(0).iloc[0]
-    total_hombres = df['Defensores'].fillna(0).iloc[0] + df['Promotores'].fillna(0).iloc[0] + df['Otros'].fillna(0).iloc[0]
-    
-    # Estilos para la tabla
-    table_style = {
-        'border-collapse': 'separate',
-        'border-spacing': '0',
-        'width': '100%',
-        'font-family': 'Arial, sans-serif',
-        'border': '1px solid #ddd',
-        'border-radius': '8px',
-        'overflow': 'hidden',
-        'box-shadow': '0 0 20px rgba(0, 0, 0, 0.1)'
-    }
-    
-    th_style = {
-        'background-color': '#f8f8f8',
-        'color': '#333',
-        'font-weight': 'bold',
-        'padding': '12px',
-        'text-align': 'left',
-        'border-bottom': '2px solid #ddd'
-    }
-    
-    td_style = {
-        'padding': '12px',  
-        'text-align': 'left',
-        'border-bottom': '1px solid #ddd'
-    }
+    total_mujeres = sum(fila[c] or 0 for c in ('Defensoras', 'Promotoras', 'Otras'))
+    total_hombres = sum(fila[c] or 0 for c in ('Defensores', 'Promotores', 'Otros'))
     
     # Crear tabla HTML personalizada
     table = html.Table([
         html.Thead(
-            html.Tr([html.Th('Información General', colSpan=4, style=th_style), 
-                     html.Th('Detalles de Acreditación', colSpan=4, style=th_style)])
+            html.Tr([html.Th('Información General', colSpan=4, style=TH_STYLE), 
+                     html.Th('Detalles de Acreditación', colSpan=4, style=TH_STYLE)])
         ),
         html.Tbody([
+            html.Tr(_celdas(fila, 'Tipo de DNA', 'Departamento', 'Estado de Acreditación', 'Fecha de Acreditación')),
+            html.Tr(_celdas(fila, 'Provincia', 'Distrito', 'Resolución de Acreditación', 'Estado de Registro')),
+            html.Tr([html.Th('Información de Contacto', colSpan=4, style=TH_STYLE), 
+                     html.Th('Información Legal', colSpan=4, style=TH_STYLE)]),
+            html.Tr(_celdas(fila, 'Dirección DNA', 'Teléfono DNA', 'Fecha Resolución de Creación', 'Resolución de Creación')),
+            html.Tr(_celdas(fila, 'Correo electrónico DNA', 'Horario de atención', 'Fecha Resolución de ROF', 'Resolución de ROF')),
+            html.Tr([html.Th('Personal', colSpan=4, style=TH_STYLE), 
+                     html.Th('Información Adicional', colSpan=4, style=TH_STYLE)]),
+            html.Tr(_celdas(fila, 'Defensoras', 'Defensores', 'Última fecha de supervisión', 'Observaciones de la supervisión')),
+            html.Tr(_celdas(fila, 'Promotoras', 'Promotores', 'Último curso', 'Fecha del último curso')),
+            html.Tr(_celdas(fila, 'Otras', 'Otros', 'Fecha CCONNA', 'DNA Fortalecida')),
             html.Tr([
-                html.Td('Tipo de DNA:', style=td_style), html.Td(df['Tipo de DNA'].iloc[0], style=td_style),
-                html.Td('Departamento:', style=td_style), html.Td(df['Departamento'].iloc[0], style=td_style),
-                html.Td('Estado de Acreditación:', style=td_style), html.Td(df['Estado de Acreditación'].iloc[0], style=td_style),
-                html.Td('Fecha de Acreditación:', style=td_style), html.Td(df['Fecha de Acreditación'].iloc[0], style=td_style)
-            ]),
-            html.Tr([
-                html.Td('Provincia:', style=td_style), html.Td(df['Provincia'].iloc[0], style=td_style),
-                html.Td('Distrito:', style=td_style), html.Td(df['Distrito'].iloc[0], style=td_style),
-                html.Td('Resolución de Acreditación:', style=td_style), html.Td(df['Resolución de Acreditación'].iloc[0], style=td_style),
-                html.Td('Estado de Registro:', style=td_style), html.Td(df['Estado de Registro'].iloc[0], style=td_style)
-            ]),
-            html.Tr([html.Th('Información de Contacto', colSpan=4, style=th_style), 
-                     html.Th('Información Legal', colSpan=4, style=th_style)]),
-            html.Tr([
-                html.Td('Dirección DNA:', style=td_style), html.Td(df['Dirección DNA'].iloc[0], style=td_style),
-                html.Td('Teléfono DNA:', style=td_style), html.Td(df['Teléfono DNA'].iloc[0], style=td_style),
-                html.Td('Fecha Resolución de Creación:', style=td_style), html.Td(df['Fecha Resolución de Creación'].iloc[0], style=td_style),
-                html.Td('Resolución de Creación:', style=td_style), html.Td(df['Resolución de Creación'].iloc[0], style=td_style)
-            ]),
-            html.Tr([
-                html.Td('Correo electrónico DNA:', style=td_style), html.Td(df['Correo electrónico DNA'].iloc[0], style=td_style),
-                html.Td('Horario de atención:', style=td_style), html.Td(df['Horario de atención'].iloc[0], style=td_style),
-                html.Td('Fecha Resolución de ROF:', style=td_style), html.Td(df['Fecha Resolución de ROF'].iloc[0], style=td_style),
-                html.Td('Resolución de ROF:', style=td_style), html.Td(df['Resolución de ROF'].iloc[0], style=td_style)
-            ]),
-            html.Tr([html.Th('Personal', colSpan=4, style=th_style), 
-                     html.Th('Información Adicional', colSpan=4, style=th_style)]),
-            html.Tr([
-                html.Td('Defensoras:', style=td_style), html.Td(df['Defensoras'].iloc[0], style=td_style),
-                html.Td('Defensores:', style=td_style), html.Td(df['Defensores'].iloc[0], style=td_style),
-                html.Td('Última fecha de supervisión:', style=td_style), html.Td(df['Última fecha de supervisión'].iloc[0], style=td_style),
-                html.Td('Observaciones de la supervisión:', style=td_style), html.Td(df['Observaciones de la supervisión'].iloc[0], style=td_style)
-            ]),
-            html.Tr([
-                html.Td('Promotoras:', style=td_style), html.Td(df['Promotoras'].iloc[0], style=td_style),
-                html.Td('Promotores:', style=td_style), html.Td(df['Promotores'].iloc[0], style=td_style),
-                html.Td('Último curso:', style=td_style), html.Td(df['Último curso'].iloc[0], style=td_style),
-                html.Td('Fecha del último curso:', style=td_style), html.Td(df['Fecha del último curso'].iloc[0], style=td_style)
-            ]),
-            html.Tr([
-                html.Td('Otras:', style=td_style), html.Td(df['Otras'].iloc[0], style=td_style),
-                html.Td('Otros:', style=td_style), html.Td(df['Otros'].iloc[0], style=td_style),
-                html.Td('Fecha CCONNA:', style=td_style), html.Td(df['Fecha CCONNA'].iloc[0], style=td_style),
-                html.Td('DNA Fortalecida:', style=td_style), html.Td(df['DNA Fortalecida'].iloc[0], style=td_style)
-            ]),
-            html.Tr([
-                html.Td('Total Mujeres:', style=td_style), html.Td(total_mujeres, style=td_style),
-                html.Td('Total Hombres:', style=td_style), html.Td(total_hombres, style=td_style),
-                html.Td(style=td_style), html.Td(style=td_style),
-                html.Td(style=td_style), html.Td(style=td_style)
+                html.Td('Total Mujeres:', style=TD_STYLE), html.Td(total_mujeres, style=TD_STYLE),
+                html.Td('Total Hombres:', style=TD_STYLE), html.Td(total_hombres, style=TD_STYLE),
+                html.Td(style=TD_STYLE), html.Td(style=TD_STYLE),
+                html.Td(style=TD_STYLE), html.Td(style=TD_STYLE)
             ])
         ])
-    ], style=table_style)
+    ], style=TABLE_STYLE)
     
     return html.Div([
-        html.H3(f"Resultados para DNA {codigo}"),
+        html.H3(f"Resultados para DNA {clave_dna(fila['codigo'])}"),
         table
-    ]), None
\ No newline at end of file
+    ])
+
+def precargar_detalles_dna():
+    """
+    Guarda en el cache el detalle de las DNAs supervisadas en los últimos
+    DETALLE_DNA_DIAS_SUPERVISION días, que son las que más se consultan.
+    Devuelve cuántas se precargaron.
+    """
+    filas = leer_detalles_dna(
+        "d.f_supervisión >= CURRENT_DATE - CAST(:dias AS integer)",
+        {'dias': DETALLE_DNA_DIAS_SUPERVISION, 'limite': DETALLE_DNA_MAX},
+        sufijo="ORDER BY d.f_supervisión DESC LIMIT :limite",
+    )
+    version = version_datos()
+    for fila in filas or []:
+        cache_detalle_dna.set((clave_dna(fila['codigo']), version), detalle_dna(fila))
+    return len(filas or [])
+
+@app.callback(
+    [Output('dna-results', 'children'),
+     Output('dna-error-message', 'children')],
+    Input('buscar-dna-btn', 'n_clicks'),
+    State('dna-input', 'value'),
+    prevent_initial_call=True
+)
+def buscar_por_dna(n_clicks, codigo):
+    if not codigo or not codigo.isdigit() or len(codigo) != 5:
+        return None, "El código de la DNA debe contener exactamente 5 dígitos."
+    
+    # El componente ya construido se reutiliza mientras no cambien los datos
+    clave = (codigo, version_datos())
+    detalle = cache_detalle_dna.get(clave)
+    if detalle is None:
+        filas = leer_detalles_dna("d.codigo = :codigo", {'codigo': codigo})
+        if filas is None:
+            return None, "No se pudo consultar la DNA. Intente nuevamente."
+        if filas:
+            detalle = detalle_dna(filas[0])
+            cache_detalle_dna.set(clave, detalle)
+        else:
+            detalle = html.Div("No se encontraron resultados para esta DNA.")
+            cache_detalle_dna.set(clave, detalle, DETALLE_DNA_NO_ENCONTRADA_TTL)
+    
+    return detalle, None
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+# Perfil de producción: gunicorn index:server -c gunicorn.conf.py
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8050')}"
+
+# Procesos y threads por proceso. Cada proceso tiene su propio pool de conexiones
+# (mismos valores por defecto que utils/data_loader.py), así que los procesos se
+# limitan a DB_CONEXIONES_MAX: WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# no puede superarlo. Sin WEB_CONCURRENCY se usan cpu_count() + 1 procesos si caben
+conexiones_por_proceso = int(os.getenv('DB_POOL_SIZE', 5)) + int(os.getenv('DB_MAX_OVERFLOW', 10))
+conexiones_max = int(os.getenv('DB_CONEXIONES_MAX', 80))
+workers_max = max(conexiones_max // conexiones_por_proceso, 1)
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() + 1, workers_max)))
+if workers * conexiones_por_proceso > conexiones_max:
+    raise SystemExit(
+        f"WEB_CONCURRENCY={workers} procesos x {conexiones_por_proceso} conexiones (DB_POOL_SIZE + DB_MAX_OVERFLOW) "
+        f"superan DB_CONEXIONES_MAX={conexiones_max}; usa como máximo {workers_max} procesos o un pool más pequeño"
+    )
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Importar la aplicación una sola vez antes de crear los procesos
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Reciclar cada proceso tras un número de peticiones (con variación para que no se
+# reinicien todos a la vez) y darle tiempo a terminar las peticiones en curso
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Con preload_app los caches se cargan en el proceso principal y los procesos
+    # hijos los heredan al crearse, antes de aceptar peticiones
+    if preload_app:
+        from calentamiento import calentar_caches
+        from utils.data_loader import engine
+        calentar_caches()
+        # El proceso principal no atiende peticiones: sus conexiones no cuentan para DB_CONEXIONES_MAX
+        engine.dispose()
+
+
+def post_worker_init(worker):
+    # Sin preload_app cada proceso carga sus propios caches antes de aceptar peticiones
+    if not preload_app:
+        from calentamiento import calentar_caches
+        calentar_caches()
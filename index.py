@@ -1,7 +1,14 @@
+import functools
+import ipaddress
 import os
-from dash.dependencies import Input, Output, State
+import threading
+from flask import abort, jsonify, request
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash import html, dcc, callback_context
 from app import app, server
+from utils.data_loader import estadisticas_pool, cache_consultas
+from utils.cache_figuras import cache_figuras
+from calentamiento import calentar_caches, progreso_calentamiento
 from layouts import defensores, defensorias, supervisiones, capacitaciones, cconna, modo_ninez
 from components.navbar import navbar
 import callbacks.defensorias_callbacks 
@@ -9,10 +16,6 @@ import callbacks.capacitaciones_callbacks
 import callbacks.defensores_callbacks
 import callbacks.cconna_callbacks
 
-# Definir colores
-TEXT_COLOR = "#F0F0F0"
-ACCENT_COLOR = "#421e1b"
-
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
     navbar,
@@ -24,7 +27,9 @@ app.layout = html.Div([
     })
 ])
 
-@app.callback(
+# Mostrar/ocultar el navbar en el navegador (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='toggle_navbar'),
     [Output('navbar-content', 'style'),
      Output('page-content', 'style'),
      Output('navbar-toggle', 'style')],
@@ -33,26 +38,6 @@ app.layout = html.Div([
      State('page-content', 'style'),
      State('navbar-toggle', 'style')]
 )
-def toggle_navbar(n_clicks, navbar_style, content_style, toggle_style):
-    if n_clicks is None:
-        return navbar_style, content_style, toggle_style
-    if navbar_style['transform'] == 'translateX(0)':
-        # Ocultar navbar
-        navbar_style['transform'] = 'translateX(-250px)'
-        content_style['marginLeft'] = '50px'
-        toggle_style['left'] = '10px'
-        toggle_style['color'] = ACCENT_COLOR  # Cambiar color cuando está oculto
-    else:
-        # Mostrar navbar
-        navbar_style['transform'] = 'translateX(0)'
-        content_style['marginLeft'] = '250px'
-        toggle_style['left'] = '210px'
-        toggle_style['color'] = TEXT_COLOR  # Restaurar color original
-
-    # Añadir transición al estilo del botón
-    toggle_style['transition'] = 'left 0.3s ease-in-out, color 0.3s ease-in-out'
-
-    return navbar_style, content_style, toggle_style
 
 @app.callback(Output('page-content', 'children'),
               [Input('url', 'pathname')])
@@ -72,7 +57,51 @@ def display_page(pathname):
     else:
         return html.H1('404: Página no encontrada')
 
+# Redes desde las que se pueden consultar /estado/* y /listo (por defecto solo el propio servidor)
+ESTADO_REDES = [ipaddress.ip_network(red.strip(), strict=False)
+                for red in os.getenv('ESTADO_REDES', '127.0.0.1,::1').split(',') if red.strip()]
+
+def solo_redes_estado(vista):
+    # Responde 403 a las peticiones que no vienen de ESTADO_REDES
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        try:
+            origen = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            abort(403)
+        if not any(origen in red for red in ESTADO_REDES):
+            abort(403)
+        return vista(*args, **kwargs)
+    return envoltura
+
+# Métricas del pool de conexiones a la base de datos
+@server.route('/estado/pool')
+@solo_redes_estado
+def estado_pool():
+    return jsonify(estadisticas_pool())
+
+# Estado de los caches de resultados de consultas y de figuras
+@server.route('/estado/cache')
+@solo_redes_estado
+def estado_cache():
+    return jsonify({
+        'consultas': cache_consultas.estadisticas(),
+        'figuras': cache_figuras.estadisticas(),
+    })
+
+# Disponibilidad del proceso: 503 mientras se precargan los caches, con el avance
+@server.route('/listo')
+@solo_redes_estado
+def listo():
+    progreso = progreso_calentamiento()
+    return jsonify(progreso), 200 if progreso['listo'] else 503
+
 if __name__ == '__main__':
     #app.run_server(debug=True)
     port = int(os.environ.get('PORT', 8050))
-    app.run_server(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    debug = os.environ.get('DASH_DEBUG', '1') == '1'
+    # Con debug, el proceso que sirve las peticiones es el que relanza el recargador
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=calentar_caches, daemon=True).start()
+    # Servidor de desarrollo; en producción se usa gunicorn (ver gunicorn.conf.py)
+    app.run_server(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
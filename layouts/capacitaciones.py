@@ -4,6 +4,8 @@ import pandas as pd
 
 def get_layout():
     layout = html.Div([
+        # Dispara la carga de las opciones iniciales de los filtros
+        dcc.Store(id='capacitaciones-carga-inicial'),
         dbc.Container([
             html.H1('Visualizador de Datos de Capacitaciones', className='text-center my-4 display-4'),
             
@@ -23,6 +23,8 @@ vigencia-cconna-dropdown: Estado de vigencia de CCONNA
 
 def get_layout():
     layout = html.Div([
+        # Dispara la carga de las opciones iniciales de los filtros
+        dcc.Store(id='cconna-carga-inicial'),
         dbc.Container([
             html.H1('Visualizador de Datos de los CCONNA', className='text-center my-4 display-4'),
             
@@ -62,6 +64,7 @@ def get_layout():
                                 html.Label('Estado de Creación:', className='fw-bold'),
                                 dcc.Dropdown(
                                     id='creacion-cconna-dropdown',
+                                    disabled=True,
                                     className='mb-2'
                                 ),
                             ], md=4),
@@ -69,6 +72,7 @@ def get_layout():
                                 html.Label('Estado de Operativa:', className='fw-bold'),
                                 dcc.Dropdown(
                                     id='operativa-cconna-dropdown',
+                                    disabled=True,
                                     className='mb-2'
                                 ),
                             ], md=4),
@@ -2,8 +2,15 @@ from dash import html, dcc
 import dash_bootstrap_components as dbc
 import pandas as pd
 
+# Ventana de fechas inicial de la evolución histórica, como texto para que el navegador
+# envíe el mismo valor con el que calentamiento.py precarga el gráfico
+FECHA_INICIO_POR_DEFECTO = '2018-10-01'
+FECHA_FIN_POR_DEFECTO = '2024-12-12'
+
 def get_layout():
     layout = html.Div([
+        # Dispara la carga de las opciones iniciales de los filtros
+        dcc.Store(id='defensorias-carga-inicial'),
         dbc.Container([
             html.H1('Visualizador de Datos de las DNA', className='text-center my-4 display-4'),
             
@@ -58,7 +65,7 @@ def get_layout():
                                 min_date_allowed=pd.to_datetime('1995-01-01'),
                                 max_date_allowed=pd.to_datetime('2030-12-31'),
                                 initial_visible_month=pd.to_datetime('2018-11-01'),
-                                date=pd.to_datetime('2018-10-01'),
+                                date=FECHA_INICIO_POR_DEFECTO,
                                 className='mb-2'
                             ),
                         ], md=3),
@@ -69,7 +76,7 @@ def get_layout():
                                 min_date_allowed=pd.to_datetime('1995-01-01'),
                                 max_date_allowed=pd.to_datetime('2030-12-31'),
                                 initial_visible_month=pd.to_datetime('2024-12-31'),
-                                date=pd.to_datetime('2024-12-12'),
+                                date=FECHA_FIN_POR_DEFECTO,
                                 className='mb-2'
                             ),
                         ], md=3),
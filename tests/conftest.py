@@ -0,0 +1,13 @@
+import os
+import sys
+
+# Los módulos de la aplicación se importan desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# create_engine no se conecta al crearse; las pruebas reemplazan la ejecución de consultas
+os.environ.setdefault('postgresql_dsld_url', 'postgresql+psycopg2://pruebas@localhost/pruebas')
+
+# Las pruebas que necesitan una base real (con las migraciones aplicadas) usan
+# PRUEBAS_POSTGRESQL_URL y se omiten si no está definida
+if os.getenv('PRUEBAS_POSTGRESQL_URL'):
+    os.environ['postgresql_dsld_url'] = os.environ['PRUEBAS_POSTGRESQL_URL']
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+from utils.busqueda import IndiceTrigramas, normalizar, normalizar_dni, trigramas
+
+FILAS = [
+    {'huella': 'h1', 'nombres': 'Ana María', 'apellido': 'Quispe Núñez', 'dni': '01234567'},
+    {'huella': 'h2', 'nombres': 'Ana', 'apellido': 'Quispe', 'dni': '07654321'},
+    {'huella': 'h3', 'nombres': 'Juan', 'apellido': 'Quispe', 'dni': '11111111'},
+    {'huella': 'h4', 'nombres': 'Luis', 'apellido': 'Mamani', 'dni': '22222222'},
+]
+
+
+@pytest.fixture
+def indice(monkeypatch):
+    indice = IndiceTrigramas(huella='md5(d)', select='d.*', from_clause='FROM d', tablas=('d',),
+                             campos_texto=('nombres', 'apellido'), campo_exacto='dni',
+                             clave_exacta=normalizar_dni, orden=('apellido', 'nombres'))
+    for fila in FILAS:
+        indice._agregar(dict(fila))
+    # Sin base de datos: el índice se da por actualizado
+    monkeypatch.setattr(indice, '_vigente', lambda: True)
+    return indice
+
+
+def test_normalizar():
+    assert normalizar('  Núñez   QUISPE ') == 'nunez quispe'
+    assert normalizar_dni(1234567) == '01234567'
+    assert normalizar_dni(' 7654321 ') == '07654321'
+
+
+def test_trigramas_como_pg_trgm():
+    assert trigramas('ana') == {'  a', ' an', 'ana', 'na '}
+    assert trigramas('ana li') == {'  a', ' an', 'ana', 'na ', '  l', ' li', 'li '}
+    assert trigramas('') == set()
+
+
+def test_busqueda_por_dni_exacto(indice):
+    assert [f['huella'] for f in indice.buscar('1234567')] == ['h1']
+    assert [f['huella'] for f in indice.exactos('07654321')] == ['h2']
+
+
+def test_contiene_antes_que_parecido(indice):
+    # 'ana quispe' está contenido en h2; h1 tiene todos sus trigramas y h3 solo los del apellido
+    assert [f['huella'] for f in indice.buscar('Ana Quispe')] == ['h2', 'h1', 'h3']
+    assert [f['huella'] for f in indice.buscar('Mamani')] == ['h4']
+
+
+def test_empates_por_apellido_y_nombres(indice):
+    # Todas contienen 'quispe': se ordenan por apellido y luego por nombres
+    assert [f['huella'] for f in indice.buscar('Quispe')] == ['h2', 'h3', 'h1']
+    assert [f['huella'] for f in indice.buscar('Quispe', limite=2)] == ['h2', 'h3']
+
+
+def test_busqueda_sin_tildes_ni_mayusculas(indice):
+    assert [f['huella'] for f in indice.buscar('NUNEZ')] == ['h1']
+
+
+def test_quitar_una_fila(indice):
+    indice._quitar('h1')
+    assert indice.buscar('Núñez') == []
+    assert indice.exactos('01234567') == []
+
+
+def test_revisa_en_segundo_plano_con_el_indice_cargado(indice, monkeypatch):
+    # Con el índice ya cargado, una revisión vencida no bloquea la búsqueda
+    liberar = threading.Event()
+    revisado = threading.Event()
+
+    def actualizar():
+        liberar.wait(5)
+        revisado.set()
+
+    monkeypatch.setattr(indice, '_vigente', lambda: False)
+    monkeypatch.setattr(indice, 'actualizar', actualizar)
+    indice._version = (0, 0)
+    assert [f['huella'] for f in indice.buscar('Mamani')] == ['h4']
+    assert not revisado.is_set()
+    liberar.set()
+    assert revisado.wait(5)
+
+
+def test_sin_cambios_no_recalcula_las_huellas(indice, monkeypatch):
+    import utils.busqueda as busqueda
+    consultas = []
+    monkeypatch.setattr(busqueda, 'version_datos', lambda: (0, 0))
+    monkeypatch.setattr(busqueda, 'marca_tablas', lambda tablas: 'd:4:0:0:1')
+    monkeypatch.setattr(busqueda, 'run_query', lambda *args, **kwargs: consultas.append(args))
+    indice._version, indice._marca = (0, 0), 'd:4:0:0:1'
+    indice._actualizar()
+    assert consultas == []
+    assert len(indice.buscar('Quispe')) == 3
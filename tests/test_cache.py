@@ -0,0 +1,61 @@
+import pytest
+
+import utils.cache as cache_modulo
+from utils.cache import CacheLRU
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = {'t': 1000.0}
+    monkeypatch.setattr(cache_modulo.time, 'monotonic', lambda: ahora['t'])
+    return ahora
+
+
+def test_expulsa_la_entrada_usada_hace_mas_tiempo(reloj):
+    cache = CacheLRU(max_bytes=3, ttl=60, medir=len)
+    cache.set('a', 'x')
+    cache.set('b', 'x')
+    cache.set('c', 'x')
+    assert cache.get('a') == 'x'  # 'b' pasa a ser la menos usada
+    cache.set('d', 'x')
+    assert cache.get('b') is None
+    assert [cache.get(c) for c in ('a', 'c', 'd')] == ['x', 'x', 'x']
+    assert cache.estadisticas()['bytes'] == 3
+
+
+def test_no_guarda_valores_mayores_que_el_presupuesto(reloj):
+    cache = CacheLRU(max_bytes=3, ttl=60, medir=len)
+    cache.set('a', 'xx')
+    cache.set('b', 'xxxx')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xx'
+
+
+def test_reemplazar_una_clave_actualiza_los_bytes(reloj):
+    cache = CacheLRU(max_bytes=10, ttl=60, medir=len)
+    cache.set('a', 'xxxx')
+    cache.set('a', 'x')
+    assert cache.estadisticas()['bytes'] == 1
+
+
+def test_vence_por_ttl_general_y_por_entrada(reloj):
+    cache = CacheLRU(max_bytes=100, ttl=60, medir=len)
+    cache.set('general', 'x')
+    cache.set('corta', 'x', ttl=5)
+    reloj['t'] += 10
+    assert cache.get('corta') is None
+    assert cache.get('general') == 'x'
+    reloj['t'] += 60
+    assert cache.get('general') is None
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['entradas'], estadisticas['bytes']) == (0, 0)
+    assert (estadisticas['aciertos'], estadisticas['fallos']) == (1, 2)
+
+
+def test_invalidar_con_filtro(reloj):
+    cache = CacheLRU(max_bytes=100, ttl=60, medir=len)
+    for clave in ('dna:1', 'dna:2', 'cargo:1'):
+        cache.set(clave, 'x')
+    assert cache.invalidar(lambda clave: clave.startswith('dna')) == 2
+    assert cache.get('cargo:1') == 'x'
+    assert cache.invalidar() == 1
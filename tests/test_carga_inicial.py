@@ -0,0 +1,158 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+import utils.data_loader as data_loader
+import utils.resumenes as resumenes
+from app import app
+from utils.cache_figuras import cache_figuras
+from utils.ubigeo_cache import ubicaciones_dna
+from callbacks import defensorias_callbacks, defensores_callbacks
+
+CATALOGOS = {
+    'estados': ['Acreditada', 'En trámite', 'No acreditada', 'No operativa'],
+    'tipos': ['Comunal', 'Distrital', 'Provincial'],
+    'cargos': ['Defensor', 'Promotor', 'Responsable'],
+    'ocupaciones': ['Abogado', 'Psicólogo'],
+}
+
+
+def respuesta(query, params):
+    # DataFrame con las columnas que espera cada consulta de las páginas
+    params = params or {}
+    if 'to_regclass' in query:
+        return pd.DataFrame({'existe': [False]})
+    if 'catalogo_0' in query:
+        nombres = [v for k, v in sorted(params.items()) if k.startswith('catalogo_')]
+        filas = [(nombre, valor, i) for nombre in nombres for i, valor in enumerate(CATALOGOS[nombre], start=1)]
+        return pd.DataFrame(filas, columns=['catalogo', 'valor', 'orden'])
+    if 'SELECT DISTINCT "dpto"' in query:
+        return pd.DataFrame({'dpto': ['Cusco', 'Lima'], 'prov': ['Cusco', 'Lima'], 'dist': ['Wanchaq', 'Miraflores']})
+    if 'GROUPING SETS' in query:
+        return pd.DataFrame({
+            'ubicacion': ['Cusco', None, None, None],
+            'estado': [None, 'Acreditada', None, None],
+            'siglas': [None, None, 'Distrital', None],
+            'g_ubicacion': [0, 1, 1, 1], 'g_estado': [1, 0, 1, 1], 'g_siglas': [1, 1, 0, 1],
+            'count': [3, 3, 3, 3],
+        })
+    if 'clave_apellido' in query:
+        return pd.DataFrame({'clave_apellido': ['Quispe'], 'clave_nombres': ['Ana'], 'clave_dni': ['01234567'],
+                             'codigo_dna': ['00001'], 'salto': [0], 'total': [1]})
+    if 'LIMIT :page_size' in query:
+        return pd.DataFrame({'codigo_dna': ['00001'], 'nombres': ['Ana'], 'apellido': ['Quispe'],
+                             'cargo': ['Responsable'], 'dni': ['01234567'], 'ocupacion': ['Abogado']})
+    if 'as ocupacion' in query:
+        return pd.DataFrame({'ubicacion': ['Cusco'], 'cargo': ['Responsable'], 'ocupacion': ['Abogado'], 'count': [2]})
+    raise AssertionError(f'Consulta inesperada: {query}')
+
+
+@pytest.fixture
+def consultas(monkeypatch):
+    # Caches vacíos y una base falsa que cuenta las consultas ejecutadas
+    data_loader.cache_consultas.invalidar()
+    cache_figuras.invalidar()
+    ubicaciones_dna.invalidar()
+    defensores_callbacks._paginacion_cache.clear()
+    ejecutadas = []
+
+    def ejecutar(query, params, *args, **kwargs):
+        ejecutadas.append(query)
+        return respuesta(query, params)
+
+    monkeypatch.setattr(data_loader, '_ejecutar', ejecutar)
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: 0)
+    # Con los resúmenes activados también se consulta si existen
+    monkeypatch.setattr(resumenes, 'USAR_RESUMENES', True)
+    return ejecutadas
+
+
+def abrir_defensorias():
+    _, _, estados, _, tipos = defensorias_callbacks.carga_inicial(None)
+    defensorias_callbacks.update_graphs(None, None, None, estados, tipos)
+    return estados, tipos
+
+
+def abrir_defensores():
+    _, _, cargos, _ = defensores_callbacks.carga_inicial(None)
+    defensores_callbacks.update_graphs(None, None, None, cargos, None)
+    defensores_callbacks.update_tabla_defensores(None, None, None, cargos, None, 0, 10)
+    return cargos
+
+
+def test_defensorias_consulta_una_vez_por_carga(consultas):
+    estados, tipos = abrir_defensorias()
+    assert estados == ['Acreditada', 'No acreditada', 'No operativa']
+    assert tipos == ['Distrital', 'Provincial']
+    # Ubicaciones, catálogos, disponibilidad del resumen y gráficos
+    assert len(consultas) == 4
+    assert sum('GROUPING SETS' in q for q in consultas) == 1
+
+    # Volver a abrir la página no consulta la base
+    abrir_defensorias()
+    assert len(consultas) == 4
+
+
+def test_defensores_consulta_una_vez_por_carga(consultas):
+    cargos = abrir_defensores()
+    assert cargos == ['Defensor', 'Responsable']
+    # Ubicaciones, catálogos, disponibilidad del resumen, gráficos, paginación y primera página
+    assert len(consultas) == 6
+
+    # Los gráficos y la paginación salen de los caches; solo se relee la página de la tabla
+    abrir_defensores()
+    assert len(consultas) == 7
+
+
+@pytest.mark.parametrize('salida', [
+    'dna-por-ubicacion.figure',
+    'defensores-por-ubicacion.figure',
+    'tabla-defensores.data',
+])
+def test_graficos_esperan_la_carga_inicial(salida):
+    # Sin prevent_initial_call los gráficos se calcularían también con los filtros vacíos
+    callbacks = [c for c in app._callback_list if salida in c['output']]
+    assert len(callbacks) == 1
+    assert callbacks[0]['prevent_initial_call'] is True
+
+
+@pytest.mark.parametrize('salida', ['acreditacion-por-fechas.figure', 'nombramientos-acumulados.figure'])
+def test_series_acumuladas_no_usan_segundo_plano(salida):
+    # Son una sola consulta agregada: un proceso aparte por llamada solo agregaría latencia
+    callbacks = [c for c in app._callback_list if salida in c['output']]
+    assert len(callbacks) == 1
+    assert callbacks[0]['long'] is None
+
+
+def test_pagina_dentro_de_un_empate_salta_las_filas_ya_mostradas(consultas, monkeypatch):
+    # Tres defensores con la misma clave en páginas de 2: la segunda página empieza
+    # en la misma clave que la primera y salta la fila del empate ya mostrada
+    anclas = pd.DataFrame({'clave_apellido': ['Quispe'] * 2, 'clave_nombres': ['Ana'] * 2,
+                           'clave_dni': ['01234567'] * 2, 'codigo_dna': ['00001'] * 2,
+                           'salto': [0, 2], 'total': [3, 3]})
+    parametros = []
+
+    def ejecutar(query, params, *args, **kwargs):
+        if 'clave_apellido' in query:
+            return anclas
+        parametros.append(params)
+        return respuesta(query, params)
+
+    monkeypatch.setattr(data_loader, '_ejecutar', ejecutar)
+    defensores_callbacks.update_tabla_defensores(None, None, None, None, None, 1, 2)
+    assert parametros[-1]['ancla_apellido'] == 'Quispe'
+    assert parametros[-1]['ancla_salto'] == 2
+
+
+def test_dna_no_encontrada_se_recuerda_poco_tiempo(monkeypatch):
+    defensorias_callbacks.cache_detalle_dna.invalidar()
+    guardadas = []
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: 0)
+    monkeypatch.setattr(defensorias_callbacks, 'leer_detalles_dna', lambda *args: [])
+    monkeypatch.setattr(defensorias_callbacks.cache_detalle_dna, 'set',
+                        lambda clave, valor, ttl=None: guardadas.append(ttl))
+    detalle, error = defensorias_callbacks.buscar_por_dna(1, '99999')
+    assert error is None
+    assert guardadas == [defensorias_callbacks.DETALLE_DNA_NO_ENCONTRADA_TTL]
@@ -0,0 +1,37 @@
+import threading
+import time
+
+from utils.cupos import cupo
+
+
+def test_cupo_limita_las_ejecuciones_simultaneas(tmp_path):
+    activos = []
+    maximo = []
+    lock = threading.Lock()
+
+    def tarea():
+        with cupo('prueba', 2, str(tmp_path)):
+            with lock:
+                activos.append(1)
+                maximo.append(len(activos))
+            time.sleep(0.05)
+            with lock:
+                activos.pop()
+
+    hilos = [threading.Thread(target=tarea) for _ in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(maximo) == 6
+    assert max(maximo) == 2
+
+
+def test_cupo_se_libera_con_una_excepcion(tmp_path):
+    try:
+        with cupo('prueba', 1, str(tmp_path)):
+            raise ValueError
+    except ValueError:
+        pass
+    with cupo('prueba', 1, str(tmp_path)):
+        pass
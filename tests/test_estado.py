@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+import index
+from utils.data_loader import etiqueta_cancelable, CABECERA_PAGINA
+
+
+@pytest.mark.parametrize('ruta', ['/estado/pool', '/estado/cache', '/listo'])
+def test_estado_solo_desde_el_servidor(ruta):
+    cliente = index.server.test_client()
+    assert cliente.get(ruta).status_code in (200, 503)
+    assert cliente.get(ruta, environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 403
+
+
+def test_cada_pestana_cancela_solo_sus_consultas():
+    def etiqueta(pagina):
+        with index.server.test_request_context(headers={CABECERA_PAGINA: pagina} if pagina else {}):
+            return etiqueta_cancelable('defensores.update_graphs')
+
+    assert etiqueta('pestana-1') == etiqueta('pestana-1')
+    assert etiqueta('pestana-1') != etiqueta('pestana-2')
+    assert etiqueta(None) is None
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from utils.fechas_cconna import parse_fechas, clasificar_vigencia, sql_fecha, sql_vigencia
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Valor -> fecha esperada (None si no es una fecha válida)
+FECHAS = {
+    '05/03/2021': '2021-03-05',
+    ' 5/3/2021 ': '2021-03-05',
+    '2019': '2019-01-01',
+    '2020-1-15': '2020-01-15',
+    '15-01-2020': '2020-01-15',
+    '31/02/2020': None,
+    '2020-13-01': None,
+    '2020/05/01': None,
+    '05/03/2021 10:00': None,
+    '01/01/0202': None,
+    '': None,
+    'sin fecha': None,
+}
+
+
+def test_parse_fechas():
+    valores = list(FECHAS) + [None]
+    resultado = parse_fechas(pd.Series(valores, dtype=object))
+    esperado = pd.to_datetime(pd.Series(list(FECHAS.values()) + [None]))
+    pd.testing.assert_series_equal(resultado, esperado, check_names=False)
+
+
+def test_clasificar_vigencia():
+    hoy = pd.Timestamp('2024-06-30')
+    inicio = pd.to_datetime(pd.Series(['2024-01-01', '2024-01-01', '2024-07-01', None, '2023-01-01']))
+    termino = pd.to_datetime(pd.Series([None, '2024-06-30', None, None, '2024-06-29']))
+    assert clasificar_vigencia(inicio, termino, hoy).tolist() == [
+        'Vigente', 'Vigente', 'No Vigente', 'No Vigente', 'No Vigente']
+
+
+@pytest.fixture
+def base_con_fecha_cconna():
+    if not os.getenv('PRUEBAS_POSTGRESQL_URL'):
+        pytest.skip('requiere PRUEBAS_POSTGRESQL_URL')
+    pytest.importorskip('dash')
+    from utils.data_loader import conectar
+    from utils.migraciones import sentencias
+    with open(os.path.join(RAIZ, 'utils', 'sql_migraciones', '005_fecha_cconna.sql'), encoding='utf-8') as f:
+        funcion = sentencias(f.read())
+    with conectar() as connection:
+        for sentencia in funcion:
+            connection.exec_driver_sql(sentencia)
+        connection.commit()
+    return conectar
+
+
+def test_fecha_cconna_coincide_con_parse_fechas(base_con_fecha_cconna):
+    from sqlalchemy import text
+    valores = list(FECHAS)
+    with base_con_fecha_cconna() as connection:
+        filas = connection.execute(text(f"""
+            SELECT {sql_fecha('v.valor')} AS fecha,
+                   {sql_vigencia(sql_fecha('v.inicio'), sql_fecha('v.termino'))} AS vigencia
+            FROM unnest(CAST(:valores AS text[]), CAST(:inicios AS text[]), CAST(:terminos AS text[]))
+                 AS v(valor, inicio, termino)
+        """), {'valores': valores, 'inicios': valores, 'terminos': list(reversed(valores))}).all()
+    en_sql = pd.to_datetime(pd.Series([fila.fecha for fila in filas]))
+    en_pandas = parse_fechas(pd.Series(valores))
+    pd.testing.assert_series_equal(en_sql, en_pandas, check_names=False)
+
+    vigencia = clasificar_vigencia(en_pandas, parse_fechas(pd.Series(list(reversed(valores)))))
+    assert [fila.vigencia for fila in filas] == vigencia.tolist()
+
+
+def test_conteos_sql_y_pandas_coinciden(base_con_fecha_cconna):
+    from utils.data_loader import run_query
+    from callbacks.cconna_callbacks import conteos_cconna_sql, conteos_cconna_pandas
+
+    existe = run_query("SELECT to_regclass('cconna') IS NOT NULL AS existe")
+    if not existe['existe'][0]:
+        pytest.skip('la base de pruebas no tiene la tabla cconna')
+
+    def por_valor(conteo):
+        return dict(zip(conteo.iloc[:, 0], conteo.iloc[:, 1].astype(int)))
+
+    for vigencia in (None, ['Vigente']):
+        en_sql = conteos_cconna_sql('', {}, 'Región', vigencia)
+        en_pandas = conteos_cconna_pandas('', {}, 'Región', vigencia)
+        assert en_sql['filas'] == en_pandas['filas']
+        for grafico in ('ubicacion', 'tipo', 'creacion', 'vigencia'):
+            assert por_valor(en_sql[grafico]) == por_valor(en_pandas[grafico])
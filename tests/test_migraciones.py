@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+from utils.migraciones import sentencias, _usos_filtro, _columnas_indice, _nombre_indice, migraciones_disponibles
+
+
+def test_sentencias_separa_por_punto_y_coma_sin_comentarios():
+    sql = """
+    -- índice; con punto y coma en el comentario
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS a ON dna (dpto);
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS b ON dna (prov);
+    """
+    assert sentencias(sql) == ['CREATE INDEX CONCURRENTLY IF NOT EXISTS a ON dna (dpto)',
+                               'CREATE INDEX CONCURRENTLY IF NOT EXISTS b ON dna (prov)']
+
+
+def test_sentencias_conserva_los_cuerpos_entre_dolares():
+    sql = """
+    CREATE FUNCTION f() RETURNS int LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM 1;
+        RETURN $t$;$t$::int;
+    END
+    $$;
+    SELECT f();
+    """
+    partes = sentencias(sql)
+    assert len(partes) == 2
+    assert partes[0].startswith('CREATE FUNCTION') and partes[0].endswith('$$')
+    assert 'PERFORM 1;' in partes[0]
+    assert partes[1] == 'SELECT f()'
+
+
+def test_migraciones_del_repositorio():
+    # Cada archivo se separa en sentencias completas (la función de 005 queda en una sola)
+    for version, nombre, ruta in migraciones_disponibles():
+        with open(ruta, encoding='utf-8') as f:
+            partes = sentencias(f.read())
+        assert partes, f'{version}_{nombre} no tiene sentencias'
+        if nombre == 'fecha_cconna':
+            assert len(partes) == 1
+
+
+def test_usos_filtro_reconoce_el_tipo_de_comparacion():
+    filtro = ("(((dpto)::text = 'Lima'::text) AND (f_acreditacion >= '2020-01-01'::date) "
+              "AND ((apellido)::text ~~ 'Qui%'::text) AND ((nombres)::text ~~ '%an%'::text))")
+    usos = _usos_filtro(filtro, ['dpto', 'f_acreditacion', 'apellido', 'nombres', 'prov'])
+    # Un LIKE que empieza con comodín no puede usar un índice
+    assert dict(usos) == {'dpto': 'igualdad', 'f_acreditacion': 'rango', 'apellido': 'patron'}
+
+
+def test_usos_filtro_con_any_y_columnas_parecidas():
+    usos = _usos_filtro("((estado_acreditacion = ANY ('{1,2}'::integer[])) AND (dpto = 'Lima'))",
+                        ['estado', 'estado_acreditacion', 'dpto'])
+    assert dict(usos) == {'estado_acreditacion': 'igualdad', 'dpto': 'igualdad'}
+
+
+def test_columnas_indice_igualdades_y_un_rango():
+    usos = {'f_acreditacion': 'rango', 'dpto': 'igualdad', 'apellido': 'patron'}
+    columnas = _columnas_indice(usos)
+    assert columnas == [('dpto', None), ('f_acreditacion', None)]
+    assert _nombre_indice('dna', columnas) == 'dna_dpto_f_acreditacion_idx'
+    assert _columnas_indice({'apellido': 'patron'}) == [('apellido', 'text_pattern_ops')]
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+from utils.planes import comparar_planes, resumir_plan
+
+
+def plan(costo, seq_scans=()):
+    return {'costo': costo, 'seq_scans': list(seq_scans)}
+
+
+def test_sin_cambios_no_hay_problemas():
+    base = {'a': plan(5000, ['dna'])}
+    assert comparar_planes({'a': plan(5000, ['dna'])}, base) == []
+
+
+def test_nuevo_seq_scan():
+    problemas = comparar_planes({'a': plan(100, ['dna', 'defensores'])}, {'a': plan(100, ['dna'])})
+    assert problemas == ['a: nuevo Seq Scan en defensores']
+
+
+def test_aumento_de_costo_sobre_el_minimo():
+    base = {'caro': plan(2000), 'barato': plan(10)}
+    problemas = comparar_planes({'caro': plan(5000), 'barato': plan(500)}, base)
+    # El aumento de una consulta trivial (costo menor a PLANES_COSTO_MINIMO) no se informa
+    assert problemas == ['caro: el costo estimado pasó de 2000 a 5000']
+
+
+def test_consulta_nueva_solo_se_informa_con_seq_scan():
+    actuales = {'nueva': plan(10, ['cconna']), 'otra': plan(10)}
+    assert comparar_planes(actuales, {}) == ['nueva: consulta nueva con Seq Scan en cconna']
+
+
+def test_resumir_plan():
+    resumen = resumir_plan({
+        'Node Type': 'Sort', 'Total Cost': 120.5, 'Sort Key': ['d.dpto'],
+        'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'dna', 'Filter': "(dpto = 'Lima')", 'Plan Rows': 10},
+                  {'Node Type': 'Index Scan', 'Relation Name': 'cargo', 'Index Name': 'cargo_pkey'}],
+    })
+    assert resumen['costo'] == 120.5
+    assert resumen['forma'] == ['Sort', 'Seq Scan on dna', 'Index Scan using cargo_pkey on cargo']
+    assert resumen['seq_scans'] == ['dna']
+    assert resumen['secuenciales'] == [{'tabla': 'dna', 'filtro': "(dpto = 'Lima')", 'filas': 10}]
+    assert resumen['ordenamientos'] == [['d.dpto']]
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+import utils.series_temporales as series
+from utils.series_temporales import granularidad, params_serie
+
+
+@pytest.mark.parametrize('fin, esperada', [
+    ('2024-01-01', ('day', '1 day')),
+    ('2025-02-03', ('day', '1 day')),      # 400 días
+    ('2025-02-04', ('week', '1 week')),    # 401 días
+    ('2031-08-31', ('week', '1 week')),    # 400 semanas
+    ('2031-09-01', ('month', '1 month')),
+    ('2057-05-02', ('month', '1 month')),  # 400 meses de 30.44 días
+    ('2057-05-03', ('year', '1 year')),
+])
+def test_granularidad_segun_el_rango(fin, esperada):
+    assert granularidad('2024-01-01', fin) == esperada
+
+
+def test_rango_demasiado_largo_usa_años(monkeypatch):
+    monkeypatch.setattr(series, 'MAX_PUNTOS_SERIE', 1)
+    assert granularidad('2000-01-01', '2010-01-01') == ('year', '1 year')
+
+
+def test_params_serie():
+    assert params_serie('2024-01-01', '2024-01-31') == {
+        'fecha_inicio': '2024-01-01', 'fecha_fin': '2024-01-31', 'granularidad': 'day', 'paso': '1 day'}
@@ -0,0 +1,58 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+import utils.data_loader as data_loader
+import utils.ubigeo_cache as ubigeo_cache
+from utils.ubigeo_cache import ArbolUbigeo, JerarquiaUbicaciones, LIMA_METROPOLITANA, LIMA_PROVINCIA
+
+UBIGEO = [
+    ('010000', 'Amazonas'), ('010100', 'Chachapoyas'), ('010101', 'Chachapoyas'),
+    ('150000', 'Lima'), ('150100', 'Lima'), ('150101', 'Lima'), ('150132', 'San Juan de Lurigancho'),
+    ('150200', 'Barranca'), ('150201', 'Barranca'), ('150800', 'Huaura'),
+    ('000000', 'Perú'),
+]
+
+
+@pytest.fixture
+def arbol(monkeypatch):
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: 0)
+    monkeypatch.setattr(ubigeo_cache, 'run_query',
+                        lambda query, *args, **kwargs: pd.DataFrame(UBIGEO, columns=['ubigeo', 'nombre']))
+    return ArbolUbigeo()
+
+
+def test_lima_se_divide_en_metropolitana_y_provincia(arbol):
+    assert arbol.departamentos() == [
+        {'label': 'Amazonas', 'value': '010000'},
+        {'label': 'Lima Metropolitana', 'value': LIMA_METROPOLITANA},
+        {'label': 'Lima Provincia', 'value': LIMA_PROVINCIA},
+    ]
+
+
+def test_provincias_de_lima(arbol):
+    assert [p['label'] for p in arbol.provincias(LIMA_METROPOLITANA)] == ['Lima']
+    assert [p['label'] for p in arbol.provincias(LIMA_PROVINCIA)] == ['Barranca', 'Huaura']
+    assert [p['label'] for p in arbol.provincias('010000')] == ['Chachapoyas']
+
+
+def test_distritos_y_nombres(arbol):
+    assert [d['value'] for d in arbol.distritos('150100')] == ['150101', '150132']
+    assert arbol.nombre(LIMA_PROVINCIA) == 'Lima Provincia'
+    assert arbol.nombre('150201') == 'Barranca'
+    assert arbol.nombre('000000') is None
+
+
+def test_jerarquia_de_ubicaciones(monkeypatch):
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: 0)
+    filas = pd.DataFrame({'dpto': ['Cusco', 'Cusco', 'Lima', None],
+                          'prov': ['Cusco', 'Urubamba', None, None],
+                          'dist': ['Wanchaq', None, None, None]})
+    monkeypatch.setattr(ubigeo_cache, 'run_query', lambda query, *args, **kwargs: filas)
+    jerarquia = JerarquiaUbicaciones('SELECT ...')
+    assert [d['value'] for d in jerarquia.departamentos()] == ['Cusco', 'Lima']
+    assert [p['value'] for p in jerarquia.provincias('Cusco')] == ['Cusco', 'Urubamba']
+    assert jerarquia.distritos('Cusco', 'Urubamba') == []
+    assert jerarquia.distritos('Cusco', 'Cusco') == [{'label': 'Wanchaq', 'value': 'Wanchaq'}]
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+from contextlib import contextmanager, nullcontext
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dash')
+pytest.importorskip('sqlalchemy')
+
+import utils.data_loader as data_loader
+from utils.ubigeo_cache import CacheRecargable
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Contador(CacheRecargable):
+    def __init__(self):
+        super().__init__(ttl=3600)
+        self.cargas = 0
+
+    def _cargar(self):
+        self.cargas += 1
+        return self.cargas
+
+
+@pytest.fixture
+def version(monkeypatch):
+    # Estado de la versión sin lecturas previas y relectura en cada llamada
+    monkeypatch.setattr(data_loader, '_version', {'compartida': None, 'local': 0, 'leida_en': float('-inf'),
+                                                  'leyendo': False, 'aviso': False})
+    monkeypatch.setattr(data_loader, 'DATOS_VERSION_TTL', 0)
+    data_loader.cache_consultas.invalidar()
+    yield
+    data_loader.cache_consultas.invalidar()
+
+
+def test_cambio_de_otro_proceso_descarta_los_caches(version, monkeypatch):
+    compartida = {'valor': 7}
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: compartida['valor'])
+    contador = Contador()
+    assert contador.datos() == 1
+    data_loader.cache_consultas.set(('SELECT 1', (), ()), pd.DataFrame({'x': [1]}))
+
+    # Sin cambios se conservan
+    assert contador.datos() == 1
+    assert data_loader.cache_consultas.estadisticas()['entradas'] == 1
+
+    compartida['valor'] = 8
+    assert contador.datos() == 2
+    assert data_loader.cache_consultas.estadisticas()['entradas'] == 0
+
+
+def test_escritura_local_con_escrituras_ajenas_descarta_todo(version, monkeypatch):
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: 3)
+    monkeypatch.setattr(data_loader, '_incrementar_version_compartida', lambda: 6)
+    data_loader.version_datos()
+    data_loader.cache_consultas.set(('SELECT * FROM cargo', (), ()), pd.DataFrame({'x': [1]}))
+
+    # La secuencia avanzó más de uno: otro proceso escribió en tablas desconocidas
+    data_loader.invalidar_cache(['dna'])
+    assert data_loader.cache_consultas.estadisticas()['entradas'] == 0
+    assert (data_loader._version['compartida'], data_loader._version['local']) == (6, 1)
+
+
+def test_sin_secuencia_se_usa_el_contador_local(version, monkeypatch):
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: None)
+    monkeypatch.setattr(data_loader, '_incrementar_version_compartida', lambda: None)
+    antes = data_loader.version_datos()
+    data_loader.registrar_cambio_datos()
+    assert data_loader.version_datos() != antes
+
+
+class Resultado:
+    returns_rows = True
+
+    def keys(self):
+        return ['id']
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class Conexion:
+    # Registra si la consulta se ejecutó en autocommit (lectura) o en una transacción (escritura)
+    def __init__(self):
+        self.modo = None
+
+    def execution_options(self, **opciones):
+        if opciones.get('isolation_level') == 'AUTOCOMMIT':
+            self.modo = 'lectura'
+
+    def begin(self):
+        self.modo = 'escritura'
+        return nullcontext()
+
+    def execute(self, *args):
+        return Resultado()
+
+
+@pytest.fixture
+def conexion(monkeypatch):
+    conexion = Conexion()
+
+    @contextmanager
+    def conectar():
+        yield conexion
+
+    monkeypatch.setattr(data_loader, 'conectar', conectar)
+    monkeypatch.setattr(data_loader, '_leer_version_compartida', lambda: None)
+    monkeypatch.setattr(data_loader, '_incrementar_version_compartida', lambda: None)
+    return conexion
+
+
+@pytest.mark.parametrize('sql', ['EXPLAIN SELECT * FROM dna', 'SHOW statement_timeout'])
+def test_sin_escritura_se_ejecuta_como_lectura(version, conexion, sql):
+    assert data_loader.run_query(sql) is not None
+    assert conexion.modo == 'lectura'
+
+
+def test_escritura_con_returning_descarta_el_cache(version, conexion):
+    data_loader.cache_consultas.set(('SELECT * FROM ubigeo', (), ()), pd.DataFrame({'x': [1]}))
+    data_loader.cache_consultas.set(('SELECT * FROM cargo', (), ()), pd.DataFrame({'x': [1]}))
+    df = data_loader.run_query("UPDATE ubigeo SET nombre = nombre RETURNING id", escritura='ubigeo')
+    assert df['id'].tolist() == [1]
+    assert conexion.modo == 'escritura'
+    assert data_loader.cache_consultas.estadisticas()['entradas'] == 1
+
+
+@pytest.mark.skipif(not os.getenv('PRUEBAS_POSTGRESQL_URL'), reason='requiere PRUEBAS_POSTGRESQL_URL')
+def test_invalidacion_desde_otro_proceso(version):
+    with data_loader.conectar() as connection:
+        connection.exec_driver_sql("CREATE SEQUENCE IF NOT EXISTS datos_version")
+        connection.commit()
+    contador = Contador()
+    antes = data_loader.version_datos()
+    assert contador.datos() == 1
+    data_loader.cache_consultas.set(('SELECT 1', (), ()), pd.DataFrame({'x': [1]}))
+
+    # Un script de mantenimiento escribe desde otro proceso
+    subprocess.run([sys.executable, '-c', 'from utils.data_loader import invalidar_cache; invalidar_cache()'],
+                   cwd=RAIZ, env=os.environ, check=True)
+
+    assert data_loader.version_datos()[0] > antes[0]
+    assert data_loader.cache_consultas.estadisticas()['entradas'] == 0
+    assert contador.datos() == 2
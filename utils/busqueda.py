@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter
+from sqlalchemy.exc import SQLAlchemyError
+from utils.data_loader import run_query, iterar_consulta, marca_tablas, version_datos
+
+# Cada cuánto se comprueba si cambiaron las tablas indexadas (en segundos)
+TTL_BUSQUEDA = int(os.getenv('BUSQUEDA_TTL', 300))
+
+# Si cambian más filas que este número, se vuelven a leer todas en lugar de filtrarlas por huella
+MAX_CAMBIOS_INCREMENTALES = 5000
+
+# Similitud mínima (trigramas compartidos / trigramas de la búsqueda) para aceptar una coincidencia
+SIMILITUD_MINIMA = 0.5
+
+
+def normalizar(texto):
+    # Minúsculas, sin tildes y con espacios simples ('Núñez ' -> 'nunez')
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def normalizar_dni(valor):
+    # El DNI se compara como texto de 8 dígitos (un DNI numérico pierde los ceros iniciales)
+    texto = str(valor).strip()
+    return texto.zfill(8) if texto.isdigit() else texto
+
+
+def trigramas(texto):
+    # Trigramas de cada palabra con relleno, como pg_trgm ('ana' -> '  a', ' an', 'ana', 'na ')
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+class IndiceTrigramas:
+    """
+    Índice en memoria de trigramas sobre uno o más campos de texto, sin tildes ni
+    mayúsculas. Cada fila se identifica por la huella (md5) de su contenido; al
+    actualizar solo se leen las filas cuya huella es nueva y se quitan las que ya
+    no existen, en lugar de reconstruir el índice completo.
+
+    Las huellas solo se recalculan cuando cambia la versión de los datos o la
+    marca de `tablas` (marca_tablas, que no recorre las tablas). Después de la
+    primera carga, la revisión se hace en un thread aparte y las búsquedas usan
+    mientras tanto el índice anterior.
+    """
+    def __init__(self, huella, select, from_clause, tablas, campos_texto, campo_exacto=None, clave_exacta=str.strip,
+                 orden=(), ttl=TTL_BUSQUEDA):
+        self.huella = huella
+        self.select = select
+        self.from_clause = from_clause
+        self.tablas = tablas
+        self.campos_texto = campos_texto
+        self.campo_exacto = campo_exacto
+        self.clave_exacta = clave_exacta
+        self.orden = orden
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._lock_actualizacion = threading.Lock()
+        self._filas = {}      # huella -> fila
+        self._textos = {}     # huella -> texto normalizado
+        self._trigramas = {}  # trigrama -> huellas
+        self._exactos = {}    # valor exacto -> huellas
+        self._revisado_en = 0
+        self._version = None
+        self._marca = None
+
+    def _agregar(self, fila):
+        clave = fila['huella']
+        texto = normalizar(' '.join(str(fila[c]) for c in self.campos_texto if fila[c] is not None))
+        self._filas[clave] = fila
+        self._textos[clave] = texto
+        for trigrama in trigramas(texto):
+            self._trigramas.setdefault(trigrama, set()).add(clave)
+        if self.campo_exacto and fila[self.campo_exacto] is not None:
+            self._exactos.setdefault(self.clave_exacta(str(fila[self.campo_exacto])), set()).add(clave)
+
+    def _quitar(self, clave):
+        fila = self._filas.pop(clave)
+        for trigrama in trigramas(self._textos.pop(clave)):
+            huellas = self._trigramas[trigrama]
+            huellas.discard(clave)
+            if not huellas:
+                del self._trigramas[trigrama]
+        if self.campo_exacto and fila[self.campo_exacto] is not None:
+            valor = self.clave_exacta(str(fila[self.campo_exacto]))
+            self._exactos[valor].discard(clave)
+            if not self._exactos[valor]:
+                del self._exactos[valor]
+
+    def _leer(self, huellas=None):
+        """
+        Filas a indexar (todas o solo las de `huellas`) como diccionarios. Se leen
+        por bloques desde un cursor del servidor, sin armar un DataFrame con toda
+        la tabla. Devuelve None si la consulta falla.
+        """
+        query = f"SELECT {self.huella} AS huella, {self.select} {self.from_clause}"
+        params = None
+        if huellas is not None:
+            query += f" WHERE {self.huella} IN :huellas"
+            params = {'huellas': tuple(huellas)}
+        filas = []
+        try:
+            for df in iterar_consulta(query, params):
+                filas += df.astype(object).where(df.notna(), None).to_dict('records')
+        except SQLAlchemyError as e:
+            print(f"Error al leer las filas del índice de búsqueda: {e}")
+            return None
+        return filas
+
+    def actualizar(self):
+        """
+        Si cambiaron las tablas, compara las huellas de la base con las del índice
+        y aplica solo las diferencias. Si la consulta falla se conserva el índice actual.
+        """
+        with self._lock_actualizacion:
+            if not self._vigente():
+                self._actualizar()
+
+    def _refrescar(self):
+        # La primera carga se espera; después se revisa en segundo plano sin bloquear la búsqueda
+        if self._vigente():
+            return
+        if self._version is None:
+            self.actualizar()
+        elif not self._lock_actualizacion.locked():
+            threading.Thread(target=self.actualizar, daemon=True).start()
+
+    def _actualizar(self):
+        version = version_datos()
+        marca = marca_tablas(self.tablas)
+        if version == self._version and marca is not None and marca == self._marca:
+            # Nada cambió desde la última revisión: no hace falta recalcular las huellas
+            self._revisado_en = time.monotonic()
+            return
+        actuales = run_query(f"SELECT {self.huella} AS huella {self.from_clause}")
+        if actuales is None:
+            return
+        actuales = set(actuales['huella'])
+        with self._lock:
+            nuevas = actuales - self._filas.keys()
+            eliminadas = self._filas.keys() - actuales
+        if nuevas:
+            # Con muchos cambios (o en la primera carga) es más barato leer todo
+            filas = self._leer(None if len(nuevas) > MAX_CAMBIOS_INCREMENTALES else nuevas)
+            if filas is None:
+                return
+        else:
+            filas = []
+        with self._lock:
+            for clave in eliminadas:
+                self._quitar(clave)
+            for fila in filas:
+                if fila['huella'] in nuevas and fila['huella'] not in self._filas:
+                    self._agregar(fila)
+            self._revisado_en = time.monotonic()
+            self._version = version
+            self._marca = marca
+
+    def _vigente(self):
+        return time.monotonic() - self._revisado_en < self.ttl and self._version == version_datos()
+
+    def exactos(self, valor):
+        # Filas cuyo campo exacto es `valor`, sin pasar por los trigramas
+        self._refrescar()
+        with self._lock:
+            return [self._filas[clave] for clave in self._exactos.get(self.clave_exacta(str(valor)), ())]
+
+    def buscar(self, texto, limite=10):
+        """
+        Filas que coinciden con `texto`: primero las que tienen el valor exacto,
+        luego las que lo contienen y después las más parecidas por trigramas.
+        """
+        self._refrescar()
+        consulta = normalizar(texto)
+        buscados = trigramas(consulta)
+        with self._lock:
+            exactos = self._exactos.get(self.clave_exacta(str(texto)), set())
+            comunes = Counter()
+            for trigrama in buscados:
+                comunes.update(self._trigramas.get(trigrama, ()))
+            puntajes = []
+            for clave in exactos | comunes.keys():
+                similitud = comunes[clave] / len(buscados) if buscados else 0
+                contiene = bool(consulta) and consulta in self._textos[clave]
+                if clave in exactos or contiene or similitud >= SIMILITUD_MINIMA:
+                    fila = self._filas[clave]
+                    desempate = tuple(normalizar(fila[c] or '') for c in self.orden)
+                    puntajes.append(((clave not in exactos, not contiene, -similitud) + desempate, fila))
+        puntajes.sort(key=lambda p: p[0])
+        return [fila for _, fila in puntajes[:limite]]
+
+
+# Índice de defensores por nombres y apellidos (el DNI se busca de forma exacta)
+indice_defensores = IndiceTrigramas(
+    huella="md5(CAST(ROW(d.*, c.descripcion, o.ocupacion, dna.dpto, dna.prov, dna.dist) AS text))",
+    select="""d.codigo_dna, d.nombres, d.apellido, c.descripcion as cargo, CAST(d.dni AS text) AS dni,
+           o.ocupacion, dna.dpto, dna.prov, dna.dist""",
+    from_clause="""FROM defensores d
+    JOIN dna ON d.codigo_dna = dna.codigo
+    JOIN cargo c ON d.cargo = c.codigo
+    JOIN ocupacion o ON d.ocupacion = o.codigo""",
+    tablas=('defensores', 'dna', 'cargo', 'ocupacion'),
+    campos_texto=('nombres', 'apellido'),
+    campo_exacto='dni',
+    clave_exacta=normalizar_dni,
+    orden=('apellido', 'nombres'),
+)
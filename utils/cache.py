@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache en memoria con expulsión LRU, tiempo de vida por entrada y un
+    presupuesto total en bytes. `medir` calcula el tamaño de cada valor.
+    """
+    def __init__(self, max_bytes, ttl, medir):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.medir = medir
+        self._entradas = OrderedDict()  # clave -> (valor, bytes, expira)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._fallos += 1
+                return None
+            valor, _, expira = entrada
+            if time.monotonic() >= expira:
+                self._quitar(clave)
+                self._fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._aciertos += 1
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        tamano = self.medir(valor)
+        if tamano > self.max_bytes:
+            # Un valor que no cabe en el presupuesto no se guarda
+            return
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, tamano, expira)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar(self, filtro=None):
+        """
+        Elimina las entradas cuya clave cumple `filtro`, o todas si no se indica.
+        Devuelve cuántas entradas se eliminaron.
+        """
+        with self._lock:
+            claves = [c for c in self._entradas if filtro is None or filtro(c)]
+            for clave in claves:
+                self._quitar(clave)
+        return len(claves)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+            }
+
+    def _quitar(self, clave):
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
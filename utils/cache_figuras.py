@@ -0,0 +1,42 @@
+import functools
+import json
+import os
+import plotly.io as pio
+from utils.cache import CacheLRU
+from utils.data_loader import version_datos
+
+# Configuración del cache de figuras
+CACHE_FIGURAS_MB = int(os.getenv('CACHE_FIGURAS_MB', 32))
+CACHE_FIGURAS_TTL = int(os.getenv('CACHE_FIGURAS_TTL', 600))  # segundos
+
+# Cada entrada guarda el JSON de las figuras que devolvió el callback
+cache_figuras = CacheLRU(
+    max_bytes=CACHE_FIGURAS_MB * 1024 * 1024,
+    ttl=CACHE_FIGURAS_TTL,
+    medir=lambda entrada: sum(len(figura) for figura in entrada[1]),
+)
+
+
+def cachear_figuras(nombre):
+    """
+    Decorador para callbacks que devuelven una o varias figuras. Guarda el JSON
+    de las figuras por (callback, entradas, versión de datos), de modo que una
+    combinación de filtros repetida no vuelve a consultar ni a construir nada.
+    Se coloca debajo de @app.callback.
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args):
+            clave = (nombre, json.dumps(args, sort_keys=True, default=str), version_datos())
+            entrada = cache_figuras.get(clave)
+            if entrada is None:
+                resultado = func(*args)
+                unica = not isinstance(resultado, (tuple, list))
+                figuras = [resultado] if unica else resultado
+                entrada = (unica, tuple(pio.to_json(figura, validate=False) for figura in figuras))
+                cache_figuras.set(clave, entrada)
+            unica, figuras = entrada
+            salida = [json.loads(figura) for figura in figuras]
+            return salida[0] if unica else tuple(salida)
+        return envoltura
+    return decorador
@@ -0,0 +1,40 @@
+import os
+from utils.data_loader import run_query
+
+# Vida (segundos) de los catálogos en el cache de consultas. Una escritura en cualquier
+# proceso (ver version_datos) lo invalida antes de que venza, tras DATOS_VERSION_TTL segundos
+CATALOGOS_TTL = int(os.getenv('CATALOGOS_TTL', 3600))
+
+
+def cargar_catalogos(consultas):
+    """
+    Ejecuta varias consultas de catálogo en un solo viaje a la base de datos.
+    `consultas` asocia un nombre a un SELECT que devuelve una columna `valor`.
+    Devuelve {nombre: [valores]} en el orden de la base de datos; si la consulta
+    falla, cada catálogo queda vacío.
+    """
+    partes = []
+    params = {}
+    for i, (nombre, consulta) in enumerate(consultas.items()):
+        params[f'catalogo_{i}'] = nombre
+        partes.append(f"""
+        SELECT CAST(:catalogo_{i} AS text) AS catalogo, CAST(c.valor AS text) AS valor,
+               ROW_NUMBER() OVER (ORDER BY c.valor) AS orden
+        FROM ({consulta}) AS c
+        """)
+    query = ' UNION ALL '.join(partes) + ' ORDER BY catalogo, orden'
+    df = run_query(query, params, cache=True, ttl=CATALOGOS_TTL)
+    catalogos = {nombre: [] for nombre in consultas}
+    if df is not None:
+        for nombre, grupo in df.groupby('catalogo', sort=False):
+            catalogos[nombre] = grupo['valor'].tolist()
+    return catalogos
+
+
+def opciones(valores):
+    return [{'label': v, 'value': v} for v in valores]
+
+
+def valores_por_defecto(valores, defectos):
+    # Valores del catálogo cuya etiqueta está entre los valores por defecto
+    return [v for v in valores if v in defectos]
@@ -0,0 +1,34 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+# Espera entre intentos cuando todos los cupos están ocupados (segundos)
+CUPOS_ESPERA = 0.05
+
+
+@contextmanager
+def cupo(nombre, cupos, directorio):
+    """
+    Limita a `cupos` las ejecuciones simultáneas de un bloque entre todos los
+    procesos y threads del servidor. Cada cupo es un bloqueo sobre un archivo de
+    `directorio`; el sistema lo libera cuando el proceso termina, aunque sea
+    abruptamente (Dash termina con una señal los trabajos en segundo plano
+    cancelados), así que un cupo no queda tomado para siempre.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    while True:
+        for i in range(max(cupos, 1)):
+            archivo = open(os.path.join(directorio, f'{nombre}.{i}.lock'), 'a')
+            try:
+                fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                archivo.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+                archivo.close()
+            return
+        time.sleep(CUPOS_ESPERA)
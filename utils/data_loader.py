@@ -1,8 +1,17 @@
 import pandas as pd
+from pandas.api.types import union_categoricals
 from sqlalchemy import create_engine, text
+import hashlib
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from sqlalchemy.exc import SQLAlchemyError
+from dash.exceptions import PreventUpdate
+from flask import has_request_context, request
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+from utils.cache import CacheLRU
 
 # Cargar variables de entorno
 load_dotenv()
@@ -10,24 +19,453 @@ load_dotenv()
 # Obtener la URL de la base de datos desde la variable de entorno
 db_url = os.getenv('postgresql_dsld_url')
 
+# Configuración del pool de conexiones
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # segundos antes de renovar una conexión
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))  # 0 desactiva el límite
+DB_ESPERA_LENTA_MS = int(os.getenv('DB_ESPERA_LENTA_MS', 500))  # umbral para avisar de esperas en el pool
+
+# Filas leídas por bloque al construir los DataFrames
+DB_FETCH_CHUNK = int(os.getenv('DB_FETCH_CHUNK', 5000))
+
+
+# Configuración del cache de resultados de run_query
+CACHE_CONSULTAS_MB = int(os.getenv('CACHE_CONSULTAS_MB', 64))
+CACHE_CONSULTAS_TTL = int(os.getenv('CACHE_CONSULTAS_TTL', 300))  # segundos
+
 # Crear la conexión a PostgreSQL
-engine = create_engine(db_url)
+engine = create_engine(
+    db_url,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'},
+)
+
+# Cada cuánto (segundos) cada proceso relee la versión compartida de los datos
+DATOS_VERSION_TTL = float(os.getenv('DATOS_VERSION_TTL', 5))
+
+'''
+Versión de los datos. Las escrituras incrementan la secuencia datos_version
+(migración 006), que comparten todos los procesos: los workers web, los scripts
+de mantenimiento (utils.resumenes, actualizar_ubigeo) y las migraciones. Cada
+proceso la relee como máximo cada DATOS_VERSION_TTL segundos y, si cambió,
+descarta cache_consultas; los demás caches comparan su versión con
+version_datos() y se recargan. El contador local cubre las escrituras del propio
+proceso cuando la secuencia no existe o no se puede leer.
+'''
+_version = {'compartida': None, 'local': 0, 'leida_en': float('-inf'), 'leyendo': False, 'aviso': False}
+_version_lock = threading.Lock()
+
+def _despues_de_fork():
+    # Un proceso hijo (worker de gunicorn o callback en segundo plano) no debe reutilizar
+    # las conexiones abiertas por el proceso padre: se descartan sin cerrarlas. Tampoco
+    # hereda una lectura de la versión que estuviera en curso en otro thread del padre
+    engine.dispose(close=False)
+    _version['leyendo'] = False
+
+os.register_at_fork(after_in_child=_despues_de_fork)
+
+def _leer_version_compartida():
+    # Valor actual de la secuencia (0 antes del primer nextval); None si no se puede leer
+    try:
+        with conectar() as connection:
+            return connection.exec_driver_sql(
+                "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM datos_version"
+            ).scalar()
+    except SQLAlchemyError as e:
+        if not _version['aviso']:
+            _version['aviso'] = True
+            print(f"No se pudo leer la versión compartida de los datos (¿falta la migración 006?): {e}")
+        return None
+
+def _incrementar_version_compartida():
+    try:
+        with conectar() as connection:
+            return connection.exec_driver_sql("SELECT nextval('datos_version')").scalar()
+    except SQLAlchemyError as e:
+        print(f"No se pudo registrar el cambio en la versión compartida de los datos: {e}")
+        return None
+
+def version_datos():
+    """
+    Versión de los datos como (versión compartida, cambios de este proceso). Un
+    solo thread relee la versión compartida cuando vence DATOS_VERSION_TTL; los
+    demás usan mientras tanto la última leída.
+    """
+    with _version_lock:
+        releer = not _version['leyendo'] and time.monotonic() - _version['leida_en'] >= DATOS_VERSION_TTL
+        if not releer:
+            return _version['compartida'], _version['local']
+        _version['leyendo'] = True
+    compartida = _leer_version_compartida()
+    with _version_lock:
+        _version['leyendo'] = False
+        _version['leida_en'] = time.monotonic()
+        if compartida is not None:
+            # La primera lectura no es un cambio: todavía no hay nada cacheado con la versión anterior
+            if _version['compartida'] is not None and compartida != _version['compartida']:
+                cache_consultas.invalidar()
+            _version['compartida'] = compartida
+        return _version['compartida'], _version['local']
+
+def registrar_cambio_datos():
+    """
+    Marca los datos como modificados en este proceso y en la versión compartida.
+    Los scripts de mantenimiento pueden llamarla después de escribir por fuera de
+    run_query (invalidar_cache ya la llama).
+    """
+    compartida = _incrementar_version_compartida()
+    with _version_lock:
+        _version['local'] += 1
+        if compartida is not None:
+            # Si otro proceso también escribió desde la última lectura, sus cambios
+            # no se reflejan en las tablas invalidadas por este: se descarta todo
+            if _version['compartida'] is not None and compartida != _version['compartida'] + 1:
+                cache_consultas.invalidar()
+            _version['compartida'] = compartida
+            _version['leida_en'] = time.monotonic()
+
+# Cache de resultados: clave = SQL normalizado + parámetros, tamaño medido en bytes del DataFrame
+cache_consultas = CacheLRU(
+    max_bytes=CACHE_CONSULTAS_MB * 1024 * 1024,
+    ttl=CACHE_CONSULTAS_TTL,
+    medir=lambda df: int(df.memory_usage(index=True, deep=True).sum()),
+)
+
+def clave_consulta(query, params=None, dtypes=None):
+    sql = ' '.join(query.split())
+    return (sql,
+            tuple(sorted((k, repr(v)) for k, v in (params or {}).items())),
+            tuple(sorted((dtypes or {}).items())))
+
+def invalidar_cache(tablas=None):
+    """
+    Descarta los resultados cacheados que leen alguna de las tablas indicadas
+    (todas si no se indican) y marca los datos como modificados para que los
+    demás caches en memoria, en este y en los demás procesos, se recarguen.
+    run_query la llama tras cada escritura; los scripts de mantenimiento que
+    escriben por otra vía deben llamarla ellos.
+    """
+    if isinstance(tablas, str):
+        tablas = [tablas]
+    if tablas:
+        patron = re.compile(r'\b(' + '|'.join(re.escape(t) for t in tablas) + r')\b', re.IGNORECASE)
+        eliminadas = cache_consultas.invalidar(lambda clave: patron.search(clave[0]) is not None)
+    else:
+        eliminadas = cache_consultas.invalidar()
+    registrar_cambio_datos()
+    return eliminadas
+
+# Marca de cambios de un conjunto de tablas que no las recorre (ver marca_tablas)
+MARCA_TABLAS = """
+    SELECT string_agg(concat_ws(':', relname, n_tup_ins, n_tup_upd, n_tup_del, pg_relation_filenode(relid)),
+                      ',' ORDER BY relname) AS marca
+    FROM pg_stat_user_tables
+    WHERE relid IN (SELECT to_regclass(t) FROM unnest(CAST(:tablas AS text[])) AS t)
+"""
+
+def marca_tablas(tablas):
+    """
+    Marca que cambia cuando se modifica alguna de `tablas`: los contadores de filas
+    insertadas, actualizadas y eliminadas de pg_stat_user_tables y el archivo de
+    cada tabla (TRUNCATE lo reemplaza). Solo lee estadísticas, así que sirve para
+    revisar seguido si hay cambios hechos por fuera de la aplicación. PostgreSQL
+    publica las estadísticas con hasta un segundo de retraso. None si falla.
+    """
+    df = run_query(MARCA_TABLAS, {'tablas': list(tablas)})
+    if df is None or df.empty:
+        return None
+    return df['marca'][0]
+
+# Métricas del pool: cuánto se espera para obtener una conexión y cuántas están en uso
+_metricas_pool = {
+    'checkouts': 0,
+    'espera_total_ms': 0.0,
+    'espera_max_ms': 0.0,
+    'esperas_lentas': 0,
+    'timeouts': 0,
+    'en_uso_max': 0,
+    'cancelaciones': 0,
+}
+_metricas_lock = threading.Lock()
+
+def _registrar_checkout(espera_ms):
+    en_uso = engine.pool.checkedout()
+    with _metricas_lock:
+        _metricas_pool['checkouts'] += 1
+        _metricas_pool['espera_total_ms'] += espera_ms
+        _metricas_pool['espera_max_ms'] = max(_metricas_pool['espera_max_ms'], espera_ms)
+        _metricas_pool['en_uso_max'] = max(_metricas_pool['en_uso_max'], en_uso)
+        if espera_ms >= DB_ESPERA_LENTA_MS:
+            _metricas_pool['esperas_lentas'] += 1
+    if espera_ms >= DB_ESPERA_LENTA_MS:
+        print(f"Espera de {espera_ms:.0f} ms para obtener una conexión ({en_uso}/{DB_POOL_SIZE + DB_MAX_OVERFLOW} en uso)")
+
+def estadisticas_pool():
+    """
+    Resumen del estado del pool. Una saturación cercana a 1 con esperas altas
+    indica que el cuello de botella es el pool y no la base de datos.
+    """
+    capacidad = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    en_uso = engine.pool.checkedout()
+    with _metricas_lock:
+        metricas = dict(_metricas_pool)
+    checkouts = metricas['checkouts']
+    metricas.update({
+        'en_uso': en_uso,
+        'capacidad': capacidad,
+        'saturacion': round(en_uso / capacidad, 3) if capacidad else None,
+        'espera_promedio_ms': round(metricas['espera_total_ms'] / checkouts, 2) if checkouts else 0.0,
+    })
+    return metricas
+
+@contextmanager
+def conectar():
+    # Obtener una conexión del pool midiendo el tiempo de espera
+    inicio = time.perf_counter()
+    try:
+        connection = engine.connect()
+    except PoolTimeoutError:
+        with _metricas_lock:
+            _metricas_pool['timeouts'] += 1
+        raise
+    _registrar_checkout((time.perf_counter() - inicio) * 1000)
+    with connection:
+        yield connection
+
+# Cabeceras que agrega assets/clientside.js a las peticiones de los callbacks: un
+# identificador de la carga de la página (cada pestaña tiene el suyo) y si esa
+# página todavía espera una respuesta anterior del mismo callback
+CABECERA_PAGINA = 'X-Id-Pagina'
+CABECERA_PENDIENTE = 'X-Callback-Pendiente'
+
+class ConsultaCancelada(PreventUpdate):
+    """
+    La consulta se canceló porque llegó una ejecución más reciente del mismo
+    callback en la misma pestaña. Al heredar de PreventUpdate, Dash descarta la
+    respuesta sin tocar la salida (la ejecución nueva es la que la actualiza).
+    """
+
+def etiqueta_cancelable(nombre):
+    # application_name que identifica (carga de la página, callback); None fuera de una petición del navegador
+    if not has_request_context():
+        return None
+    pagina = request.headers.get(CABECERA_PAGINA)
+    if not pagina:
+        return None
+    return 'cancelable:' + hashlib.md5(f'{pagina}:{nombre}'.encode()).hexdigest()
+
+def _hay_pendiente():
+    # La página avisa si sigue esperando otra respuesta del mismo callback
+    return has_request_context() and request.headers.get(CABECERA_PENDIENTE) == '1'
+
+def _reemplazar_consulta(connection, etiqueta, cancelar=True):
+    """
+    Etiqueta la conexión actual con application_name y, si la página tiene una
+    ejecución anterior pendiente (`cancelar`), cancela la consulta con la misma
+    etiqueta que siga en curso en este proceso o en otro worker. Sin nada que
+    cancelar no se recorre pg_stat_activity.
+    """
+    if not cancelar:
+        connection.execute(text("SELECT set_config('application_name', :etiqueta, false)"), {'etiqueta': etiqueta})
+        return
+    cancelados = connection.execute(text("""
+        SELECT set_config('application_name', :etiqueta, false),
+               (SELECT count(*) FILTER (WHERE pg_cancel_backend(pid))
+                FROM pg_stat_activity
+                WHERE application_name = :etiqueta AND state = 'active' AND pid <> pg_backend_pid())
+    """), {'etiqueta': etiqueta}).one()[1]
+    if cancelados:
+        with _metricas_lock:
+            _metricas_pool['cancelaciones'] += cancelados
+
+def _quitar_etiqueta(connection):
+    # Una cancelación que llegue justo ahora puede interrumpir el RESET; en ese caso la conexión se descarta
+    try:
+        connection.exec_driver_sql("RESET application_name")
+    except SQLAlchemyError:
+        connection.invalidate()
+
+def _fue_reemplazada(error, inicio, timeout_ms):
+    # QUERY_CANCELED (57014) antes de agotar statement_timeout: la canceló una ejecución más reciente
+    if getattr(error.orig, 'pgcode', None) != '57014':
+        return False
+    limite = DB_STATEMENT_TIMEOUT_MS if timeout_ms is None else int(timeout_ms)
+    return limite == 0 or (time.perf_counter() - inicio) * 1000 < limite
+
+# Lecturas recibidas por run_query en el thread actual mientras hay una captura activa
+_captura = threading.local()
+
+@contextmanager
+def capturar_consultas():
+    """
+    Registra (sql, params) de cada lectura que recibe run_query dentro del bloque,
+    incluso las que se responden desde el cache. La usa utils/planes.py.
+    """
+    anterior = getattr(_captura, 'consultas', None)
+    consultas = []
+    _captura.consultas = consultas
+    try:
+        yield consultas
+    finally:
+        _captura.consultas = anterior
+
+def _columna(valores, dtype=None):
+    # Construye una columna tipada directamente a partir de los valores leídos
+    if dtype is None:
+        return pd.Series(valores)
+    if dtype == 'category':
+        return pd.Series(pd.Categorical(valores))
+    if str(dtype).startswith('datetime'):
+        return pd.Series(pd.to_datetime(valores, errors='coerce'))
+    return pd.Series(valores).astype(dtype)
+
+def _bloque_a_dataframe(nombres, columnas, dtypes=None):
+    dtypes = dtypes or {}
+    if not columnas:
+        columnas = [[] for _ in nombres]
+    df = pd.DataFrame({i: _columna(valores, dtypes.get(nombre)) for i, (nombre, valores) in enumerate(zip(nombres, columnas))})
+    df.columns = nombres
+    return df
+
+def _a_dataframe(result, dtypes=None, chunksize=None):
+    """
+    Sin chunksize el resultado ya está completo en el cliente y se convierte de
+    una vez. Con chunksize (cursor del servidor) cada bloque se convierte en un
+    DataFrame tipado antes de leer el siguiente y al final se concatenan.
+    """
+    nombres = list(result.keys())
+    if not chunksize:
+        df = pd.DataFrame(result.fetchall(), columns=nombres)
+        for nombre, dtype in (dtypes or {}).items():
+            if nombre in df.columns:
+                df[nombre] = _columna(df[nombre], dtype)
+        return df
+    bloques = [_bloque_a_dataframe(nombres, list(zip(*bloque)), dtypes) for bloque in result.partitions(chunksize)]
+    if not bloques:
+        return _bloque_a_dataframe(nombres, [], dtypes)
+    if len(bloques) == 1:
+        return bloques[0]
+    df = pd.concat(bloques, ignore_index=True)
+    # Cada bloque tiene sus propias categorías; concat las convertiría en object
+    for nombre, dtype in (dtypes or {}).items():
+        if dtype == 'category' and nombre in df.columns:
+            df[nombre] = union_categoricals([bloque[nombre] for bloque in bloques], ignore_order=True)
+    return df
 
 # Función para ejecutar consultas SQL
-def run_query(query, params=None):
+def run_query(query, params=None, timeout_ms=None, cache=False, ttl=None, dtypes=None, chunksize=None, cancelable=None,
+              escritura=False):
+    """
+    Ejecuta una consulta y devuelve un DataFrame (o None si no devuelve filas o falla).
+    Las consultas son lecturas (autocommit y solo lectura) salvo que se indique
+    `escritura`: True o las tablas que modifica. Las escrituras se ejecutan en una
+    transacción y, al confirmarse, descartan el cache de esas tablas (de todas con
+    True), devuelvan filas (RETURNING) o no.
+    Con cache=True los resultados de lectura se guardan en cache_consultas durante
+    `ttl` segundos (CACHE_CONSULTAS_TTL por defecto); se devuelve siempre una copia.
+    `dtypes` indica el tipo de algunas columnas (por ejemplo {'dpto': 'category'});
+    esas lecturas, y las que indican `chunksize`, se hacen desde un cursor del
+    servidor en bloques de ese tamaño (DB_FETCH_CHUNK por defecto).
+    Con `cancelable` (nombre del callback) una lectura hecha dentro de una petición
+    cancela la del mismo callback y pestaña que siga en curso; la cancelada lanza
+    ConsultaCancelada.
+    """
+    if escritura:
+        return _escribir(query, params, timeout_ms, dtypes, escritura)
+
+    capturadas = getattr(_captura, 'consultas', None)
+    if capturadas is not None:
+        capturadas.append((query, dict(params or {})))
+
+    clave = None
+    if cache:
+        version_datos()  # Descarta el cache si otro proceso modificó los datos
+        clave = clave_consulta(query, params, dtypes)
+        df = cache_consultas.get(clave)
+        if df is not None:
+            return df.copy()
+
+    if dtypes and not chunksize:
+        chunksize = DB_FETCH_CHUNK
+    etiqueta = etiqueta_cancelable(cancelable) if cancelable and not chunksize else None
+    df = _ejecutar(query, params, timeout_ms, dtypes, chunksize, etiqueta, etiqueta is not None and _hay_pendiente())
+    if clave is not None and df is not None:
+        cache_consultas.set(clave, df.copy(), ttl)
+    return df
+
+def _ejecutar(query, params, timeout_ms, dtypes=None, chunksize=None, etiqueta=None, cancelar=False):
     try:
-        with engine.begin() as connection:  # Usa engine.begin() para manejar transacciones automáticamente
-            result = connection.execute(text(query), params)
-            if result.returns_rows:
-                # Si la consulta devuelve filas (por ejemplo, SELECT), retornarlas como DataFrame
-                return pd.DataFrame(result.fetchall(), columns=result.keys())
-            else:
-                # Para consultas que no devuelven filas (UPDATE, INSERT, DELETE), simplemente retornar None
-                return None
+        with conectar() as connection:
+            if chunksize:
+                # El cursor del servidor necesita una transacción; se abre en solo lectura
+                connection.execution_options(stream_results=True, max_row_buffer=chunksize, postgresql_readonly=True)
+                with connection.begin():
+                    if timeout_ms is not None:
+                        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                    result = connection.execute(text(query), params)
+                    return _a_dataframe(result, dtypes, chunksize) if result.returns_rows else None
+
+            # Las lecturas se ejecutan en autocommit y solo lectura, sin abrir una transacción
+            connection.execution_options(isolation_level='AUTOCOMMIT', postgresql_readonly=True)
+            if timeout_ms is not None:
+                connection.exec_driver_sql(f"SET statement_timeout = {int(timeout_ms)}")
+            inicio = time.perf_counter()
+            try:
+                if etiqueta is not None:
+                    _reemplazar_consulta(connection, etiqueta, cancelar)
+                result = connection.execute(text(query), params)
+                return _a_dataframe(result, dtypes) if result.returns_rows else None
+            except DBAPIError as e:
+                if etiqueta is not None and _fue_reemplazada(e, inicio, timeout_ms):
+                    raise ConsultaCancelada() from e
+                raise
+            finally:
+                if etiqueta is not None:
+                    _quitar_etiqueta(connection)
+                if timeout_ms is not None and not connection.invalidated:
+                    connection.exec_driver_sql("RESET statement_timeout")
     except SQLAlchemyError as e:
         print(f"Error al ejecutar la consulta: {e}")
         return None
 
+def _escribir(query, params, timeout_ms, dtypes, tablas):
+    try:
+        with conectar() as connection:
+            with connection.begin():  # Las escrituras se confirman al salir del bloque
+                if timeout_ms is not None:
+                    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                result = connection.execute(text(query), params)
+                # Si la consulta devuelve filas (RETURNING), retornarlas como DataFrame
+                df = _a_dataframe(result, dtypes) if result.returns_rows else None
+    except SQLAlchemyError as e:
+        print(f"Error al ejecutar la consulta: {e}")
+        return None
+    # Ya confirmada: descartar el cache de las tablas modificadas (de todas con escritura=True)
+    invalidar_cache(None if tablas is True else tablas)
+    return df
+
+def iterar_consulta(query, params=None, chunksize=DB_FETCH_CHUNK, dtypes=None, timeout_ms=None):
+    """
+    Recorre el resultado de una lectura en DataFrames de hasta `chunksize` filas,
+    leídos desde un cursor del servidor, para procesar extracciones grandes sin
+    tenerlas completas en memoria. A diferencia de run_query, los errores se propagan.
+    """
+    with conectar() as connection:
+        connection.execution_options(stream_results=True, max_row_buffer=chunksize, postgresql_readonly=True)
+        with connection.begin():
+            if timeout_ms is not None:
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+            result = connection.execute(text(query), params)
+            nombres = list(result.keys())
+            for bloque in result.partitions(chunksize):
+                yield _bloque_a_dataframe(nombres, list(zip(*bloque)), dtypes)
+
 def actualizar_ubigeo():
     # Verificar si ya existe 'Áncash' en la tabla
     verificar_existencia_query = "SELECT COUNT(*) AS count FROM ubigeo WHERE nombre = 'Áncash';"
@@ -36,7 +474,7 @@ def actualizar_ubigeo():
     if resultado is not None and resultado['count'][0] == 0:
         # Si no existe 'Áncash', realizar la actualización
         update_query = "UPDATE ubigeo SET nombre = 'Áncash' WHERE nombre = 'Ancash';"
-        run_query(update_query)
+        run_query(update_query, escritura='ubigeo')
         print("Actualización realizada exitosamente.")
     else:
         print("La actualización ya se ha realizado previamente o 'Áncash' ya existe.")
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Formatos en los que se registran las fechas de inicio y término del CCONNA,
+# con la expresión que reconoce cada uno (día, mes y año). fecha_cconna
+# (utils/sql_migraciones/005_fecha_cconna.sql) usa las mismas expresiones
+FORMATOS_FECHA = (
+    ('%d/%m/%Y', r'(?P<day>[0-9]{1,2})/(?P<month>[0-9]{1,2})/(?P<year>[0-9]{4})'),
+    ('%Y', r'(?P<year>[0-9]{4})'),
+    ('%Y-%m-%d', r'(?P<year>[0-9]{4})-(?P<month>[0-9]{1,2})-(?P<day>[0-9]{1,2})'),
+    ('%d-%m-%Y', r'(?P<day>[0-9]{1,2})-(?P<month>[0-9]{1,2})-(?P<year>[0-9]{4})'),
+)
+
+# Años completos que caben en datetime64[ns]; fuera de este rango la fecha se descarta
+FECHA_MINIMA = pd.Timestamp('1678-01-01')
+FECHA_MAXIMA = pd.Timestamp('2261-12-31')
+
+
+def parse_fechas(serie):
+    """
+    Convierte una columna de fechas en texto a datetime con las mismas reglas que
+    fecha_cconna en la base de datos, para que los conteos en pandas y en SQL
+    coincidan: se quitan los espacios de los extremos, el valor debe tener uno de
+    los FORMATOS_FECHA completo y ser una fecha válida entre FECHA_MINIMA y
+    FECHA_MAXIMA. Lo demás (por ejemplo 31/02/2020 o '2020/05/01') queda como NaT.
+    """
+    texto = serie.astype('string').str.strip(' ')
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    pendientes = texto.notna()
+    for _, patron in FORMATOS_FECHA:
+        if not pendientes.any():
+            break
+        partes = texto[pendientes].str.extract(f'^{patron}$')
+        partes = partes[partes['year'].notna()]
+        if partes.empty:
+            continue
+        componentes = pd.DataFrame({
+            columna: pd.to_numeric(partes[columna]).astype('int64') if columna in partes else 1
+            for columna in ('year', 'month', 'day')
+        }, index=partes.index)
+        # Se descartan antes de convertir los años que no caben en datetime64[ns]
+        componentes = componentes[componentes['year'].between(FECHA_MINIMA.year, FECHA_MAXIMA.year)]
+        fechas[componentes.index] = pd.to_datetime(componentes, errors='coerce')
+        pendientes[partes.index] = False
+    return fechas
+
+
+def clasificar_vigencia(fecha_inicio, fecha_termino, hoy=None):
+    """
+    Un CCONNA está 'Vigente' si ya inició y su fecha de término no ha pasado
+    (o no tiene fecha de término). En cualquier otro caso es 'No Vigente'.
+    """
+    if hoy is None:
+        hoy = pd.to_datetime(datetime.today().date())
+    vigente = fecha_inicio.notna() & (fecha_inicio <= hoy) & (fecha_termino.isna() | (hoy <= fecha_termino))
+    return pd.Series(np.where(vigente, 'Vigente', 'No Vigente'), index=fecha_inicio.index)
+
+
+def sql_fecha(columna):
+    """
+    Expresión SQL que convierte una columna de texto a fecha con fecha_cconna(),
+    la función de la migración utils/sql_migraciones/005_fecha_cconna.sql. Aplica
+    las mismas reglas que parse_fechas y devuelve NULL donde parse_fechas da NaT.
+    """
+    return f"fecha_cconna({columna}::text)"
+
+
+def sql_vigencia(fecha_inicio, fecha_termino):
+    """
+    Expresión SQL equivalente a clasificar_vigencia sobre dos expresiones de fecha.
+    """
+    return f"""CASE
+            WHEN {fecha_inicio} <= CURRENT_DATE
+                 AND ({fecha_termino} IS NULL OR CURRENT_DATE <= {fecha_termino}) THEN 'Vigente'
+            ELSE 'No Vigente'
+        END"""
@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils.data_loader import conectar, invalidar_cache
+from utils.busqueda import normalizar
+from utils.planes import PLANES_CAPTURA, leer_planes
+
+# Archivos NNN_nombre.sql, aplicados en orden de versión
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql_migraciones')
+
+# El asesor solo sugiere índices para tablas con al menos estas filas (estimadas)
+ASESOR_FILAS_MINIMAS = int(os.getenv('ASESOR_FILAS_MINIMAS', 10000))
+
+CREAR_CONTROL = """
+CREATE TABLE IF NOT EXISTS schema_migraciones (
+    version text PRIMARY KEY,
+    nombre text NOT NULL,
+    aplicada timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+PATRON_INDICE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"?(\w+)"?', re.IGNORECASE)
+
+
+def migraciones_disponibles():
+    # (versión, nombre, ruta) de cada archivo de migración, en orden
+    migraciones = []
+    for archivo in sorted(os.listdir(DIRECTORIO_MIGRACIONES)):
+        coincidencia = re.match(r'(\d+)_(\w+)\.sql$', archivo)
+        if coincidencia:
+            migraciones.append((coincidencia.group(1), coincidencia.group(2),
+                                os.path.join(DIRECTORIO_MIGRACIONES, archivo)))
+    return migraciones
+
+
+def sentencias(sql):
+    """
+    Separa el archivo en sentencias por ';', que se ejecutan una a una. Los cuerpos
+    entre $$ (funciones) se conservan completos; fuera de ellos no debe haber ';'
+    dentro de textos.
+    """
+    sin_comentarios = re.sub(r'--[^\n]*', '', sql)
+    partes, actual, delimitador = [], '', None
+    for trozo in re.split(r'(\$\w*\$)', sin_comentarios):
+        if re.fullmatch(r'\$\w*\$', trozo):
+            if delimitador is None:
+                delimitador = trozo
+            elif trozo == delimitador:
+                delimitador = None
+            actual += trozo
+        elif delimitador is None:
+            fragmentos = trozo.split(';')
+            actual += fragmentos[0]
+            for fragmento in fragmentos[1:]:
+                partes.append(actual)
+                actual = fragmento
+        else:
+            actual += trozo
+    partes.append(actual)
+    return [s.strip() for s in partes if s.strip()]
+
+
+def _descartar_indice_invalido(connection, sentencia):
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido y IF NOT EXISTS
+    # no lo reconstruiría: se elimina para volver a crearlo
+    coincidencia = PATRON_INDICE.match(sentencia)
+    if not coincidencia:
+        return
+    invalido = connection.execute(text("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :nombre AND pg_table_is_visible(c.oid)
+    """), {'nombre': coincidencia.group(1)}).scalar()
+    if invalido:
+        print(f"Eliminando el índice inválido {coincidencia.group(1)}")
+        connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{coincidencia.group(1)}"')
+
+
+def aplicar_migraciones(solo_pendientes=False):
+    """
+    Aplica en orden las migraciones que no figuran en schema_migraciones. Cada
+    sentencia se ejecuta en autocommit, porque CREATE INDEX CONCURRENTLY no puede
+    correr dentro de una transacción, y sin límite de tiempo. La versión se
+    registra al terminar todas sus sentencias; como son idempotentes (IF NOT
+    EXISTS, CREATE OR REPLACE), una migración interrumpida puede volver a
+    ejecutarse. Con solo_pendientes=True solo se listan. Devuelve las versiones
+    pendientes o aplicadas.
+    """
+    procesadas = []
+    with conectar() as connection:
+        connection.execution_options(isolation_level='AUTOCOMMIT')
+        connection.execute(text(CREAR_CONTROL))
+        aplicadas = set(connection.execute(text("SELECT version FROM schema_migraciones")).scalars())
+        connection.exec_driver_sql("SET statement_timeout = 0")
+        try:
+            for version, nombre, ruta in migraciones_disponibles():
+                if version in aplicadas:
+                    continue
+                procesadas.append(version)
+                if solo_pendientes:
+                    print(f"Pendiente: {version}_{nombre}")
+                    continue
+                inicio = time.perf_counter()
+                with open(ruta, encoding='utf-8') as f:
+                    for sentencia in sentencias(f.read()):
+                        _descartar_indice_invalido(connection, sentencia)
+                        connection.exec_driver_sql(sentencia)
+                connection.execute(text("INSERT INTO schema_migraciones (version, nombre) VALUES (:version, :nombre)"),
+                                   {'version': version, 'nombre': nombre})
+                print(f"{version}_{nombre} aplicada en {time.perf_counter() - inicio:.1f} s")
+        finally:
+            connection.exec_driver_sql("RESET statement_timeout")
+    if procesadas and not solo_pendientes:
+        # Una migración puede cambiar lo que devuelven las consultas (por ejemplo fecha_cconna)
+        invalidar_cache()
+    return procesadas
+
+
+def _usos_filtro(filtro, columnas):
+    """
+    Columnas de la tabla que aparecen en el filtro de un Seq Scan con el tipo de
+    comparación: 'igualdad' (= o IN), 'rango' (<, >, BETWEEN) o 'patron' (LIKE
+    con prefijo fijo, que puede usar text_pattern_ops).
+    """
+    usos = OrderedDict()
+    for columna in columnas:
+        referencia = rf'(?:\w+\.)?(?:"{re.escape(columna)}"|\b{re.escape(columna)}\b)'
+        patron = re.compile(referencia + r"\)*(?:::[\w ]+(?:\[\])?\)*)*\s*(>=|<=|=|>|<|~~)\s*(?:ANY\s*)?\(*'?([^']*)")
+        for coincidencia in patron.finditer(filtro):
+            operador, valor = coincidencia.groups()
+            if operador == '=':
+                uso = 'igualdad'
+            elif operador == '~~':
+                if not valor or valor[0] in '%_':
+                    continue
+                uso = 'patron'
+            else:
+                uso = 'rango'
+            if usos.get(columna) != 'igualdad':
+                usos[columna] = uso
+    return usos
+
+
+def _columnas_indice(usos):
+    # Igualdades primero, luego un solo rango o patrón (un B-tree no aprovecha más de uno)
+    columnas = [(c, None) for c, uso in usos.items() if uso == 'igualdad']
+    resto = [(c, 'text_pattern_ops' if uso == 'patron' else None) for c, uso in usos.items() if uso != 'igualdad']
+    return columnas + resto[:1]
+
+
+def _nombre_indice(tabla, columnas):
+    nombre = re.sub(r'\W+', '_', normalizar('_'.join([tabla] + [c for c, _ in columnas])))
+    return f'{nombre[:59]}_idx'
+
+
+def recomendar_indices(archivo=PLANES_CAPTURA):
+    """
+    Lee los planes capturados por utils/planes.py y sugiere un índice para cada
+    tabla grande que se recorre secuencialmente con un filtro, salvo que ya
+    exista un índice válido que empiece por las mismas columnas. Devuelve una
+    lista de {'tabla', 'sentencia', 'consultas'} ordenada por consultas beneficiadas.
+    """
+    planes = leer_planes(archivo)
+    sugerencias = OrderedDict()
+    with conectar() as connection:
+        columnas_tabla, filas_tabla, indices_tabla = {}, {}, {}
+        for clave, plan in planes.items():
+            for recorrido in plan['secuenciales']:
+                tabla, filtro = recorrido['tabla'], recorrido['filtro']
+                if not filtro:
+                    continue
+                if tabla not in columnas_tabla:
+                    columnas_tabla[tabla] = list(connection.execute(text("""
+                        SELECT column_name FROM information_schema.columns
+                        WHERE table_name = :tabla AND table_schema = current_schema()
+                        ORDER BY ordinal_position
+                    """), {'tabla': tabla}).scalars())
+                    filas_tabla[tabla] = connection.execute(
+                        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:tabla)"), {'tabla': tabla}
+                    ).scalar() or 0
+                    indices_tabla[tabla] = [list(c) for c in connection.execute(text("""
+                        SELECT array_agg(a.attname ORDER BY k.n)
+                        FROM pg_index i
+                        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, n)
+                        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                        WHERE i.indrelid = to_regclass(:tabla) AND i.indisvalid
+                        GROUP BY i.indexrelid
+                    """), {'tabla': tabla}).scalars()]
+                if filas_tabla[tabla] < ASESOR_FILAS_MINIMAS:
+                    continue
+                columnas = _columnas_indice(_usos_filtro(filtro, columnas_tabla[tabla]))
+                nombres = [c for c, _ in columnas]
+                if not columnas or any(existente[:len(nombres)] == nombres for existente in indices_tabla[tabla]):
+                    continue
+                definicion = ', '.join(f'"{c}" {clase}' if clase else f'"{c}"' for c, clase in columnas)
+                sentencia = (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {_nombre_indice(tabla, columnas)} '
+                             f'ON {tabla} ({definicion})')
+                sugerencia = sugerencias.setdefault(sentencia, {'tabla': tabla, 'sentencia': sentencia, 'consultas': []})
+                sugerencia['consultas'].append(clave)
+    return sorted(sugerencias.values(), key=lambda s: -len(s['consultas']))
+
+
+def escribir_migracion(sugerencias, nombre='indices_sugeridos'):
+    # Guarda las sugerencias como la siguiente migración para revisarlas antes de aplicarlas
+    migraciones = migraciones_disponibles()
+    version = f"{int(migraciones[-1][0]) + 1 if migraciones else 1:03d}"
+    ruta = os.path.join(DIRECTORIO_MIGRACIONES, f'{version}_{nombre}.sql')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for sugerencia in sugerencias:
+            f.write(f"-- {len(sugerencia['consultas'])} consultas, por ejemplo {sugerencia['consultas'][0]}\n")
+            f.write(f"{sugerencia['sentencia']};\n\n")
+    return ruta
+
+
+if __name__ == "__main__":
+    # python -m utils.migraciones [--pendientes | --sugerir [--escribir]]
+    argumentos = sys.argv[1:]
+    try:
+        if '--sugerir' in argumentos:
+            sugerencias = recomendar_indices()
+            for sugerencia in sugerencias:
+                print(f"{sugerencia['sentencia']};  -- {len(sugerencia['consultas'])} consultas")
+            if not sugerencias:
+                print("No hay índices para sugerir")
+            elif '--escribir' in argumentos:
+                print(f"Migración escrita en {escribir_migracion(sugerencias)}")
+        else:
+            aplicar_migraciones(solo_pendientes='--pendientes' in argumentos)
+    except (SQLAlchemyError, OSError) as e:
+        print(f"Error en las migraciones: {e}")
+        sys.exit(1)
@@ -0,0 +1,42 @@
+from utils.data_loader import run_query
+from utils.ubigeo_cache import CacheRecargable
+from utils.busqueda import indice_defensores, normalizar_dni, TTL_BUSQUEDA
+
+# Columnas que se muestran de cada capacitación, en orden
+COLUMNAS_CAPACITACIONES = ["AÑO", "CURSO", "DEPARTAMENTO", "PROVINCIA", "DISTRITO", "SEDE DE CAPACITACIÓN",
+                           "FECHA INICIO CURSO", "FECHA CULMINA CURSO", "NOTA OBTENIDA", "CONDICIÓN"]
+
+
+class CapacitacionesPorDni(CacheRecargable):
+    """
+    Registros de capacitaciones agrupados por DNI, de la más reciente a la más antigua.
+    """
+    def _cargar(self):
+        columnas = ', '.join(f'"{c}"' for c in COLUMNAS_CAPACITACIONES)
+        df = run_query(f"""
+            SELECT "DNI" AS dni, {columnas}
+            FROM capacitaciones
+            WHERE "DNI" IS NOT NULL
+            ORDER BY "AÑO" DESC, "FECHA INICIO CURSO" DESC
+        """)
+        if df is None:
+            return None
+        registros = {}
+        for fila in df.astype(object).where(df.notna(), None).to_dict('records'):
+            registros.setdefault(normalizar_dni(fila.pop('dni')), []).append(fila)
+        return registros
+
+
+capacitaciones_por_dni = CapacitacionesPorDni(ttl=TTL_BUSQUEDA)
+
+
+def perfil(dni):
+    """
+    Todo lo que se sabe de una persona por su DNI: sus registros como defensor
+    y sus capacitaciones. Ambas búsquedas son accesos directos a memoria.
+    """
+    clave = normalizar_dni(dni)
+    return {
+        'defensores': indice_defensores.exactos(clave),
+        'capacitaciones': (capacitaciones_por_dni.datos() or {}).get(clave, []),
+    }
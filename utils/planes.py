@@ -0,0 +1,251 @@
+import json
+import os
+import sys
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils.data_loader import conectar, capturar_consultas
+
+# Planes de referencia (se versionan junto al código) y planes de la última captura
+PLANES_LINEA_BASE = os.getenv('PLANES_LINEA_BASE', 'planes_linea_base.json')
+PLANES_CAPTURA = os.getenv('PLANES_CAPTURA', 'planes_capturados.json')
+
+# Aumento tolerado del costo estimado respecto de la línea base (2.0 = el doble)
+PLANES_MAX_AUMENTO = float(os.getenv('PLANES_MAX_AUMENTO', 2.0))
+
+# Por debajo de este costo estimado no se informan aumentos (consultas triviales)
+PLANES_COSTO_MINIMO = float(os.getenv('PLANES_COSTO_MINIMO', 1000))
+
+
+def _ubicaciones(arbol):
+    # Nivel nacional y el departamento con más distritos, bajando hasta uno de sus distritos
+    combinaciones = [(None, None, None)]
+    if not arbol:
+        return combinaciones
+    dpto = max(arbol, key=lambda d: sum(len(distritos) for distritos in arbol[d].values()))
+    combinaciones.append((dpto, None, None))
+    if arbol[dpto]:
+        prov = max(arbol[dpto], key=lambda p: len(arbol[dpto][p]))
+        combinaciones.append((dpto, prov, None))
+        if arbol[dpto][prov]:
+            combinaciones.append((dpto, prov, arbol[dpto][prov][0]))
+    return combinaciones
+
+
+def _ubicaciones_cconna(ubigeo):
+    # Los filtros de CCONNA usan códigos UBIGEO en lugar de nombres
+    combinaciones = [(None, None, None)]
+    departamentos = ubigeo.departamentos()
+    if departamentos:
+        dpto = departamentos[0]['value']
+        combinaciones.append((dpto, None, None))
+        provincias = ubigeo.provincias(dpto)
+        if provincias:
+            prov = provincias[0]['value']
+            combinaciones.append((dpto, prov, None))
+            distritos = ubigeo.distritos(prov)
+            if distritos:
+                combinaciones.append((dpto, prov, distritos[0]['value']))
+    return combinaciones
+
+
+def _etiqueta(ubicacion):
+    return '/'.join(str(nivel) for nivel in ubicacion if nivel) or 'nacional'
+
+
+def carga_callbacks():
+    """
+    Combinaciones representativas de filtros de cada callback, como tuplas
+    (callback, etiqueta, función, argumentos). Las funciones se llaman sin el
+    cache de figuras para que emitan todas sus consultas.
+    """
+    from callbacks import defensorias_callbacks as dna
+    from callbacks import defensores_callbacks as defensores
+    from callbacks import capacitaciones_callbacks as capacitaciones
+    from callbacks import cconna_callbacks as cconna
+    from layouts import defensorias as layout_defensorias, defensores as layout_defensores
+    from utils.catalogos import cargar_catalogos
+    from utils.ubigeo_cache import ubicaciones_dna, ubicaciones_capacitaciones, ubigeo
+
+    def sin_cache(funcion):
+        return getattr(funcion, '__wrapped__', funcion)
+
+    carga = []
+    for nombre, catalogos in (('defensorias', dna.CATALOGOS_DEFENSORIAS),
+                              ('defensores', defensores.CATALOGOS_DEFENSORES),
+                              ('capacitaciones', capacitaciones.CATALOGOS_CAPACITACIONES),
+                              ('cconna', cconna.CATALOGOS_CCONNA)):
+        carga.append((f'{nombre}.carga_inicial', 'catalogos', cargar_catalogos, (catalogos,)))
+
+    fechas_dna = (layout_defensorias.FECHA_INICIO_POR_DEFECTO, layout_defensorias.FECHA_FIN_POR_DEFECTO)
+    fechas_defensores = (layout_defensores.FECHA_INICIO_POR_DEFECTO, layout_defensores.FECHA_FIN_POR_DEFECTO)
+    for ubicacion in _ubicaciones(ubicaciones_dna.datos()):
+        etiqueta = _etiqueta(ubicacion)
+        filtros_dna = ubicacion + (dna.ESTADOS_POR_DEFECTO, dna.TIPOS_POR_DEFECTO)
+        carga += [
+            ('defensorias.update_graphs', etiqueta, sin_cache(dna.update_graphs), filtros_dna),
+            ('defensorias.update_timeline', etiqueta, sin_cache(dna.update_timeline), fechas_dna + filtros_dna),
+            ('defensores.update_graphs', etiqueta, sin_cache(defensores.update_graphs),
+             ubicacion + (defensores.CARGOS_POR_DEFECTO, [])),
+            ('defensores.update_tabla_defensores', etiqueta, defensores.update_tabla_defensores,
+             ubicacion + (defensores.CARGOS_POR_DEFECTO, [], 0, 10)),
+            ('defensores.update_nombramientos_acumulados_graph', etiqueta,
+             sin_cache(defensores.update_nombramientos_acumulados_graph), fechas_defensores + ubicacion),
+        ]
+    # Sin filtros de estado, tipo ni cargo
+    carga += [
+        ('defensorias.update_graphs', 'nacional sin filtros', sin_cache(dna.update_graphs), (None, None, None, [], [])),
+        ('defensores.update_graphs', 'nacional sin filtros', sin_cache(defensores.update_graphs), (None, None, None, [], [])),
+        ('defensores.update_tabla_defensores', 'nacional pagina 5', defensores.update_tabla_defensores,
+         (None, None, None, defensores.CARGOS_POR_DEFECTO, [], 4, 10)),
+        ('defensorias.buscar_por_dna', 'codigo', dna.leer_detalles_dna, ("d.codigo = :codigo", {'codigo': '00001'})),
+        ('defensorias.precargar_detalles_dna', 'supervisadas', dna.precargar_detalles_dna, ()),
+    ]
+
+    for ubicacion in _ubicaciones(ubicaciones_capacitaciones.datos()):
+        carga.append(('capacitaciones.update_graphs', _etiqueta(ubicacion),
+                      sin_cache(capacitaciones.update_graphs), ubicacion + ([],)))
+
+    for ubicacion in _ubicaciones_cconna(ubigeo):
+        carga.append(('cconna.update_graphs', _etiqueta(ubicacion), sin_cache(cconna.update_graphs),
+                      ubicacion + (None, None, None)))
+    return carga
+
+
+def capturar_carga():
+    """
+    Ejecuta cada combinación de carga_callbacks() y devuelve las lecturas que
+    emitió, identificadas por callback, etiqueta y orden.
+    """
+    consultas = []
+    for nombre, etiqueta, funcion, argumentos in carga_callbacks():
+        with capturar_consultas() as capturadas:
+            try:
+                funcion(*argumentos)
+            except Exception as e:
+                print(f"Error al ejecutar {nombre} [{etiqueta}]: {e}")
+        for i, (sql, params) in enumerate(capturadas, start=1):
+            consultas.append({'clave': f'{nombre} [{etiqueta}] #{i}', 'sql': sql, 'params': params})
+    return consultas
+
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get('Plans', ()):
+        yield from _nodos(hijo)
+
+
+def _describir(nodo):
+    descripcion = nodo['Node Type']
+    if 'Index Name' in nodo:
+        descripcion += f" using {nodo['Index Name']}"
+    if 'Relation Name' in nodo:
+        descripcion += f" on {nodo['Relation Name']}"
+    return descripcion
+
+
+def resumir_plan(plan):
+    """
+    Forma del plan (tipo de cada nodo con su índice y tabla), costo estimado total
+    y los recorridos secuenciales con su filtro, que son los que revisa el asesor
+    de índices (utils/migraciones.py).
+    """
+    nodos = list(_nodos(plan))
+    secuenciales = [{'tabla': n['Relation Name'], 'filtro': n.get('Filter'), 'filas': n.get('Plan Rows')}
+                    for n in nodos if n['Node Type'] == 'Seq Scan']
+    resumen = {
+        'costo': plan['Total Cost'],
+        'forma': [_describir(n) for n in nodos],
+        'seq_scans': sorted({s['tabla'] for s in secuenciales}),
+        'secuenciales': secuenciales,
+        'ordenamientos': [n['Sort Key'] for n in nodos if n['Node Type'] == 'Sort' and 'Sort Key' in n],
+    }
+    if 'Actual Total Time' in plan:
+        resumen['tiempo_ms'] = plan['Actual Total Time']
+    return resumen
+
+
+def capturar_planes(analizar=False):
+    """
+    Captura las consultas de los callbacks y obtiene su plan con EXPLAIN (con
+    analizar=True también las ejecuta: EXPLAIN ANALYZE). Devuelve {clave: resumen}.
+    """
+    opciones = 'ANALYZE, BUFFERS, FORMAT JSON' if analizar else 'FORMAT JSON'
+    planes = {}
+    consultas = capturar_carga()
+    with conectar() as connection:
+        connection.execution_options(postgresql_readonly=True)
+        for consulta in consultas:
+            try:
+                with connection.begin():
+                    plan = connection.execute(text(f"EXPLAIN ({opciones}) {consulta['sql']}"), consulta['params']).scalar()
+            except SQLAlchemyError as e:
+                print(f"Error al obtener el plan de {consulta['clave']}: {e}")
+                continue
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            planes[consulta['clave']] = dict(resumir_plan(plan[0]['Plan']),
+                                             sql=' '.join(consulta['sql'].split()),
+                                             params=consulta['params'])
+    return planes
+
+
+def comparar_planes(actuales, base):
+    """
+    Compara los planes con la línea base. Devuelve los problemas encontrados:
+    un Seq Scan sobre una tabla que antes no se recorría secuencialmente o un
+    costo estimado que supera PLANES_MAX_AUMENTO veces el anterior.
+    """
+    problemas = []
+    for clave, plan in actuales.items():
+        anterior = base.get(clave)
+        if anterior is None:
+            if plan['seq_scans']:
+                problemas.append(f"{clave}: consulta nueva con Seq Scan en {', '.join(plan['seq_scans'])}")
+            continue
+        nuevas = set(plan['seq_scans']) - set(anterior['seq_scans'])
+        if nuevas:
+            problemas.append(f"{clave}: nuevo Seq Scan en {', '.join(sorted(nuevas))}")
+        if plan['costo'] >= PLANES_COSTO_MINIMO and plan['costo'] > anterior['costo'] * PLANES_MAX_AUMENTO:
+            problemas.append(f"{clave}: el costo estimado pasó de {anterior['costo']:.0f} a {plan['costo']:.0f}")
+    return problemas
+
+
+def guardar_planes(planes, archivo):
+    with open(archivo, 'w', encoding='utf-8') as f:
+        json.dump(planes, f, ensure_ascii=False, indent=2, sort_keys=True, default=str)
+
+
+def leer_planes(archivo):
+    with open(archivo, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def revisar_planes(guardar=False, analizar=False, archivo=PLANES_LINEA_BASE):
+    """
+    Captura los planes actuales y los guarda en PLANES_CAPTURA. Con guardar=True
+    reemplazan la línea base; si no, se comparan con ella. Devuelve 1 si hay
+    regresiones (para usarlo como verificación) y 0 si no.
+    """
+    planes = capturar_planes(analizar)
+    guardar_planes(planes, PLANES_CAPTURA)
+    if guardar:
+        guardar_planes(planes, archivo)
+        print(f"Línea base con {len(planes)} planes guardada en {archivo}")
+        return 0
+    if not os.path.exists(archivo):
+        print(f"No existe la línea base {archivo}; créela con --guardar")
+        return 1
+    problemas = comparar_planes(planes, leer_planes(archivo))
+    for problema in problemas:
+        print(problema)
+    print(f"{len(planes)} planes revisados, {len(problemas)} regresiones")
+    return 1 if problemas else 0
+
+
+if __name__ == "__main__":
+    # python -m utils.planes [--guardar] [--analyze] [archivo de línea base]
+    argumentos = sys.argv[1:]
+    archivos = [a for a in argumentos if not a.startswith('--')]
+    sys.exit(revisar_planes(guardar='--guardar' in argumentos,
+                            analizar='--analyze' in argumentos,
+                            archivo=archivos[0] if archivos else PLANES_LINEA_BASE))
@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils.data_loader import run_query, conectar, invalidar_cache, MARCA_TABLAS
+
+# Leer los gráficos desde los resúmenes precalculados cuando existen. Está desactivado
+# por defecto: los resúmenes solo reflejan los datos de su última actualización
+USAR_RESUMENES = os.getenv('USAR_RESUMENES', '0') == '1'
+
+# Particiones reservadas para la huella de las tablas de dimensiones y la marca de todas las tablas
+PARTICION_DIMENSIONES = '*dimensiones*'
+PARTICION_MARCA = '*marca*'
+PARTICIONES_CONTROL = (PARTICION_DIMENSIONES, PARTICION_MARCA)
+
+'''
+Cada resumen se particiona por departamento. `fila` es la expresión cuya huella
+identifica una fila de origen; si cambia la huella de un departamento, solo se
+recalcula ese departamento. Si cambia alguna tabla de `dimensiones`, se recalcula
+el resumen completo. Las huellas recorren las tablas, así que solo se calculan si
+cambió la marca de `tablas` (marca_tablas, que solo lee estadísticas).
+'''
+RESUMENES = {
+    'resumen_dna': {
+        'select': 'd.dpto AS dpto, d.prov AS prov, d.dist AS dist, e.estado AS estado, m.siglas AS siglas, COUNT(*) AS cantidad',
+        'from': """FROM dna d
+        JOIN estadodna e ON d.estado_acreditacion = e.codigo
+        JOIN modelodna m ON d.modelo = m.codigo""",
+        'group_by': 'd.dpto, d.prov, d.dist, e.estado, m.siglas',
+        'particion': 'd.dpto',
+        'columna_particion': 'dpto',
+        'fila': 'd',
+        'dimensiones': ('estadodna', 'modelodna'),
+        'tablas': ('dna', 'estadodna', 'modelodna'),
+    },
+    'resumen_defensores': {
+        'select': 'dna.dpto AS dpto, dna.prov AS prov, dna.dist AS dist, c.descripcion AS cargo, o.ocupacion AS ocupacion, COUNT(*) AS cantidad',
+        'from': """FROM defensores d
+        JOIN dna ON d.codigo_dna = dna.codigo
+        JOIN cargo c ON d.cargo = c.codigo
+        JOIN ocupacion o ON d.ocupacion = o.codigo""",
+        'group_by': 'dna.dpto, dna.prov, dna.dist, c.descripcion, o.ocupacion',
+        'particion': 'dna.dpto',
+        'columna_particion': 'dpto',
+        # La ubicación del defensor viene de su DNA
+        'fila': 'ROW(d.*, dna.prov, dna.dist)',
+        'dimensiones': ('cargo', 'ocupacion'),
+        'tablas': ('defensores', 'dna', 'cargo', 'ocupacion'),
+    },
+    'resumen_capacitaciones': {
+        'select': 'c."DEPARTAMENTO", c."PROVINCIA", c."DISTRITO", c."CURSO", c."AÑO", COUNT(*) AS cantidad',
+        'from': 'FROM capacitaciones c',
+        'group_by': 'c."DEPARTAMENTO", c."PROVINCIA", c."DISTRITO", c."CURSO", c."AÑO"',
+        'particion': 'c."DEPARTAMENTO"',
+        'columna_particion': '"DEPARTAMENTO"',
+        'fila': 'c',
+        'dimensiones': (),
+        'tablas': ('capacitaciones',),
+    },
+}
+
+CREAR_CONTROL = """
+CREATE TABLE IF NOT EXISTS resumen_control (
+    resumen text NOT NULL,
+    particion text NOT NULL,
+    huella text NOT NULL,
+    actualizado timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (resumen, particion)
+)
+"""
+
+
+def resumen_disponible(nombre):
+    """
+    Indica si el resumen ya fue generado. La tabla se crea y se llena en la misma
+    transacción, así que si existe tiene datos.
+    """
+    if not USAR_RESUMENES:
+        return False
+    df = run_query("SELECT to_regclass(:tabla) IS NOT NULL AS existe", {'tabla': nombre}, cache=True)
+    return df is not None and bool(df['existe'][0])
+
+
+def _huella(expresion):
+    # Huella de un conjunto de filas que no depende del orden en que se leen
+    return f"md5(string_agg(md5(CAST({expresion} AS text)), '' ORDER BY md5(CAST({expresion} AS text))))"
+
+
+def _huellas(connection, definicion):
+    particion = f"COALESCE(CAST({definicion['particion']} AS text), '')"
+    huellas = dict(connection.execute(text(f"""
+        SELECT {particion} AS particion, {_huella(definicion['fila'])} AS huella
+        {definicion['from']}
+        GROUP BY 1
+    """)).all())
+    if definicion['dimensiones']:
+        filas = ' UNION ALL '.join(f'SELECT CAST(t AS text) AS fila FROM {tabla} t' for tabla in definicion['dimensiones'])
+        huellas[PARTICION_DIMENSIONES] = connection.execute(text(f"""
+            SELECT {_huella('x.fila')} FROM ({filas}) x
+        """)).scalar() or ''
+    return huellas
+
+
+def _guardar_huellas(connection, nombre, huellas, particiones):
+    # Reemplaza en resumen_control las huellas de `particiones` (las que ya no existen solo se borran)
+    connection.execute(text("DELETE FROM resumen_control WHERE resumen = :resumen AND particion IN :particiones"),
+                       {'resumen': nombre, 'particiones': tuple(particiones)})
+    registros = [{'resumen': nombre, 'particion': p, 'huella': huellas[p]} for p in particiones if p in huellas]
+    if registros:
+        connection.execute(text("""
+            INSERT INTO resumen_control (resumen, particion, huella)
+            VALUES (:resumen, :particion, :huella)
+        """), registros)
+
+
+def refrescar_resumen(nombre, completo=False):
+    """
+    Crea el resumen si no existe y recalcula solo los departamentos cuyas filas de
+    origen cambiaron desde la última ejecución (o todos con completo=True).
+    Todo ocurre en una transacción: los lectores ven el resumen anterior hasta el final.
+    Un bloqueo consultivo evita que dos procesos actualicen el mismo resumen a la vez;
+    el segundo espera y luego encuentra la marca ya actualizada.
+    Devuelve la cantidad de particiones recalculadas.
+    """
+    definicion = RESUMENES[nombre]
+    consulta = f"SELECT {definicion['select']} {definicion['from']}"
+    particion = f"COALESCE(CAST({definicion['particion']} AS text), '')"
+    columna = f"COALESCE(CAST({definicion['columna_particion']} AS text), '')"
+
+    with conectar() as connection:
+        with connection.begin():
+            # El recálculo completo puede superar el límite de tiempo de las consultas web
+            connection.exec_driver_sql("SET LOCAL statement_timeout = 0")
+            connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:clave))"), {'clave': f'resumenes:{nombre}'})
+            connection.execute(text(CREAR_CONTROL))
+            connection.execute(text(f"CREATE TABLE IF NOT EXISTS {nombre} AS {consulta} GROUP BY {definicion['group_by']} WITH NO DATA"))
+
+            anteriores = dict(connection.execute(
+                text("SELECT particion, huella FROM resumen_control WHERE resumen = :resumen"),
+                {'resumen': nombre},
+            ).all())
+            marca = connection.execute(text(MARCA_TABLAS), {'tablas': list(definicion['tablas'])}).scalar() or ''
+            if not completo and marca and anteriores.get(PARTICION_MARCA) == marca:
+                return 0
+
+            huellas = _huellas(connection, definicion)
+            if anteriores.get(PARTICION_DIMENSIONES) != huellas.get(PARTICION_DIMENSIONES):
+                completo = True
+
+            cambiadas = [p for p, h in huellas.items()
+                         if p not in PARTICIONES_CONTROL and (completo or anteriores.get(p) != h)]
+            eliminadas = [p for p in anteriores if p not in huellas and p not in PARTICIONES_CONTROL]
+            afectadas = tuple(cambiadas + eliminadas)
+            huellas[PARTICION_MARCA] = marca
+            if not afectadas:
+                _guardar_huellas(connection, nombre, huellas, [PARTICION_MARCA])
+                return 0
+
+            connection.execute(text(f"DELETE FROM {nombre} WHERE {columna} IN :particiones"),
+                               {'particiones': afectadas})
+            if cambiadas:
+                connection.execute(text(f"""
+                    INSERT INTO {nombre}
+                    {consulta}
+                    WHERE {particion} IN :particiones
+                    GROUP BY {definicion['group_by']}
+                """), {'particiones': tuple(cambiadas)})
+
+            _guardar_huellas(connection, nombre, huellas, list(afectadas + PARTICIONES_CONTROL))
+
+    invalidar_cache([nombre])
+    return len(cambiadas) + len(eliminadas)
+
+
+def refrescar_resumenes(nombres=None, completo=False):
+    for nombre in nombres or RESUMENES:
+        inicio = time.perf_counter()
+        try:
+            particiones = refrescar_resumen(nombre, completo)
+        except SQLAlchemyError as e:
+            print(f"Error al actualizar {nombre}: {e}")
+            continue
+        print(f"{nombre}: {particiones} particiones actualizadas en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    # python -m utils.resumenes [--completo] [resumen ...]
+    argumentos = sys.argv[1:]
+    refrescar_resumenes([a for a in argumentos if not a.startswith('--')],
+                        completo='--completo' in argumentos)
@@ -0,0 +1,59 @@
+import os
+import pandas as pd
+
+# Cantidad máxima de puntos que se envían al navegador por serie
+MAX_PUNTOS_SERIE = int(os.getenv('MAX_PUNTOS_SERIE', 400))
+
+# (unidad de date_trunc, paso de generate_series, duración aproximada en días)
+GRANULARIDADES = (
+    ('day', '1 day', 1),
+    ('week', '1 week', 7),
+    ('month', '1 month', 30.44),
+    ('year', '1 year', 365.25),
+)
+
+
+def granularidad(fecha_inicio, fecha_fin):
+    """
+    Elige el intervalo más fino que mantiene la serie por debajo de MAX_PUNTOS_SERIE.
+    """
+    dias = (pd.to_datetime(fecha_fin) - pd.to_datetime(fecha_inicio)).days + 1
+    for unidad, paso, duracion in GRANULARIDADES:
+        if dias / duracion <= MAX_PUNTOS_SERIE:
+            return unidad, paso
+    return GRANULARIDADES[-1][:2]
+
+
+def consulta_acumulada(columna_fecha, from_clause, condiciones=()):
+    """
+    SQL de la serie acumulada de `columna_fecha` entre :fecha_inicio y :fecha_fin.
+    Las fechas se agrupan por :granularidad (con paso :paso) y los intervalos sin
+    registros se completan con generate_series, de modo que la serie cubre todo el
+    rango. Devuelve las columnas fecha, cantidad y acumulado.
+    """
+    where = ' AND '.join([f'{columna_fecha} BETWEEN :fecha_inicio AND :fecha_fin'] + list(condiciones))
+    return f"""
+    WITH intervalos AS (
+        SELECT generate_series(
+                   date_trunc(:granularidad, CAST(:fecha_inicio AS timestamp)),
+                   CAST(:fecha_fin AS timestamp),
+                   CAST(:paso AS interval)
+               )::date AS fecha
+    ), conteos AS (
+        SELECT date_trunc(:granularidad, {columna_fecha})::date AS fecha, COUNT(*) AS cantidad
+        {from_clause}
+        WHERE {where}
+        GROUP BY 1
+    )
+    SELECT i.fecha,
+           COALESCE(c.cantidad, 0) AS cantidad,
+           SUM(COALESCE(c.cantidad, 0)) OVER (ORDER BY i.fecha) AS acumulado
+    FROM intervalos i
+    LEFT JOIN conteos c ON c.fecha = i.fecha
+    ORDER BY i.fecha
+    """
+
+
+def params_serie(fecha_inicio, fecha_fin):
+    unidad, paso = granularidad(fecha_inicio, fecha_fin)
+    return {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin, 'granularidad': unidad, 'paso': paso}
@@ -0,0 +1,8 @@
+-- Filtros de ubicación de las páginas de DNA y defensores (departamento, provincia y distrito)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dna_ubicacion_idx ON dna (dpto, prov, dist);
+
+-- Serie acumulada de acreditaciones (rango de fechas)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dna_f_acreditacion_idx ON dna (f_acreditacion);
+
+-- Precarga del detalle de las DNAs supervisadas recientemente
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dna_f_supervision_idx ON dna (f_supervisión DESC);
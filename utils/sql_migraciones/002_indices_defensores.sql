@@ -0,0 +1,12 @@
+-- Unión de defensores con su DNA
+CREATE INDEX CONCURRENTLY IF NOT EXISTS defensores_codigo_dna_idx ON defensores (codigo_dna);
+
+-- Búsqueda exacta por DNI
+CREATE INDEX CONCURRENTLY IF NOT EXISTS defensores_dni_idx ON defensores (dni);
+
+-- Paginación por clave de la tabla de defensores (mismo orden que CLAVE_DEFENSORES)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS defensores_clave_idx
+    ON defensores ((COALESCE(apellido, '')), (COALESCE(nombres, '')), (COALESCE(dni::text, '')), codigo_dna);
+
+-- Serie acumulada de nombramientos (rango de fechas)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS defensores_f_nombramiento_idx ON defensores (f_nombramiento);
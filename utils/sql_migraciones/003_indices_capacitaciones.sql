@@ -0,0 +1,6 @@
+-- Capacitaciones de una persona
+CREATE INDEX CONCURRENTLY IF NOT EXISTS capacitaciones_dni_idx ON capacitaciones ("DNI");
+
+-- Filtros de ubicación de la página de capacitaciones
+CREATE INDEX CONCURRENTLY IF NOT EXISTS capacitaciones_ubicacion_idx
+    ON capacitaciones ("DEPARTAMENTO", "PROVINCIA", "DISTRITO");
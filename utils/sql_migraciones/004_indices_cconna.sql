@@ -0,0 +1,2 @@
+-- Filtros de ubicación de la página de CCONNA
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cconna_ubicacion_idx ON cconna ("Región", "Provincia", "Distrito");
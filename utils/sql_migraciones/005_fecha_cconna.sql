@@ -0,0 +1,34 @@
+-- Fecha de inicio o término de un CCONNA con las mismas reglas que
+-- utils/fechas_cconna.parse_fechas: uno de los FORMATOS_FECHA completo y una fecha
+-- válida entre FECHA_MINIMA y FECHA_MAXIMA. Devuelve NULL en cualquier otro caso
+-- (por ejemplo 31/02/2020), en lugar de fallar
+CREATE OR REPLACE FUNCTION fecha_cconna(valor text) RETURNS date
+LANGUAGE plpgsql STABLE PARALLEL SAFE AS $$
+DECLARE
+    texto text := btrim(valor);
+    formato text;
+    fecha date;
+BEGIN
+    IF texto ~ '^[0-9]{1,2}/[0-9]{1,2}/[0-9]{4}$' THEN
+        formato := 'DD/MM/YYYY';
+    ELSIF texto ~ '^[0-9]{4}$' THEN
+        formato := 'YYYY';
+    ELSIF texto ~ '^[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}$' THEN
+        formato := 'YYYY-MM-DD';
+    ELSIF texto ~ '^[0-9]{1,2}-[0-9]{1,2}-[0-9]{4}$' THEN
+        formato := 'DD-MM-YYYY';
+    ELSE
+        RETURN NULL;
+    END IF;
+    -- El bloque con EXCEPTION solo se abre para los valores con forma de fecha
+    BEGIN
+        fecha := to_date(texto, formato);
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    IF fecha < DATE '1678-01-01' OR fecha > DATE '2261-12-31' THEN
+        RETURN NULL;
+    END IF;
+    RETURN fecha;
+END
+$$;
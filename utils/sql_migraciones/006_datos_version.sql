@@ -0,0 +1,4 @@
+-- Versión de los datos compartida por todos los procesos (ver version_datos en
+-- utils/data_loader.py): las escrituras la incrementan con nextval y cada proceso
+-- lee last_value para saber si debe descartar sus caches
+CREATE SEQUENCE IF NOT EXISTS datos_version;
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import pandas as pd
+from utils.data_loader import run_query, version_datos
+
+# Tiempo de vida de las jerarquías en memoria (en segundos)
+TTL_UBIGEO = int(os.getenv('UBIGEO_CACHE_TTL', 3600))
+
+# Códigos sintéticos usados por los dropdowns de CCONNA
+LIMA_METROPOLITANA = '150000'
+LIMA_PROVINCIA = '260000'
+PROVINCIA_LIMA = '150100'
+
+
+def _opciones(valores):
+    return [{'label': i, 'value': i} for i in valores]
+
+
+class CacheRecargable:
+    """
+    Datos cargados una sola vez por proceso y recargados cuando vence el TTL
+    o cuando cambia la versión de los datos.
+    """
+    def __init__(self, ttl=TTL_UBIGEO):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._datos = None
+        self._cargado_en = 0
+        self._version = None
+
+    def _cargar(self):
+        raise NotImplementedError
+
+    def _vigente(self):
+        return (self._datos is not None
+                and time.monotonic() - self._cargado_en < self.ttl
+                and self._version == version_datos())
+
+    def datos(self):
+        if self._vigente():
+            return self._datos
+        with self._lock:
+            if not self._vigente():
+                version = version_datos()
+                datos = self._cargar()
+                if datos is None:
+                    # Si la consulta falla se conserva la última versión cargada
+                    return self._datos
+                self._datos = datos
+                self._cargado_en = time.monotonic()
+                self._version = version
+        return self._datos
+
+    def invalidar(self):
+        with self._lock:
+            self._datos = None
+
+
+class JerarquiaUbicaciones(CacheRecargable):
+    """
+    Árbol departamento -> provincia -> distrito armado con un único
+    SELECT DISTINCT sobre la tabla de origen. La consulta debe devolver las
+    columnas dpto, prov y dist ordenadas; el orden de la base se conserva.
+    """
+    def __init__(self, query, ttl=TTL_UBIGEO):
+        super().__init__(ttl)
+        self.query = query
+
+    def _cargar(self):
+        df = run_query(self.query)
+        if df is None:
+            return None
+        arbol = {}
+        for dpto, prov, dist in df[['dpto', 'prov', 'dist']].itertuples(index=False):
+            if pd.isnull(dpto):
+                continue
+            provincias = arbol.setdefault(dpto, {})
+            if pd.isnull(prov):
+                continue
+            distritos = provincias.setdefault(prov, [])
+            if pd.notnull(dist):
+                distritos.append(dist)
+        return arbol
+
+    def departamentos(self):
+        return _opciones(self.datos() or {})
+
+    def provincias(self, dpto):
+        return _opciones((self.datos() or {}).get(dpto, {}))
+
+    def distritos(self, dpto, prov):
+        return _opciones((self.datos() or {}).get(dpto, {}).get(prov, []))
+
+
+class ArbolUbigeo(CacheRecargable):
+    """
+    Códigos de la tabla ubigeo agrupados por nivel. Departamentos terminan en
+    '0000', provincias en '00' y el resto son distritos. Lima se reemplaza por
+    Lima Metropolitana (150000) y Lima Provincia (260000).
+
+    También mantiene el nombre de cada código, incluidos esos dos códigos
+    sintéticos.
+    """
+    def _cargar(self):
+        df = run_query('SELECT "ubigeo", "nombre" FROM ubigeo ORDER BY "nombre"')
+        if df is None:
+            return None
+        departamentos = []
+        provincias = {}
+        distritos = {}
+        nombres = {}
+        for codigo, nombre in df[['ubigeo', 'nombre']].itertuples(index=False):
+            if not codigo or len(codigo) != 6 or codigo == '000000':
+                continue
+            nombres[codigo] = nombre
+            opcion = {'label': nombre, 'value': codigo}
+            if codigo.endswith('0000'):
+                if nombre == 'Lima':
+                    departamentos.append({'label': 'Lima Metropolitana', 'value': LIMA_METROPOLITANA})
+                    departamentos.append({'label': 'Lima Provincia', 'value': LIMA_PROVINCIA})
+                else:
+                    departamentos.append(opcion)
+            elif codigo.endswith('00'):
+                provincias.setdefault(codigo[:2], []).append(opcion)
+            else:
+                distritos.setdefault(codigo[:4], []).append(opcion)
+        for codigo, nombre in ((LIMA_METROPOLITANA, 'Lima Metropolitana'), (LIMA_PROVINCIA, 'Lima Provincia')):
+            nombres[codigo] = nombre
+        return {'departamentos': departamentos, 'provincias': provincias, 'distritos': distritos,
+                'nombres': nombres}
+
+    def departamentos(self):
+        return list((self.datos() or {}).get('departamentos', []))
+
+    def provincias(self, dpto_code):
+        provincias = (self.datos() or {}).get('provincias', {})
+        if dpto_code == LIMA_METROPOLITANA:
+            # Solo la provincia de Lima
+            return [p for p in provincias.get('15', []) if p['value'] == PROVINCIA_LIMA]
+        if dpto_code == LIMA_PROVINCIA:
+            # Todas las provincias de Lima excepto la provincia de Lima
+            return [p for p in provincias.get('15', []) if p['value'] != PROVINCIA_LIMA]
+        return list(provincias.get(dpto_code[:2], []))
+
+    def distritos(self, prov_code):
+        return list((self.datos() or {}).get('distritos', {}).get(prov_code[:4], []))
+
+    def nombre(self, codigo):
+        if not codigo:
+            return None
+        return (self.datos() or {}).get('nombres', {}).get(codigo)
+
+
+# Jerarquías compartidas por todo el proceso
+ubicaciones_dna = JerarquiaUbicaciones(
+    'SELECT DISTINCT "dpto", "prov", "dist" FROM dna ORDER BY "dpto", "prov", "dist"'
+)
+ubicaciones_capacitaciones = JerarquiaUbicaciones(
+    'SELECT DISTINCT "DEPARTAMENTO" AS dpto, "PROVINCIA" AS prov, "DISTRITO" AS dist '
+    'FROM capacitaciones ORDER BY "DEPARTAMENTO", "PROVINCIA", "DISTRITO"'
+)
+ubigeo = ArbolUbigeo()
+